@@ -0,0 +1,186 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Shows a long run of frames on a Tk canvas the way the webcam feed does
+# and reports, for each minute of frames, how long showing a frame took,
+# how much memory the process is using, and how many items are on the
+# canvas. With the feed reusing one canvas image all three should stay
+# flat. --mode recreate shows frames the way ShootOFF used to (two new
+# PhotoImages and a new canvas item per frame) for comparison.
+#
+# This needs a display. Run from the ShootOFF directory:
+#   python -m benchmarks.display_soak_benchmark --minutes 60
+
+import argparse
+import numpy
+import os
+from PIL import Image, ImageTk
+import sys
+import time
+import Tkinter
+
+SHOT_MARKER = "shot_marker"
+
+# Returns the working set of this process in MB on Windows
+def get_windows_memory_mb():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    # Handles are 64 bits on 64 bit Windows, so they can't be left as ints
+    get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+    get_current_process.restype = wintypes.HANDLE
+    get_process_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+    get_process_memory_info.argtypes = [wintypes.HANDLE,
+        ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+
+    if not get_process_memory_info(get_current_process(),
+        ctypes.byref(counters), counters.cb):
+        raise ctypes.WinError()
+
+    return counters.WorkingSetSize / 1048576.0
+
+# Returns the memory the process is using in MB. On OS X this is the most
+# it has ever used, which still shows growth.
+def get_memory_mb():
+    if sys.platform == "win32":
+        return get_windows_memory_mb()
+
+    try:
+        statm = open("/proc/self/statm")
+        resident_pages = int(statm.read().split()[1])
+        statm.close()
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1048576.0
+    except (IOError, OSError, ValueError):
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # ru_maxrss is in bytes on OS X and KB everywhere else
+        if sys.platform == "darwin":
+            return usage / 1048576.0
+        return usage / 1024.0
+
+class FeedDisplay():
+    def show_frame(self, frame):
+        image = Image.fromarray(frame)
+
+        if self._mode == "recreate":
+            self._image = ImageTk.PhotoImage(image=image)
+            self._editor_image = ImageTk.PhotoImage(image=image)
+            item = self._canvas.create_image(0, 0, image=self._image,
+                anchor=Tkinter.NW, tags=("background"))
+
+            for target in self._targets:
+                self._canvas.tag_raise(target)
+            self._canvas.tag_raise(SHOT_MARKER)
+            self._canvas.tag_lower(item)
+        else:
+            if self._image is None:
+                self._image = ImageTk.PhotoImage("RGB", image.size)
+                item = self._canvas.create_image(0, 0, image=self._image,
+                    anchor=Tkinter.NW, tags=("background"))
+                self._canvas.tag_lower(item)
+
+            self._image.paste(image)
+
+        self._canvas.update()
+
+    def get_item_count(self):
+        return len(self._canvas.find_all())
+
+    def __init__(self, window, width, height, mode, target_count):
+        self._mode = mode
+        self._image = None
+        self._editor_image = None
+        self._canvas = Tkinter.Canvas(window, width=width, height=height)
+        self._canvas.pack()
+
+        # Some targets and shots for the feed to be stacked under
+        self._targets = []
+        for i in range(target_count):
+            name = "_internal_name:target%d" % i
+            self._canvas.create_rectangle(20 + i * 40, 20, 50 + i * 40, 80,
+                fill="red", stipple="gray25", tags=(name,))
+            self._canvas.create_oval(25 + i * 40, 30, 45 + i * 40, 50,
+                fill="black", stipple="gray25", tags=(name,))
+            self._targets.append(name)
+
+        self._canvas.create_oval(100, 100, 104, 104, fill="green",
+            tags=(SHOT_MARKER,))
+
+def main():
+    parser = argparse.ArgumentParser(prog="display_soak_benchmark")
+    parser.add_argument("--mode", default="reuse",
+        choices=["reuse", "recreate"],
+        help="reuse one canvas image or recreate it every frame")
+    parser.add_argument("--minutes", type=float, default=60,
+        help="how many minutes of frames to show")
+    parser.add_argument("--fps", type=int, default=30,
+        help="the frame rate of the feed being simulated (frames are " +
+            "shown as fast as possible)")
+    parser.add_argument("-r", "--resolution", default="640x480",
+        help="the WIDTHxHEIGHT of the frames")
+    parser.add_argument("--targets", type=int, default=4,
+        help="the number of targets on the canvas")
+    args = parser.parse_args()
+
+    (width, height) = [int(v) for v in args.resolution.lower().split("x")]
+    frames_per_minute = args.fps * 60
+    total_frames = int(args.minutes * frames_per_minute)
+
+    # A few different frames so that every frame really changes
+    frames = [numpy.random.randint(0, 256, (height, width, 3)).astype(
+        numpy.uint8) for i in range(8)]
+
+    window = Tkinter.Tk()
+    window.title("ShootOFF Display Soak")
+    display = FeedDisplay(window, width, height, args.mode, args.targets)
+
+    print("%8s %12s %12s %12s %12s" % ("minute", "mean ms", "max ms",
+        "memory MB", "items"))
+
+    samples = []
+    frame_times = []
+
+    for i in range(total_frames):
+        start = time.time()
+        display.show_frame(frames[i % len(frames)])
+        frame_times.append(time.time() - start)
+
+        if len(frame_times) == frames_per_minute or i == total_frames - 1:
+            sample = (len(samples) + 1, numpy.mean(frame_times) * 1000,
+                numpy.max(frame_times) * 1000, get_memory_mb(),
+                display.get_item_count())
+            samples.append(sample)
+            frame_times = []
+
+            print("%8d %12.3f %12.3f %12.1f %12d" % sample)
+            sys.stdout.flush()
+
+    window.destroy()
+
+    if len(samples) > 1:
+        (first, last) = (samples[0], samples[-1])
+        print("change from the first minute to the last: %+.3f ms per " %
+            (last[1] - first[1]) + "frame, %+.1f MB, %+d canvas items" %
+            (last[3] - first[3], last[4] - first[4]))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Compares the per-call cost of classifying a laser's color with a full
+# frame mask (how ShootOFF used to do it) against the cached kernel used by
+# LaserColorClassifier.
+#
+# Run from the ShootOFF directory: python -m benchmarks.laser_color_benchmark
+
+import argparse
+import cv2
+from laser_color import LaserColorClassifier
+import numpy
+import random
+import timeit
+
+RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080))
+
+# The classifier as it was before LaserColorClassifier
+def full_frame_mask_classify(frame, x, y):
+    l = frame.shape[1]
+    h = frame.shape[0]
+    mask = numpy.zeros((h, l, 1), numpy.uint8)
+    cv2.circle(mask, (x, y), 10, (255, 255, 555), -1)
+    mean_color = cv2.mean(frame, mask)
+
+    r = mean_color[2]
+    g = mean_color[1]
+    b = mean_color[0]
+
+    if (r > g) and (r > b):
+        return "red"
+
+    if (g > r) and (g > b):
+        return "green2"
+
+    return None
+
+def make_frame(width, height):
+    frame = numpy.random.randint(0, 80, (height, width, 3)).astype(numpy.uint8)
+
+    # Put a few red and green laser spots on the frame
+    points = []
+    for i in range(20):
+        x = random.randrange(0, width)
+        y = random.randrange(0, height)
+        color = random.choice(((0, 0, 255), (0, 255, 0)))
+        cv2.circle(frame, (x, y), 4, color, -1)
+        points.append((x, y))
+
+    # Spots on the edges make sure clipping the kernel works
+    points.extend(((0, 0), (width - 1, height - 1), (0, height / 2)))
+
+    return frame, points
+
+def time_classifier(classify, frame, points, calls):
+    def run():
+        for i in range(calls):
+            (x, y) = points[i % len(points)]
+            classify(frame, x, y)
+
+    # Take the best of a few runs to keep scheduler noise out of the result
+    return min(timeit.repeat(run, repeat=5, number=1)) / calls
+
+def main():
+    parser = argparse.ArgumentParser(prog="laser_color_benchmark")
+    parser.add_argument("-n", "--calls", type=int, default=200,
+        help="number of calls to time for each classifier and resolution")
+    args = parser.parse_args()
+
+    random.seed(0)
+    numpy.random.seed(0)
+    classifier = LaserColorClassifier()
+
+    print("%-12s %14s %14s %10s" % ("resolution", "full mask (us)",
+        "kernel (us)", "speedup"))
+
+    for (width, height) in RESOLUTIONS:
+        frame, points = make_frame(width, height)
+
+        # Both classifiers must agree before their speed is worth comparing
+        for (x, y) in points:
+            assert (full_frame_mask_classify(frame, x, y) ==
+                classifier.classify(frame, x, y))
+
+        before = time_classifier(full_frame_mask_classify, frame, points,
+            args.calls)
+        after = time_classifier(classifier.classify, frame, points, args.calls)
+
+        print("%-12s %14.1f %14.1f %9.1fx" % ("%dx%d" % (width, height),
+            before * 1e6, after * 1e6, before / after))
+
+if __name__ == "__main__":
+    main()
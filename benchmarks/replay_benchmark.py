@@ -0,0 +1,139 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Replays a recorded video file or directory of images through the same
+# capture and detection path ShootOFF uses for a webcam, without a display,
+# and reports how many frames per second detection kept up with and the
+# shots it found. This is how false positives reported from a lane are
+# reproduced. Shots in a session recording (see shootoff.py --record) are
+# hit tested against the targets that were on the feed when it was
+# recorded, and --shot starts replaying just before one of its shots.
+#
+# Run from the ShootOFF directory:
+#   python -m benchmarks.replay_benchmark path/to/recording.avi
+#   python -m benchmarks.replay_benchmark recordings/session.srec --shot 3
+
+import argparse
+import configurator
+from detection_engine import DetectionEngine
+from frame_capture import FrameCapture, RecordingSource, open_replay_source
+import logging
+import sys
+from target_cache import CompiledTarget
+import time
+
+# Gives engine the targets from a session recording in place of the ones it
+# has
+def replace_targets(engine, targets):
+    engine.set_targets([])
+
+    for (name, region_object) in targets:
+        compiled_target = CompiledTarget(region_object)
+        engine.set_target(name, [(i, region["coords"],
+            region["parsed_tags"]) for (i, region) in
+            enumerate(compiled_target.get_regions())],
+            compiled_target.get_mask())
+
+def main():
+    parser = argparse.ArgumentParser(prog="replay_benchmark")
+    parser.add_argument("replay",
+        help="a recorded video file, a directory of images, or a session " +
+            "recording")
+    parser.add_argument("--realtime", action="store_true",
+        help="replay frames at the rate they were recorded at instead of as " +
+            "fast as possible")
+    parser.add_argument("--replay-fps", type=int, default=30,
+        help="the frame rate a directory of images was recorded at")
+    parser.add_argument("-i", "--laser-intensity", type=int, default=230,
+        help="the intensity threshold for detecting the laser [0,255]")
+    parser.add_argument("-c", "--ignore-laser-color", default="none",
+        help="the color of laser to ignore (green or red)")
+    parser.add_argument("--shot", type=int,
+        help="start a session recording just before its SHOT-th shot (the " +
+            "first shot is 1)")
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger = logging.getLogger("shootoff")
+
+    preferences = {configurator.LASER_INTENSITY: args.laser_intensity,
+        configurator.IGNORE_LASER_COLOR: args.ignore_laser_color,
+        configurator.DETECTION_MODE: configurator.FRAME_DETECTION,
+        configurator.DETECTION_ROI: False,
+        configurator.ROI_MARGIN: 0}
+
+    source = open_replay_source(args.replay, args.realtime, args.replay_fps)
+    if not source.is_opened():
+        logger.critical("Frames could not be read from %s.", args.replay)
+        return 1
+
+    engine = DetectionEngine(preferences, logger)
+
+    if isinstance(source, RecordingSource):
+        if args.shot is not None and not source.seek_to_shot(args.shot - 1):
+            logger.critical("%s doesn't have %d shots.", args.replay,
+                args.shot)
+            return 1
+
+        (width, height) = source.get_resolution()
+        engine.set_frame_size(width, height)
+
+    # Every frame has to be checked, so the replay must wait for detection
+    # when it isn't paced
+    capture = FrameCapture(source, logger, lossless=not args.realtime)
+    ring = capture.get_ring()
+
+    start = time.time()
+    capture.start()
+
+    frame = None
+    last_sequence = -1
+    targets_id = None
+    examined_frames = 0
+    shots = 0
+
+    while True:
+        if not ring.wait_for_frame(last_sequence, .1):
+            if capture.is_finished() or capture.is_disconnected():
+                break
+            continue
+
+        next_frame = ring.read_next(last_sequence, frame)
+        if next_frame is None:
+            continue
+
+        (sequence, timestamp, frame) = next_frame
+        examined_frames += 1
+
+        # Shots are hit tested against the targets that were on the feed
+        # when the frame was recorded, which change during the recording
+        if (isinstance(source, RecordingSource) and
+            source.get_targets_id(sequence) != targets_id):
+
+            targets_id = source.get_targets_id(sequence)
+            replace_targets(engine, source.get_targets(sequence))
+
+        for shot_event in engine.process_frame(frame, sequence, timestamp):
+            shots += 1
+            logger.info("Frame %d: %s shot at (%.2f, %.2f) %s", sequence,
+                shot_event.get_color(), shot_event.get_coords()[0],
+                shot_event.get_coords()[1], shot_event.get_tags())
+
+        last_sequence = sequence
+        ring.release(sequence)
+
+    elapsed = time.time() - start
+    capture.stop()
+    source.release()
+
+    print("frames: %d (skipped %d)" % (examined_frames,
+        last_sequence + 1 - examined_frames))
+    print("shots: %d" % shots)
+    print("detection throughput: %.1f fps" % (examined_frames / elapsed))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Generates frames with known laser shots in them (plus noise and glare),
+# pushes them through the same DetectionEngine the feed uses, and reports
+# how fast each stage of detection was and how many of the shots were
+# found. Results can be written as JSON so that they can be compared
+# between revisions.
+#
+# Run from the ShootOFF directory:
+#   python -m benchmarks.synthetic_benchmark -r 640x480 -r 1280x720 \
+#       --output results.json
+
+import argparse
+import configurator
+import cv2
+from detection_engine import DetectionEngine, STAGES
+import json
+import logging
+import numpy
+import platform
+import subprocess
+import sys
+import time
+
+BACKGROUND_LEVEL = 60
+SHOT_GAP = 3 # frames between one shot ending and the next starting
+EDGE_MARGIN = 20 # px, keeps shots away from the edge of the frame
+PERCENTILES = (50, 95, 99)
+
+# BGR
+LASER_COLORS = {"red": (0, 0, 255), "green": (0, 255, 0)}
+
+# What the engine calls each laser color
+ENGINE_COLORS = {"red": "red", "green": "green2"}
+
+class SyntheticShot():
+    def covers(self, sequence):
+        return self.start <= sequence < self.start + self.duration
+
+    def __init__(self, color, x, y, start, duration):
+        self.color = color
+        self.x = x
+        self.y = y
+        self.start = start
+        self.duration = duration
+
+# Returns a list of SyntheticShots that don't overlap in time
+def make_shots(args, width, height, random):
+    shots = []
+    start = SHOT_GAP
+
+    while len(shots) < args.shots:
+        if start + args.shot_duration > args.frames:
+            break
+
+        shots.append(SyntheticShot(args.colors[random.randint(len(args.colors))],
+            random.randint(EDGE_MARGIN, width - EDGE_MARGIN),
+            random.randint(EDGE_MARGIN, height - EDGE_MARGIN),
+            start, args.shot_duration))
+
+        start += args.shot_duration + SHOT_GAP
+
+    return shots
+
+# Returns a list of (x, y, radius) glare spots. Glare is white, so it should
+# be seen as interference but never as a shot.
+def make_glare(args, width, height, random):
+    glare = []
+
+    for i in range(args.glare):
+        glare.append((random.randint(width), random.randint(height),
+            random.randint(args.spot_radius * 4, args.spot_radius * 12)))
+
+    return glare
+
+# Returns a list of targets in the format expected by
+# DetectionEngine.set_targets. Each target is a rectangle with an oval
+# inside of it.
+def make_targets(args, width, height):
+    targets = []
+    columns = max(1, int(numpy.ceil(numpy.sqrt(args.targets))))
+    rows = max(1, int(numpy.ceil(float(args.targets) / columns)))
+    cell_width = width / float(columns)
+    cell_height = height / float(rows)
+
+    for i in range(args.targets):
+        x1 = (i % columns) * cell_width + cell_width * .1
+        y1 = (i / columns) * cell_height + cell_height * .1
+        x2 = x1 + cell_width * .8
+        y2 = y1 + cell_height * .8
+        inset_x = cell_width * .2
+        inset_y = cell_height * .2
+
+        targets.append(("target%d" % i, [
+            (i * 2, (x1, y1, x2, y2),
+                {"_internal_name": "target%d" % i, "_shape": "rectangle"}),
+            (i * 2 + 1, (x1 + inset_x, y1 + inset_y, x2 - inset_x, y2 - inset_y),
+                {"_internal_name": "target%d" % i, "_shape": "oval",
+                "points": "10"})]))
+
+    return targets
+
+def make_frame(args, width, height, sequence, shots, glare, random):
+    frame = numpy.empty((height, width, 3), numpy.float32)
+    frame.fill(BACKGROUND_LEVEL)
+
+    for (x, y, radius) in glare:
+        cv2.circle(frame, (x, y), radius, (255, 255, 255), -1)
+
+    for shot in shots:
+        if not shot.covers(sequence):
+            continue
+
+        # A laser spot is a colored halo around a core that is bright
+        # enough to be thresholded
+        color = [c * args.spot_intensity / 255.0 for c in LASER_COLORS[shot.color]]
+        core = [max(c, args.spot_intensity * .95) for c in color]
+        cv2.circle(frame, (shot.x, shot.y), args.spot_radius * 3, color, -1)
+        cv2.circle(frame, (shot.x, shot.y), args.spot_radius, core, -1)
+
+    if args.noise > 0:
+        frame += random.normal(0, args.noise, frame.shape)
+
+    return numpy.clip(frame, 0, 255).astype(numpy.uint8)
+
+# Matches each detected shot to the ground truth shot it was made by.
+# Returns (true positives, false positives, localization errors in px).
+def match_shots(detections, shots, tolerance):
+    matched = set()
+    true_positives = 0
+    false_positives = 0
+    errors = []
+
+    for (sequence, shot_event) in detections:
+        (x, y) = shot_event.get_coords()
+        match = None
+
+        for i, shot in enumerate(shots):
+            if (i in matched or not shot.covers(sequence) or
+                ENGINE_COLORS[shot.color] != shot_event.get_color()):
+                continue
+
+            distance = numpy.hypot(x - shot.x, y - shot.y)
+            if distance <= tolerance:
+                match = i
+                errors.append(distance)
+                break
+
+        if match is None:
+            false_positives += 1
+        else:
+            matched.add(match)
+            true_positives += 1
+
+    return (true_positives, false_positives, errors)
+
+def run_scenario(args, width, height, logger):
+    random = numpy.random.RandomState(args.seed)
+
+    preferences = {configurator.LASER_INTENSITY: args.laser_intensity,
+        configurator.IGNORE_LASER_COLOR: "none",
+        configurator.DETECTION_MODE: args.detection_mode,
+        configurator.DETECTION_ROI: args.roi,
+        configurator.ROI_MARGIN: args.roi_margin}
+
+    engine = DetectionEngine(preferences, logger)
+    engine.set_targets(make_targets(args, width, height))
+    engine.enable_stage_timing()
+
+    shots = make_shots(args, width, height, random)
+    glare = make_glare(args, width, height, random)
+    detections = []
+    hits = 0
+    elapsed = 0
+
+    for sequence in range(args.frames):
+        frame = make_frame(args, width, height, sequence, shots, glare, random)
+        timestamp = sequence / float(args.fps)
+
+        start = time.time()
+        shot_events = engine.process_frame(frame, sequence, timestamp)
+        elapsed += time.time() - start
+
+        for shot_event in shot_events:
+            detections.append((sequence, shot_event))
+            if shot_event.is_hit():
+                hits += 1
+
+    (true_positives, false_positives, errors) = match_shots(detections, shots,
+        args.tolerance)
+
+    recall = 1.0
+    if len(shots) > 0:
+        recall = true_positives / float(len(shots))
+
+    precision = 1.0
+    if len(detections) > 0:
+        precision = true_positives / float(len(detections))
+
+    stage_latency = {}
+    for (stage, times) in engine.get_stage_times().items():
+        times_ms = numpy.array(times) * 1000
+        stage_latency[stage] = {"mean": float(times_ms.mean())}
+
+        for percentile in PERCENTILES:
+            stage_latency[stage]["p%d" % percentile] = float(
+                numpy.percentile(times_ms, percentile))
+
+    mean_error = None
+    if len(errors) > 0:
+        mean_error = float(numpy.mean(errors))
+
+    return {"resolution": [width, height],
+        "frames": args.frames,
+        "fps": args.frames / elapsed,
+        "shots": len(shots),
+        "detections": len(detections),
+        "hits": hits,
+        "true_positives": true_positives,
+        "false_positives": false_positives,
+        "recall": recall,
+        "precision": precision,
+        "mean_error_px": mean_error,
+        "stage_latency_ms": stage_latency}
+
+def get_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+            stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_scenario(result):
+    print("%dx%d: %.1f fps, %d shots, %d detected, recall %.3f, precision %.3f" %
+        (result["resolution"][0], result["resolution"][1], result["fps"],
+        result["shots"], result["detections"], result["recall"],
+        result["precision"]))
+
+    print("  %-10s %10s" % ("stage", "mean ms") +
+        "".join(["%10s" % ("p%d ms" % p) for p in PERCENTILES]))
+
+    for stage in STAGES:
+        latency = result["stage_latency_ms"][stage]
+        print("  %-10s %10.3f" % (stage, latency["mean"]) +
+            "".join(["%10.3f" % latency["p%d" % p] for p in PERCENTILES]))
+
+def parse_resolution(resolution):
+    try:
+        (width, height) = resolution.lower().split("x")
+        return (int(width), int(height))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "%s is not a resolution like 640x480" % resolution)
+
+def main():
+    parser = argparse.ArgumentParser(prog="synthetic_benchmark")
+    parser.add_argument("-r", "--resolution", type=parse_resolution,
+        action="append", help="a WIDTHxHEIGHT frame size to benchmark, can " +
+            "be given more than once (default 640x480)")
+    parser.add_argument("-f", "--frames", type=int, default=300,
+        help="the number of frames in each scenario")
+    parser.add_argument("--fps", type=int, default=30,
+        help="the frame rate the synthetic frames were \"captured\" at")
+    parser.add_argument("-s", "--shots", type=int, default=30,
+        help="the number of laser shots in each scenario")
+    parser.add_argument("--colors", default="red,green",
+        help="a comma separated list of laser colors to use (red, green)")
+    parser.add_argument("--spot-radius", type=int, default=2,
+        help="the radius of the bright core of a laser spot in px")
+    parser.add_argument("--spot-intensity", type=int, default=255,
+        help="how bright laser spots are [0,255]")
+    parser.add_argument("--shot-duration", type=int, default=4,
+        help="the number of frames each shot is visible for")
+    parser.add_argument("--noise", type=float, default=8,
+        help="the standard deviation of the sensor noise added to each frame")
+    parser.add_argument("--glare", type=int, default=0,
+        help="the number of patches of white glare in each frame")
+    parser.add_argument("--targets", type=int, default=4,
+        help="the number of targets to hit test shots against")
+    parser.add_argument("-t", "--detection-mode",
+        default=configurator.FRAME_DETECTION,
+        choices=[configurator.POLL_DETECTION, configurator.FRAME_DETECTION],
+        help="the detection mode the engine runs in")
+    parser.add_argument("--roi", action="store_true",
+        help="only check the area around the targets for shots")
+    parser.add_argument("--roi-margin", type=int, default=50,
+        help="the margin around targets when --roi is set")
+    parser.add_argument("-i", "--laser-intensity", type=int, default=230,
+        help="the intensity threshold for detecting the laser [0,255]")
+    parser.add_argument("--tolerance", type=float, default=3,
+        help="how far in px a detected shot can be from the real shot")
+    parser.add_argument("--seed", type=int, default=0,
+        help="the seed for generating scenarios, so runs are repeatable")
+    parser.add_argument("-o", "--output",
+        help="write the results to this file as JSON")
+    args = parser.parse_args()
+
+    args.colors = [c.strip() for c in args.colors.split(",")]
+    for color in args.colors:
+        if color not in LASER_COLORS:
+            parser.error("%s is not a laser color" % color)
+
+    resolutions = args.resolution
+    if resolutions is None:
+        resolutions = [(640, 480)]
+
+    logging.basicConfig(stream=sys.stderr, level=logging.ERROR)
+    logger = logging.getLogger("shootoff")
+
+    results = []
+    for (width, height) in resolutions:
+        result = run_scenario(args, width, height, logger)
+        print_scenario(result)
+        results.append(result)
+
+    if args.output is not None:
+        settings = dict(vars(args))
+        del settings["output"]
+        del settings["resolution"]
+
+        with open(args.output, "w") as output:
+            json.dump({"revision": get_revision(),
+                "python": platform.python_version(),
+                "opencv": cv2.__version__,
+                "settings": settings,
+                "scenarios": results}, output, indent=2, sort_keys=True)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Builds a library of targets from the ones that ship with ShootOFF (moved
+# around and with different tags so that no two are the same), saves it
+# both pickled (the old format) and in the binary target format, and
+# compares how long it takes to load the whole library each way, to index
+# it by reading only the headers, and to compile it through TargetCache.
+#
+# Run from the ShootOFF directory:
+#   python -m benchmarks.target_library_benchmark --targets 300
+
+import argparse
+import glob
+import os
+import pickle
+import random
+import shutil
+import sys
+from target_cache import TargetCache
+from target_format import is_target_file, read_header, read_target, write_target
+import target_pickler
+import tempfile
+import time
+
+def load_pickled_target(target_file):
+    target = open(target_file, "rb")
+    region_object = pickle.load(target)
+    target.close()
+
+    return region_object
+
+# Returns the regions of every target that ships with ShootOFF
+def load_stock_targets():
+    targets = []
+
+    for target_file in sorted(glob.glob(os.path.join("targets", "*.target"))):
+        if is_target_file(target_file):
+            targets.append(read_target(target_file))
+        else:
+            targets.append(load_pickled_target(target_file))
+
+    return targets
+
+def make_library(stock_targets, count, directory):
+    pickled_files = []
+    binary_files = []
+
+    for i in range(count):
+        dx = random.uniform(-100, 100)
+        dy = random.uniform(-100, 100)
+        region_object = []
+
+        for region in random.choice(stock_targets):
+            coords = list(region["coords"])
+            coords[::2] = [x + dx for x in coords[::2]]
+            coords[1::2] = [y + dy for y in coords[1::2]]
+
+            region_object.append({"tags": tuple(region["tags"]) +
+                    ("name:target%d" % i,),
+                "coords": coords,
+                "fill": region["fill"]})
+
+        pickled_file = os.path.join(directory, "target%d.pickled" % i)
+        target = open(pickled_file, "wb")
+        pickle.dump(region_object, target, pickle.HIGHEST_PROTOCOL)
+        target.close()
+        pickled_files.append(pickled_file)
+
+        binary_file = os.path.join(directory, "target%d.target" % i)
+        write_target(binary_file, region_object)
+        binary_files.append(binary_file)
+
+    return (pickled_files, binary_files)
+
+# Returns the best of repeat runs of calling func on every file, in seconds
+def time_library(func, files, repeat):
+    best = None
+
+    for i in range(repeat):
+        start = time.time()
+        for target_file in files:
+            func(target_file)
+        elapsed = time.time() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(prog="target_library_benchmark")
+    parser.add_argument("-n", "--targets", type=int, default=300,
+        help="the number of targets in the library")
+    parser.add_argument("--repeat", type=int, default=5,
+        help="the number of times to load the library, the best time is used")
+    parser.add_argument("--seed", type=int, default=0,
+        help="the seed for building the library")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    stock_targets = load_stock_targets()
+    if len(stock_targets) == 0:
+        print("No targets were found, run this from the ShootOFF directory.")
+        return 1
+
+    directory = tempfile.mkdtemp(prefix="shootoff_targets")
+
+    try:
+        (pickled_files, binary_files) = make_library(stock_targets,
+            args.targets, directory)
+
+        pickled_size = sum([os.path.getsize(f) for f in pickled_files])
+        binary_size = sum([os.path.getsize(f) for f in binary_files])
+
+        results = [("pickle.load", time_library(load_pickled_target,
+                pickled_files, args.repeat)),
+            ("read_target", time_library(read_target, binary_files,
+                args.repeat)),
+            ("read_header", time_library(read_header, binary_files,
+                args.repeat))]
+
+        # The cache has to be big enough for the whole library, otherwise
+        # the cached run would be compiling targets too
+        start = time.time()
+        cache = TargetCache(target_pickler._read_target,
+            max_entries=args.targets, max_bytes=args.targets * 1024 * 1024)
+        for target_file in binary_files:
+            cache.get(target_file)
+        results.append(("compile (cold)", time.time() - start))
+
+        results.append(("compile (cached)", time_library(cache.get,
+            binary_files, args.repeat)))
+    finally:
+        shutil.rmtree(directory)
+
+    print("%d targets, %d bytes pickled, %d bytes in the target format" %
+        (args.targets, pickled_size, binary_size))
+    print("%-18s %10s %12s" % ("", "total ms", "per target us"))
+
+    for (name, elapsed) in results:
+        print("%-18s %10.2f %12.1f" % (name, elapsed * 1000,
+            elapsed / args.targets * 1000000))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
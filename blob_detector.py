@@ -0,0 +1,102 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import numpy
+
+# Indexes into the tuples returned by find_blobs
+BLOB_X = 0
+BLOB_Y = 1
+BLOB_AREA = 2
+BLOB_PEAK = 3
+
+# Finds every bright spot in frame_thresh (a thresholded black and white
+# frame) and returns a list of (x, y, area, peak) tuples, one per spot.
+# (x, y) is the spot's sub-pixel centroid, area is its size in pixels, and
+# peak is the brightest value of its pixels in frame_bw (the black and white
+# frame before it was thresholded).
+def find_blobs(frame_thresh, frame_bw):
+    # OpenCV 2.4 doesn't have connected component labelling
+    if hasattr(cv2, "connectedComponentsWithStats"):
+        return _find_labelled_blobs(frame_thresh, frame_bw)
+    else:
+        return _find_contour_blobs(frame_thresh, frame_bw)
+
+# Labels every blob in one pass and gathers the peak of all of them with
+# array operations. Centroids are computed on each blob's own small patch.
+def _find_labelled_blobs(frame_thresh, frame_bw):
+    (count, labels, stats, centroids) = cv2.connectedComponentsWithStats(
+        frame_thresh, connectivity=8)
+
+    # Label 0 is the background
+    if count <= 1:
+        return []
+
+    # Only look at the labelled pixels to find each blob's peak
+    (ys, xs) = numpy.nonzero(labels)
+    peaks = numpy.zeros(count, frame_bw.dtype)
+    numpy.maximum.at(peaks, labels[ys, xs], frame_bw[ys, xs])
+
+    blobs = []
+
+    for label in range(1, count):
+        x = stats[label, cv2.CC_STAT_LEFT]
+        y = stats[label, cv2.CC_STAT_TOP]
+        width = stats[label, cv2.CC_STAT_WIDTH]
+        height = stats[label, cv2.CC_STAT_HEIGHT]
+
+        blob_mask = labels[y:y + height, x:x + width] == label
+        (centroid_x, centroid_y) = _weighted_centroid(
+            frame_bw[y:y + height, x:x + width], blob_mask)
+
+        blobs.append((x + centroid_x, y + centroid_y,
+            int(stats[label, cv2.CC_STAT_AREA]), int(peaks[label])))
+
+    return blobs
+
+def _find_contour_blobs(frame_thresh, frame_bw):
+    blobs = []
+
+    # findContours changes the image it is given on OpenCV 2.4, and the
+    # contours are the second to last value returned on every version
+    contours = cv2.findContours(frame_thresh.copy(), cv2.RETR_EXTERNAL,
+        cv2.CHAIN_APPROX_NONE)[-2]
+
+    for contour in contours:
+        (x, y, width, height) = cv2.boundingRect(contour)
+
+        # The bounding box can overlap other blobs, so only keep the
+        # pixels inside this contour
+        blob_thresh = numpy.zeros((height, width), numpy.uint8)
+        cv2.drawContours(blob_thresh, [contour], -1, 255, -1, offset=(-x, -y))
+        blob_thresh &= frame_thresh[y:y + height, x:x + width]
+        blob_bw = frame_bw[y:y + height, x:x + width]
+
+        blob_mask = blob_thresh > 0
+        area = numpy.count_nonzero(blob_mask)
+
+        if area == 0:
+            continue
+
+        (centroid_x, centroid_y) = _weighted_centroid(blob_bw, blob_mask)
+
+        blobs.append((x + centroid_x, y + centroid_y, int(area),
+            int(blob_bw[blob_mask].max())))
+
+    return blobs
+
+# Returns the (x, y) centroid of the pixels in patch (a slice of the black
+# and white frame) that are in blob_mask, weighted by how bright they are.
+# The first brightest pixel of a saturated laser spot is just one of its
+# corners, the weighted centroid is the center of the spot to a fraction
+# of a pixel.
+def _weighted_centroid(patch, blob_mask):
+    weights = numpy.where(blob_mask, patch, 0).astype(numpy.float32)
+    moments = cv2.moments(weights)
+
+    if moments["m00"] == 0:
+        (ys, xs) = numpy.nonzero(blob_mask)
+        return (xs.mean(), ys.mean())
+
+    return (moments["m10"] / moments["m00"], moments["m01"] / moments["m00"])
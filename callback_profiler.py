@@ -0,0 +1,230 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import configurator
+import cProfile
+from collections import defaultdict
+import os
+import pstats
+import sys
+import thread
+import threading
+import time
+
+SAMPLE_INTERVAL = .01 # s
+PROFILE_DIR = "profile"
+
+# Idle is when no profiled callback is running on a thread
+IDLE = "idle"
+
+# Profiles the callbacks ShootOFF runs (e.g. refreshing the feed, detecting
+# shots, and a training protocol's listeners). Every callback wrapped with
+# wrap is timed. On top of that, the FULL_PROFILE mode runs the callbacks
+# under cProfile, which is detailed but slows them down a lot, while the
+# SAMPLE_PROFILE mode looks at what every thread is doing every
+# SAMPLE_INTERVAL seconds from a thread of its own, which is cheap enough to
+# leave on all the time.
+class CallbackProfiler():
+    # Returns a function that calls func and profiles it as name
+    def wrap(self, name, func):
+        def profiled_func(*args, **kwargs):
+            return self._call(name, func, args, kwargs)
+
+        return profiled_func
+
+    def _call(self, name, func, args, kwargs):
+        thread_id = thread.get_ident()
+        stack = self._callback_stacks.setdefault(thread_id, [])
+        stack.append(name)
+        start = time.time()
+
+        try:
+            if self._mode == configurator.FULL_PROFILE:
+                return self._run_profiled(func, args, kwargs)
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            stack.pop()
+
+            with self._lock:
+                stats = self._callback_stats[name]
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+
+    # cProfile only profiles the thread it was enabled on, so each thread
+    # gets its own profile, which is only enabled by the outer most callback
+    def _run_profiled(self, func, args, kwargs):
+        local = self._local
+
+        if not hasattr(local, "profile"):
+            local.profile = cProfile.Profile()
+            local.depth = 0
+
+            with self._lock:
+                self._profiles.append(local.profile)
+
+        if local.depth > 0:
+            local.depth += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                local.depth -= 1
+
+        local.depth = 1
+        local.profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            local.profile.disable()
+            local.depth = 0
+
+    # Starts timing the session (and sampling in SAMPLE_PROFILE mode)
+    def start(self):
+        self._start_time = time.time()
+
+        if self._mode == configurator.SAMPLE_PROFILE:
+            self._sampler_thread = threading.Thread(target=self._sample,
+                name="profile_sampler_thread")
+            self._sampler_thread.daemon = True
+            self._sampler_thread.start()
+
+    def stop(self):
+        if self._stop_time is not None:
+            return
+
+        self._stop_time = time.time()
+
+        if self._sampler_thread is not None:
+            self._stopped.set()
+            self._sampler_thread.join()
+            self._sampler_thread = None
+
+    def _sample(self):
+        sampler_id = thread.get_ident()
+
+        while not self._stopped.wait(SAMPLE_INTERVAL):
+            for (thread_id, frame) in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+
+                # Build the stack from the outer most function in
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("%s:%d(%s)" % (os.path.basename(
+                        code.co_filename), code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                stack.reverse()
+
+                # The thread may finish a callback while this looks at it
+                callbacks = list(self._callback_stacks.get(thread_id, ()))
+                if len(callbacks) > 0:
+                    callback = callbacks[-1]
+                else:
+                    callback = IDLE
+
+                with self._lock:
+                    self._stage_samples[callback] += 1
+                    self._stack_samples[(callback,) + tuple(stack)] += 1
+
+            self._sample_count += 1
+
+    # Returns a list with a (name, calls, total, mean, max, percent) tuple
+    # for every profiled callback, slowest in total first. Times are in
+    # seconds and percent is how much of the session the callback took
+    # (callbacks on different threads or inside other callbacks overlap,
+    # so the percents can add up to more than 100).
+    def get_summary(self):
+        end_time = self._stop_time
+        if end_time is None:
+            end_time = time.time()
+
+        session_time = max(end_time - self._start_time, 1e-9)
+        summary = []
+
+        with self._lock:
+            for (name, (calls, total, slowest)) in self._callback_stats.items():
+                summary.append((name, calls, total, total / max(calls, 1),
+                    slowest, total / session_time * 100))
+
+        return sorted(summary, key=lambda row: row[2], reverse=True)
+
+    # Returns the summary as lines of text
+    def format_summary(self):
+        lines = ["%-32s %8s %10s %10s %10s %7s" % ("Callback", "Calls",
+            "Total ms", "Mean ms", "Max ms", "Time %")]
+
+        for (name, calls, total, mean, slowest, percent) in self.get_summary():
+            lines.append("%-32s %8d %10.1f %10.3f %10.3f %6.1f%%" % (name,
+                calls, total * 1000, mean * 1000, slowest * 1000, percent))
+
+        if (self._mode == configurator.SAMPLE_PROFILE and
+            self._sample_count > 0):
+
+            lines.append("")
+            lines.append("%-32s %8s" % ("Samples by callback", "Samples"))
+
+            with self._lock:
+                for (callback, count) in sorted(self._stage_samples.items(),
+                    key=lambda item: item[1], reverse=True):
+                    lines.append("%-32s %8d" % (callback, count))
+
+        return lines
+
+    # Writes the session's profile to directory and returns the paths of the
+    # files written: the summary, and the cProfile dump (FULL_PROFILE) or
+    # the sampled stacks in the folded format flame graph tools read
+    # (SAMPLE_PROFILE)
+    def write(self, directory=PROFILE_DIR):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        base = os.path.join(directory, "profile-%s" % time.strftime(
+            "%Y%m%d-%H%M%S", time.localtime(self._start_time)))
+        paths = []
+
+        summary_file = open(base + ".txt", "w")
+        summary_file.write("\n".join(self.format_summary()) + "\n")
+        summary_file.close()
+        paths.append(base + ".txt")
+
+        with self._lock:
+            profiles = list(self._profiles)
+            stack_samples = dict(self._stack_samples)
+
+        if len(profiles) > 0:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+
+            stats.dump_stats(base + ".prof")
+            paths.append(base + ".prof")
+
+        if len(stack_samples) > 0:
+            samples_file = open(base + ".folded", "w")
+            for (stack, count) in sorted(stack_samples.items()):
+                samples_file.write("%s %d\n" % (";".join(stack), count))
+            samples_file.close()
+            paths.append(base + ".folded")
+
+        return paths
+
+    def get_mode(self):
+        return self._mode
+
+    def __init__(self, mode=configurator.SAMPLE_PROFILE):
+        self._mode = mode
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = []
+        self._callback_stacks = {}
+        self._callback_stats = defaultdict(lambda: [0, 0, 0])
+        self._stage_samples = defaultdict(int)
+        self._stack_samples = defaultdict(int)
+        self._sample_count = 0
+        self._sampler_thread = None
+        self._stopped = threading.Event()
+        self._start_time = time.time()
+        self._stop_time = None
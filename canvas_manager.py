@@ -117,6 +117,8 @@ class CanvasManager():
             elif event.keysym == "Left":
                 event.widget.move(self._selection, -1, 0)
 
+            self._notify_change(self._selection)
+
     def scale_region(self, event):
         if (not self._selection or 
             self.is_background(self._selection)):
@@ -157,13 +159,22 @@ class CanvasManager():
         elif event.keysym == "Left" and width > 1:
             event.widget.scale(self._selection, c[0], c[1], (width-1)/width, 1)
 
+        self._notify_change(self._selection)
+
+    def _notify_change(self, selection):
+        if self._notify_change_func is not None:
+            self._notify_change_func(selection)
+
     def is_background(self, selection):
         if "background" in self._canvas.gettags(selection):
             return True
 
         return False
 
-    def __init__(self, canvas):
+    # notifychangefunc is a callback that can be set to see when
+    # a selection is moved or scaled. The callback takes one parameter
+    # (the selection that changed)
+    def __init__(self, canvas, notifychangefunc=None):
         canvas.bind('<Up>', self.move_region)
         canvas.bind('<Down>', self.move_region)
         canvas.bind('<Left>', self.move_region)
@@ -177,3 +188,4 @@ class CanvasManager():
 
         self._canvas = canvas
         self._selection = None
+        self._notify_change_func = notifychangefunc
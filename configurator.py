@@ -1,6 +1,5 @@
 import argparse
 import logging
-from preferences_editor import PreferencesEditor
 import sys
 
 DEBUG = "debug"
@@ -8,6 +7,28 @@ DETECTION_RATE = "detectionrate" #ms
 LASER_INTENSITY = "laserintensity"
 MARKER_RADIUS = "markerradius"
 IGNORE_LASER_COLOR = "ignorelasercolor"
+DETECTION_MODE = "detectionmode"
+DETECTION_ROI = "detectionroi"
+ROI_MARGIN = "roimargin" #px
+COMPOSITE_OVERLAY = "compositeoverlay"
+REPLAY = "replay"
+REPLAY_SPEED = "replayspeed"
+REPLAY_FPS = "replayfps"
+REPLAY_SHOT = "replayshot"
+RECORD = "record"
+PROFILE = "profile"
+
+# Replay speeds
+REALTIME_REPLAY = "realtime"
+FAST_REPLAY = "fast"
+
+# Shot detection modes
+POLL_DETECTION = "poll"
+FRAME_DETECTION = "frame"
+
+# Profiling modes
+FULL_PROFILE = "full"
+SAMPLE_PROFILE = "sample"
 
 class Configurator():
     def _check_rate(self, rate):
@@ -38,7 +59,53 @@ class Configurator():
                 "equal to either \"green\" or \"red\" without quotes")
         return ignore_laser_color  
 
+    def _check_detection_mode(self, detection_mode):
+        detection_mode = detection_mode.lower()
+        if detection_mode != POLL_DETECTION and detection_mode != FRAME_DETECTION:
+            raise argparse.ArgumentTypeError("DETECTION_MODE must be a string " +
+                "equal to either \"poll\" or \"frame\" without quotes")
+        return detection_mode
+
+    def _check_margin(self, margin):
+        value = int(margin)
+        if value < 0:
+            raise argparse.ArgumentTypeError("ROI_MARGIN must be a number " +
+                "greater than or equal to 0")
+        return value
+
+    def _check_replay_speed(self, replay_speed):
+        replay_speed = replay_speed.lower()
+        if replay_speed != REALTIME_REPLAY and replay_speed != FAST_REPLAY:
+            raise argparse.ArgumentTypeError("REPLAY_SPEED must be a string " +
+                "equal to either \"realtime\" or \"fast\" without quotes")
+        return replay_speed
+
+    def _check_profile(self, profile):
+        profile = profile.lower()
+        if profile != FULL_PROFILE and profile != SAMPLE_PROFILE:
+            raise argparse.ArgumentTypeError("PROFILE must be a string " +
+                "equal to either \"full\" or \"sample\" without quotes")
+        return profile
+
+    def _check_fps(self, fps):
+        value = int(fps)
+        if value < 1:
+            raise argparse.ArgumentTypeError("REPLAY_FPS must be a number " +
+                "greater than 0")
+        return value
+
+    def _check_shot(self, shot):
+        value = int(shot)
+        if value < 1:
+            raise argparse.ArgumentTypeError("REPLAY_SHOT must be a number " +
+                "greater than 0")
+        return value
+
     def __init__(self):
+        # The preferences editor needs Tk, which isn't available when the
+        # detection engine runs headless and only needs the constants above
+        from preferences_editor import PreferencesEditor
+
         # Load configuration information from the config file, which will
         # be over-ridden if settings are set on the command line
         config, preferences = PreferencesEditor.map_configuration()
@@ -61,9 +128,54 @@ class Configurator():
             type=self._check_ignore_laser_color,
             help="sets the color of laser that should be ignored by ShootOFF (green " +
                 "or red). No color is ignored by default")
+        parser.add_argument("-t", "--detection-mode",
+            type=self._check_detection_mode,
+            help="sets how frames are checked for shots (poll or frame). poll " +
+                "checks the newest frame every DETECTION_RATE milliseconds, frame " +
+                "checks every frame the webcam captures")
+        parser.add_argument("-o", "--detection-roi", action="store_true",
+            help="only look for shots around the targets on the webcam feed. " +
+                "this makes detection much cheaper, but misses far away from " +
+                "every target will not be detected")
+        parser.add_argument("-g", "--roi-margin", type=self._check_margin,
+            help="sets how many pixels around the targets are still checked " +
+                "for shots when --detection-roi is on")
+        parser.add_argument("--composite-overlay", action="store_true",
+            help="draw targets and shot markers into the webcam feed instead " +
+                "of on top of it. this keeps the feed fast with many targets " +
+                "and shots")
+        parser.add_argument("--replay",
+            help="use a recorded video file, a directory of images, or a " +
+                "session recording instead of the webcam")
+        parser.add_argument("--replay-speed", type=self._check_replay_speed,
+            default=REALTIME_REPLAY,
+            help="sets how fast frames are replayed (realtime or fast). fast " +
+                "replays frames as quickly as they can be read")
+        parser.add_argument("--replay-fps", type=self._check_fps,
+            help="sets the frame rate a directory of images was recorded at. " +
+                "the default is 30")
+        parser.add_argument("--replay-shot", type=self._check_shot,
+            help="start replaying a session recording just before its " +
+                "REPLAY_SHOT-th shot (the first shot is 1)")
+        parser.add_argument("--record", action="store_true",
+            help="record the frames checked for shots, the shots, and the " +
+                "targets to the recordings directory so the session can be " +
+                "replayed with --replay")
+        parser.add_argument("--profile", nargs="?", type=self._check_profile,
+            const=FULL_PROFILE,
+            help="profile refreshing the feed, detecting and handling shots, " +
+                "and the training protocol's listeners, and save the profile " +
+                "to the profile directory on exit. full (the default) uses " +
+                "cProfile, which is slow, sample is cheap enough to leave on")
         args = parser.parse_args()
 
         preferences[DEBUG] = args.debug
+        preferences[REPLAY] = args.replay
+        preferences[REPLAY_SPEED] = args.replay_speed
+        preferences[REPLAY_FPS] = args.replay_fps
+        preferences[REPLAY_SHOT] = args.replay_shot
+        preferences[RECORD] = args.record
+        preferences[PROFILE] = args.profile
 
         if args.detection_rate:
             preferences[DETECTION_RATE] = args.detection_rate
@@ -77,6 +189,18 @@ class Configurator():
         if args.ignore_laser_color:
             preferences[IGNORE_LASER_COLOR] = args.ignore_laser_color
 
+        if args.detection_mode:
+            preferences[DETECTION_MODE] = args.detection_mode
+
+        if args.detection_roi:
+            preferences[DETECTION_ROI] = args.detection_roi
+
+        if args.roi_margin is not None:
+            preferences[ROI_MARGIN] = args.roi_margin
+
+        if args.composite_overlay:
+            preferences[COMPOSITE_OVERLAY] = args.composite_overlay
+
         self._preferences = preferences
         self._config_parser = config
 
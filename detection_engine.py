@@ -0,0 +1,345 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from blob_detector import find_blobs, BLOB_X, BLOB_Y
+import configurator
+import cv2
+from detection_stats import DetectionStats
+from laser_color import LaserColorClassifier
+from region_raster import RegionRaster
+from shot_latency import (LATENCY_DETECT, LATENCY_THRESHOLD, LATENCY_BLOB,
+    LATENCY_COLOR, LATENCY_HIT_TEST)
+import time
+
+LASER_TRACKING_DISTANCE = 20 # px
+
+# Stages of the detection pipeline that can be timed
+STAGE_THRESHOLD = "threshold"
+STAGE_BLOBS = "blobs"
+STAGE_COLOR = "color"
+STAGE_HIT_TEST = "hit_test"
+STAGE_TOTAL = "total"
+STAGES = (STAGE_THRESHOLD, STAGE_BLOBS, STAGE_COLOR, STAGE_HIT_TEST, STAGE_TOTAL)
+
+# A shot found by the detection engine. coords may be a fraction of a pixel,
+# timestamp is when the frame the shot was found in was captured, and region
+# and tags identify the top most target region that was hit (both are None
+# for a miss). marks is a dictionary mapping each stage in
+# shot_latency.LATENCY_STAGES the shot has gotten through to when it did.
+class ShotEvent():
+    def get_color(self):
+        return self._laser_color
+
+    def get_coords(self):
+        return self._coords
+
+    def get_timestamp(self):
+        return self._timestamp
+
+    def get_sequence(self):
+        return self._sequence
+
+    def get_region(self):
+        return self._region
+
+    def get_tags(self):
+        return self._tags
+
+    def is_hit(self):
+        return self._region is not None
+
+    def get_marks(self):
+        return self._marks
+
+    # Records that the shot got through stage at when (now by default)
+    def mark(self, stage, when=None):
+        if when is None:
+            when = time.time()
+
+        self._marks[stage] = when
+
+    def __init__(self, laser_color, coords, timestamp, sequence=None,
+        region=None, tags=None, marks=None):
+
+        self._laser_color = laser_color
+        self._coords = coords
+        self._timestamp = timestamp
+        self._sequence = sequence
+        self._region = region
+        self._tags = tags
+        self._marks = {}
+
+        if marks is not None:
+            self._marks.update(marks)
+
+# Turns webcam frames into shots. The engine does not depend on Tk: it takes
+# BGR numpy frames and returns ShotEvents, so it can be run, profiled, and
+# benchmarked without a display. The Tk feed is just one consumer of it.
+#
+# preferences is a dictionary using the keys defined in configurator (the
+# engine reads it every frame, so changes take effect right away).
+#
+# interferencefunc is a callback that can be set to see when glare or a
+# light source is detected on the feed. It takes one parameter (the fraction
+# of the thresholded frame that is dark) and is called from whatever thread
+# frames are processed on.
+class DetectionEngine():
+    # Returns a list of ShotEvents for the shots in frame (a BGR image).
+    # sequence and timestamp identify the frame. When the detection mode is
+    # FRAME_DETECTION the engine is expected to see every frame, so a laser
+    # spot is only reported in the first frame it shows up in.
+    def process_frame(self, frame, sequence, timestamp):
+        start = time.time()
+        timing = self._stage_times is not None
+        spots = []
+
+        if self._region_raster.get_size() != (frame.shape[1], frame.shape[0]):
+            self.set_frame_size(frame.shape[1], frame.shape[0])
+
+        if timing:
+            for stage in STAGES:
+                self._frame_stage_times[stage] = 0
+
+        for detection_region in self.get_detection_regions(frame):
+            spots.extend(self._find_spots(frame, detection_region, timing))
+
+        if timing:
+            stage_start = time.time()
+
+        shots = []
+
+        for (laser_color, x, y, marks) in spots:
+            if (self._detection_mode == configurator.FRAME_DETECTION and
+                self._was_laser_visible(laser_color, x, y)):
+                continue
+
+            (region, tags) = self.hit_test(x, y)
+            shot_event = ShotEvent(laser_color, (x, y), timestamp, sequence,
+                region, tags, marks)
+            shot_event.mark(LATENCY_DETECT, start)
+            shot_event.mark(LATENCY_HIT_TEST)
+            shots.append(shot_event)
+
+        self._visible_lasers = [spot[:3] for spot in spots]
+        elapsed = time.time() - start
+        self._stats.record(sequence, timestamp, elapsed)
+
+        if timing:
+            self._record_stage(STAGE_HIT_TEST, stage_start)
+            self._frame_stage_times[STAGE_TOTAL] = elapsed
+
+            for stage in STAGES:
+                self._stage_times[stage].append(self._frame_stage_times[stage])
+
+        return shots
+
+    # Creates a shot that was not found in a frame (e.g. a shot that was
+    # clicked on the feed in debug mode)
+    def create_shot(self, laser_color, x, y, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        (region, tags) = self.hit_test(x, y)
+        return ShotEvent(laser_color, (x, y), timestamp, None, region, tags)
+
+    # Returns a list of (laser_color, x, y, marks) tuples for the laser
+    # spots in the (x1, y1, x2, y2) slice of frame. Coordinates are
+    # relative to the whole frame and marks are the latency marks for the
+    # stages the spot went through (see ShotEvent).
+    def _find_spots(self, frame, detection_region, timing=False):
+        spots = []
+        (x1, y1, x2, y2) = detection_region
+
+        if timing:
+            stage_start = time.time()
+
+        # Makes feed black and white
+        frame_bw = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.cv.CV_BGR2GRAY)
+
+        # Threshold the image
+        (thresh, frame_thresh) = cv2.threshold(frame_bw,
+            self._preferences[configurator.LASER_INTENSITY], 255, cv2.THRESH_BINARY)
+
+        # Determine if we have a light source or glare on the feed
+        if not self._seen_interference:
+            self.detect_interference(frame_thresh)
+
+        threshold_time = time.time()
+
+        if timing:
+            stage_start = self._record_stage(STAGE_THRESHOLD, stage_start)
+
+        blobs = find_blobs(frame_thresh, frame_bw)
+
+        if len(blobs) > 0:
+            blob_time = time.time()
+
+        if timing:
+            stage_start = self._record_stage(STAGE_BLOBS, stage_start)
+
+        # Every bright spot is a potential shot (e.g. two shooters or
+        # a red and green laser hitting at the same time)
+        for blob in blobs:
+            # Keep the sub-pixel coordinates, they are only rounded
+            # where a whole pixel is needed
+            x = blob[BLOB_X] + x1
+            y = blob[BLOB_Y] + y1
+
+            # Get the average color around the coordinates. If
+            # the dominant color is red, it's a red laser, if
+            # it's green it's a green laser, otherwise it's probably
+            # not a laser trainer, so ignore it
+            laser_color = self._laser_color_classifier.classify(frame, x, y)
+
+            if (laser_color is not None and
+                self._preferences[configurator.IGNORE_LASER_COLOR] not in laser_color):
+
+                spots.append((laser_color, x, y, {
+                    LATENCY_THRESHOLD: threshold_time,
+                    LATENCY_BLOB: blob_time,
+                    LATENCY_COLOR: time.time()}))
+
+        if timing:
+            self._record_stage(STAGE_COLOR, stage_start)
+
+        return spots
+
+    def _record_stage(self, stage, stage_start):
+        now = time.time()
+        self._frame_stage_times[stage] += now - stage_start
+        return now
+
+    # Start recording how long each stage of the pipeline takes for every
+    # frame. This costs a little time per frame, so it's off by default.
+    def enable_stage_timing(self):
+        self._stage_times = dict([(stage, []) for stage in STAGES])
+        self._frame_stage_times = {}
+
+    # Returns a dictionary mapping each stage in STAGES to a list of how
+    # many seconds it took for every frame processed since stage timing was
+    # enabled, or None if it isn't enabled
+    def get_stage_times(self):
+        return self._stage_times
+
+    def detect_interference(self, image_thresh):
+        brightness_hist = cv2.calcHist([image_thresh], [0], None, [256], [0, 255])
+        percent_dark = brightness_hist[0] / image_thresh.size
+
+        # If 99% of thresholded image isn't dark, we probably have
+        # a light source or glare in the image
+        if (percent_dark < .99):
+            # We will only warn about interference once each run
+            self._seen_interference = True
+
+            self._logger.warning(
+                "Glare or light source detected. %f of the image is dark." %
+                percent_dark)
+
+            if self._interference_func is not None:
+                self._interference_func(percent_dark)
+
+    # Returns True if a laser of the same color was close to (x, y) in
+    # the last frame that was processed
+    def _was_laser_visible(self, laser_color, x, y):
+        for (visible_color, visible_x, visible_y) in self._visible_lasers:
+            if (visible_color == laser_color and
+                abs(visible_x - x) <= LASER_TRACKING_DISTANCE and
+                abs(visible_y - y) <= LASER_TRACKING_DISTANCE):
+                return True
+
+        return False
+
+    # Returns a list of (x1, y1, x2, y2) regions of frame that should be
+    # checked for shots. This is the whole frame unless detection is
+    # restricted to the area around the targets.
+    def get_detection_regions(self, frame):
+        height = frame.shape[0]
+        width = frame.shape[1]
+        target_bboxes = self._region_raster.get_target_bboxes()
+
+        if (not self._preferences[configurator.DETECTION_ROI] or
+            len(target_bboxes) == 0):
+            return [(0, 0, width, height)]
+
+        margin = self._preferences[configurator.ROI_MARGIN]
+        regions = []
+
+        for bbox in target_bboxes:
+            region = (max(0, int(bbox[0]) - margin),
+                max(0, int(bbox[1]) - margin),
+                min(width, int(bbox[2]) + margin),
+                min(height, int(bbox[3]) + margin))
+
+            # Skip targets that are completely off of the feed
+            if region[0] < region[2] and region[1] < region[3]:
+                regions.append(region)
+
+        # Merge overlapping regions so that no part of the frame is
+        # checked twice
+        merged_regions = []
+
+        while len(regions) > 0:
+            region = regions.pop()
+
+            for other in merged_regions:
+                if (region[0] < other[2] and other[0] < region[2] and
+                    region[1] < other[3] and other[1] < region[3]):
+
+                    merged_regions.remove(other)
+                    regions.append((min(region[0], other[0]),
+                        min(region[1], other[1]), max(region[2], other[2]),
+                        max(region[3], other[3])))
+                    break
+            else:
+                merged_regions.append(region)
+
+        return merged_regions
+
+    # Tell the engine what size frames are, so that targets can be mapped
+    # onto them
+    def set_frame_size(self, width, height):
+        self._region_raster.resize(width, height)
+
+    # Tell the engine what targets can be hit. targets is a list of
+    # (name, regions) tuples with one entry per target, later targets are
+    # on top. regions is a list of (region, coords, tags) tuples for the
+    # target's regions from the bottom most to the top most. region is
+    # whatever identifies the region to the caller (e.g. its canvas id),
+    # coords are its canvas coordinates, and tags is its dictionary of
+    # parsed tags.
+    def set_targets(self, targets):
+        self._region_raster.set_targets(targets)
+
+    # Adds a target on top of the others, or updates a target that was
+    # moved or scaled. regions is in the same format as for set_targets.
+    # mask is an optional (patch, origin) tuple with the regions already
+    # rasterized (e.g. from a CompiledTarget), so they aren't drawn again.
+    def set_target(self, name, regions, mask=None):
+        self._region_raster.set_target(name, regions, mask)
+
+    def remove_target(self, name):
+        self._region_raster.remove_target(name)
+
+    # Returns a (region, tags) tuple for the top most target region at
+    # (x, y) or (None, None) if no target was hit
+    def hit_test(self, x, y):
+        return self._region_raster.hit_test(x, y)
+
+    def get_stats(self):
+        return self._stats
+
+    def __init__(self, preferences, logger, interferencefunc=None):
+        self._preferences = preferences
+        self._logger = logger
+        self._interference_func = interferencefunc
+        self._laser_color_classifier = LaserColorClassifier()
+        # The detection threads are started for the mode ShootOFF was
+        # started in, so changing it only takes effect after a restart
+        self._detection_mode = preferences[configurator.DETECTION_MODE]
+        self._stats = DetectionStats(self._detection_mode, logger)
+        self._seen_interference = False
+        self._visible_lasers = []
+        self._region_raster = RegionRaster()
+        self._stage_times = None
+        self._frame_stage_times = None
@@ -0,0 +1,85 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import time
+
+REPORT_INTERVAL = 300 # frames
+
+# Keeps track of how much work shot detection is doing so that the
+# detection modes can be compared: how many frames were examined, how many
+# captured frames were never examined, how long each frame took to process
+# compared to the time budget for a frame (the interval between captured
+# frames), and how much CPU the process used in the meantime.
+class DetectionStats():
+    # sequence and timestamp identify the frame that was examined and
+    # elapsed is how many seconds it took to process
+    def record(self, sequence, timestamp, elapsed):
+        if self._last_sequence is not None and sequence > self._last_sequence:
+            self._skipped_frames += sequence - self._last_sequence - 1
+
+            interval = ((timestamp - self._last_timestamp) /
+                (sequence - self._last_sequence))
+
+            # Smooth out jitter in when frames show up
+            if self._frame_budget is None:
+                self._frame_budget = interval
+            else:
+                self._frame_budget = self._frame_budget * .9 + interval * .1
+
+        self._last_sequence = sequence
+        self._last_timestamp = timestamp
+
+        self._examined_frames += 1
+        self._total_time += elapsed
+        self._max_time = max(self._max_time, elapsed)
+
+        if self._frame_budget is not None and elapsed > self._frame_budget:
+            self._over_budget_frames += 1
+
+        if self._examined_frames >= REPORT_INTERVAL:
+            self.report()
+            self.reset()
+
+    def report(self):
+        if self._examined_frames == 0:
+            return
+
+        times = os.times()
+        cpu_time = (times[0] + times[1]) - self._start_cpu_time
+        wall_time = time.time() - self._start_wall_time
+
+        cpu_percent = 0
+        if wall_time > 0:
+            cpu_percent = cpu_time / wall_time * 100
+
+        budget = 0
+        if self._frame_budget is not None:
+            budget = self._frame_budget * 1000
+
+        self._logger.debug("%s shot detection: examined %d frames, skipped %d, " +
+            "%d over the %.1f ms frame budget, average %.2f ms, max %.2f ms, " +
+            "%.1f%% CPU", self._mode, self._examined_frames, self._skipped_frames,
+            self._over_budget_frames, budget,
+            self._total_time / self._examined_frames * 1000,
+            self._max_time * 1000, cpu_percent)
+
+    def reset(self):
+        times = os.times()
+        self._start_cpu_time = times[0] + times[1]
+        self._start_wall_time = time.time()
+
+        self._examined_frames = 0
+        self._skipped_frames = 0
+        self._over_budget_frames = 0
+        self._total_time = 0
+        self._max_time = 0
+
+    def __init__(self, mode, logger):
+        self._mode = mode
+        self._logger = logger
+        self._last_sequence = None
+        self._last_timestamp = None
+        self._frame_budget = None
+        self.reset()
@@ -0,0 +1,115 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import time
+
+DEFAULT_FEED_FPS = 30
+MIN_DELAY = 1 # ms
+MAX_DELAY = 100 # ms
+ARRIVAL_SLACK = .002 # s
+REPORT_INTERVAL = 1 # s
+
+# Decides when the webcam feed should be refreshed next. Instead of a fixed
+# delay, it measures how often frames really arrive from the camera and how
+# long showing one takes, and waits until just after the next frame should
+# have arrived. When showing frames takes longer than the camera takes to
+# capture them the feed is refreshed as soon as Tk is free again, and the
+# frames captured in the meantime are dropped (only the latest one is ever
+# shown) instead of piling up.
+class DisplayScheduler():
+    # Called after a frame was shown with the frame's sequence and capture
+    # timestamp and how many seconds showing it took. Returns True when the
+    # achieved frame rate was just updated.
+    def frame_shown(self, sequence, timestamp, render_time):
+        if self._last_sequence is not None and sequence > self._last_sequence:
+            self._dropped_frames += sequence - self._last_sequence - 1
+
+            interval = ((timestamp - self._last_timestamp) /
+                (sequence - self._last_sequence))
+
+            # Smooth out jitter in when frames show up
+            if interval > 0:
+                self._frame_interval = self._frame_interval * .9 + interval * .1
+
+        self._last_sequence = sequence
+        self._last_timestamp = timestamp
+
+        if self._render_time is None:
+            self._render_time = render_time
+        else:
+            self._render_time = self._render_time * .9 + render_time * .1
+
+        self._shown_frames += 1
+
+        now = time.time()
+        elapsed = now - self._period_start
+
+        if elapsed < REPORT_INTERVAL:
+            return False
+
+        self._fps = self._shown_frames / elapsed
+        self._period_dropped_frames = self._dropped_frames
+        self._shown_frames = 0
+        self._dropped_frames = 0
+        self._period_start = now
+
+        return True
+
+    # Returns how many ms to wait before refreshing the feed again after a
+    # frame was shown
+    def get_delay(self):
+        return self._get_delay(MIN_DELAY)
+
+    # Returns how many ms to wait before checking again when the feed was
+    # refreshed but no new frame had been captured yet. A camera that is
+    # late is checked every quarter of a frame instead of constantly.
+    def get_wait_delay(self):
+        return self._get_delay(max(MIN_DELAY,
+            int(self._frame_interval * 1000 / 4)))
+
+    def _get_delay(self, min_delay):
+        if self._last_timestamp is None:
+            return int(self._frame_interval * 1000)
+
+        next_arrival = (self._last_timestamp + self._frame_interval +
+            ARRIVAL_SLACK)
+        delay = int((next_arrival - time.time()) * 1000)
+
+        return max(min_delay, min(MAX_DELAY, delay))
+
+    # Sets the frame rate the camera says it captures at, which is used
+    # until the real rate has been measured
+    def set_camera_fps(self, fps):
+        self._frame_interval = 1.0 / fps
+
+    # Returns the frame rate frames are being captured at
+    def get_camera_fps(self):
+        return 1.0 / self._frame_interval
+
+    # Returns how many frames per second were shown over the last second
+    def get_fps(self):
+        return self._fps
+
+    # Returns the number of captured frames that were never shown over the
+    # last second
+    def get_dropped_frames(self):
+        return self._period_dropped_frames
+
+    # Returns the smoothed number of seconds it takes to show a frame
+    def get_render_time(self):
+        if self._render_time is None:
+            return 0
+
+        return self._render_time
+
+    def __init__(self, fps=DEFAULT_FEED_FPS):
+        self._frame_interval = 1.0 / fps
+        self._last_sequence = None
+        self._last_timestamp = None
+        self._render_time = None
+        self._shown_frames = 0
+        self._dropped_frames = 0
+        self._period_dropped_frames = 0
+        self._period_start = time.time()
+        self._fps = 0
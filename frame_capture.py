@@ -0,0 +1,557 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import glob
+import numpy
+import os
+from session_recording import SessionRecording, is_recording
+from threading import Condition, Thread
+import time
+
+RING_SIZE = 8
+MAX_MISSED_FRAMES = 25
+
+# How long to wait before reading again after a read failed, and how long
+# reads have to keep failing before the camera is given up on, so that a
+# short USB or driver glitch doesn't stop shot processing
+MISSED_FRAME_DELAY = .03 # s
+DISCONNECT_TIMEOUT = .75 # s
+DEFAULT_REPLAY_FPS = 30
+IMAGE_EXTENSIONS = (".bmp", ".jpeg", ".jpg", ".png", ".ppm", ".tif", ".tiff")
+
+# How many frames before a shot replaying starts at when seeking to it, so
+# that the detector sees the frames leading up to the shot
+SHOT_LEAD_IN_FRAMES = 5
+
+# A fixed size ring of preallocated frame buffers shared by one writer (the
+# capture thread) and any number of readers (the display, shot detection, etc.).
+#
+# No locks are taken. Every slot records the sequence number of the frame it
+# holds. The writer invalidates a slot's sequence number before it overwrites
+# the pixels and publishes the new sequence number when it is done, so a
+# reader copies a slot out and then checks that the sequence number is still
+# the one it expected. If it isn't, the writer lapped the reader and the copy
+# is thrown away.
+#
+# A lossless ring never overwrites a frame its consumer hasn't released, the
+# writer waits instead. This is only useful when frames are replayed as fast
+# as possible and one consumer has to see every one of them.
+class FrameRing():
+    # Returns the buffer the next frame should be written into, or None if
+    # the ring doesn't know the frame size yet. The slot is invalid until
+    # end_write is called.
+    def begin_write(self):
+        if self._lossless:
+            # The frame after the last released one has to stay readable
+            # while the next frame is written, see read_next
+            with self._frame_available:
+                while (self._latest - self._released >= self._size - 1 and
+                    not self._closed):
+                    self._frame_available.wait(.1)
+
+        slot = (self._latest + 1) % self._size
+        self._sequences[slot] = -1
+
+        if self._buffers is None:
+            return None
+
+        return self._buffers[slot]
+
+    # Publish the frame that was just captured. If the frame wasn't captured
+    # directly into the buffer returned by begin_write (e.g. this is the
+    # first frame or the camera changed resolution) it is copied in.
+    def end_write(self, frame, timestamp):
+        sequence = self._latest + 1
+        slot = sequence % self._size
+
+        if (self._buffers is None or
+            self._buffers[slot].shape != frame.shape or
+            self._buffers[slot].dtype != frame.dtype):
+
+            self._allocate(frame.shape, frame.dtype)
+
+        if frame is not self._buffers[slot]:
+            numpy.copyto(self._buffers[slot], frame)
+
+        self._timestamps[slot] = timestamp
+        self._sequences[slot] = sequence
+        self._latest = sequence
+
+        # Wake up any consumers waiting for this frame. The condition is only
+        # used for waking up waiters, readers never need it to read a frame.
+        with self._frame_available:
+            self._frame_available.notify_all()
+
+    def _allocate(self, shape, dtype):
+        self._buffers = [numpy.zeros(shape, dtype) for i in range(self._size)]
+        self._sequences = [-1] * self._size
+
+    def get_latest_sequence(self):
+        return self._latest
+
+    # Tell a lossless ring that the consumer is done with every frame up to
+    # and including sequence
+    def release(self, sequence):
+        if not self._lossless:
+            return
+
+        with self._frame_available:
+            self._released = sequence
+            self._frame_available.notify_all()
+
+    # Stop waiting for the consumer of a lossless ring (e.g. because it
+    # is shutting down)
+    def close(self):
+        with self._frame_available:
+            self._closed = True
+            self._frame_available.notify_all()
+
+    # Block until a frame newer than last_sequence is in the ring or until
+    # timeout seconds have passed. Returns True if there is a new frame.
+    def wait_for_frame(self, last_sequence, timeout):
+        with self._frame_available:
+            if self._latest <= last_sequence:
+                self._frame_available.wait(timeout)
+
+        return self._latest > last_sequence
+
+    # Copy the frame with the given sequence number into out (a new array
+    # is allocated if out is None or the wrong shape). Returns a
+    # (timestamp, frame) tuple or None if that frame is no longer (or not yet)
+    # in the ring.
+    def read(self, sequence, out=None):
+        if sequence < 0:
+            return None
+
+        slot = sequence % self._size
+        if self._sequences[slot] != sequence:
+            return None
+
+        buffers = self._buffers
+        timestamp = self._timestamps[slot]
+
+        if (out is None or out.shape != buffers[slot].shape or
+            out.dtype != buffers[slot].dtype):
+
+            out = buffers[slot].copy()
+        else:
+            numpy.copyto(out, buffers[slot])
+
+        # The writer got to this slot while we were copying it
+        if self._sequences[slot] != sequence:
+            return None
+
+        return (timestamp, out)
+
+    # Returns a (sequence, timestamp, frame) tuple for the newest frame in the
+    # ring or None if nothing has been captured yet.
+    def read_latest(self, out=None):
+        while True:
+            sequence = self._latest
+            if sequence < 0:
+                return None
+
+            frame = self.read(sequence, out)
+            if frame is not None:
+                return (sequence, frame[0], frame[1])
+
+    # Returns a (sequence, timestamp, frame) tuple for the oldest frame in the
+    # ring that is newer than last_sequence, or None if there is no such frame.
+    # Consumers that must see every frame call this with the sequence number of
+    # the last frame they saw. If the sequence number returned isn't
+    # last_sequence + 1, the consumer fell behind and frames were dropped.
+    def read_next(self, last_sequence, out=None):
+        while True:
+            latest = self._latest
+            if latest <= last_sequence:
+                return None
+
+            # The slot after the latest frame may be mid-write, so the oldest
+            # frame we can count on is the one after that
+            sequence = max(last_sequence + 1, latest - self._size + 2)
+            frame = self.read(sequence, out)
+            if frame is not None:
+                return (sequence, frame[0], frame[1])
+
+    def __init__(self, size=RING_SIZE, lossless=False):
+        self._size = size
+        self._lossless = lossless
+        self._buffers = None
+        self._sequences = [-1] * size
+        self._timestamps = [0.0] * size
+        self._latest = -1
+        self._released = -1
+        self._closed = False
+        self._frame_available = Condition()
+
+# Capture sources are where FrameCapture gets frames from. Every source
+# has the same methods: read returns a (rval, frame) tuple like
+# cv2.VideoCapture.read and reads into buffer if it can, is_finished is True
+# once a source that has an end (e.g. a video file) has been read to the end.
+
+# A webcam
+class CameraSource():
+    def read(self, buffer=None):
+        if buffer is None:
+            return self._capture.read()
+        else:
+            return self._capture.read(buffer)
+
+    def is_opened(self):
+        return self._capture.isOpened()
+
+    def is_finished(self):
+        return False
+
+    def get_resolution(self):
+        return (self._capture.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH),
+            self._capture.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT))
+
+    def set_resolution(self, width, height):
+        self._capture.set(cv2.cv.CV_CAP_PROP_FRAME_WIDTH, width)
+        self._capture.set(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT, height)
+
+    def get_fps(self):
+        return self._capture.get(cv2.cv.CV_CAP_PROP_FPS)
+
+    def release(self):
+        self._capture.release()
+
+    def __init__(self, index=0):
+        self._capture = cv2.VideoCapture(index)
+
+# Common code for sources that replay recorded frames. When realtime is
+# True frames are handed out at the rate they were recorded at, otherwise
+# they are handed out as fast as they can be read.
+class ReplaySource():
+    def read(self, buffer=None):
+        if self._finished:
+            return (False, None)
+
+        rval, frame = self._read_frame(buffer)
+
+        if not rval:
+            self._finished = True
+            return (False, None)
+
+        if self._realtime:
+            if self._start_time is None:
+                self._start_time = time.time()
+
+            delay = (self._start_time + float(self._frame_count) / self.get_fps() -
+                time.time())
+
+            if delay > 0:
+                time.sleep(delay)
+
+        self._frame_count += 1
+        return (rval, frame)
+
+    def is_opened(self):
+        return self._opened
+
+    def is_finished(self):
+        return self._finished
+
+    # Recorded frames can't change size
+    def set_resolution(self, width, height):
+        pass
+
+    def __init__(self, realtime=True):
+        self._realtime = realtime
+        self._opened = False
+        self._finished = False
+        self._start_time = None
+        self._frame_count = 0
+
+# A recorded video file
+class VideoFileSource(ReplaySource):
+    def _read_frame(self, buffer):
+        if buffer is None:
+            return self._capture.read()
+        else:
+            return self._capture.read(buffer)
+
+    def get_resolution(self):
+        return (self._capture.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH),
+            self._capture.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT))
+
+    def get_fps(self):
+        fps = self._capture.get(cv2.cv.CV_CAP_PROP_FPS)
+
+        if fps <= 0:
+            return DEFAULT_REPLAY_FPS
+
+        return fps
+
+    def release(self):
+        self._capture.release()
+
+    def __init__(self, video_file, realtime=True):
+        ReplaySource.__init__(self, realtime)
+        self._capture = cv2.VideoCapture(video_file)
+        self._opened = self._capture.isOpened()
+
+# A directory of image files, replayed in file name order
+class ImageSequenceSource(ReplaySource):
+    def _read_frame(self, buffer):
+        if self._index >= len(self._image_files):
+            return (False, None)
+
+        frame = cv2.imread(self._image_files[self._index])
+        self._index += 1
+
+        if frame is None:
+            return (False, None)
+
+        if (buffer is not None and buffer.shape == frame.shape and
+            buffer.dtype == frame.dtype):
+
+            numpy.copyto(buffer, frame)
+            return (True, buffer)
+
+        return (True, frame)
+
+    def get_resolution(self):
+        return self._resolution
+
+    def get_fps(self):
+        return self._fps
+
+    def release(self):
+        pass
+
+    def __init__(self, directory, fps=DEFAULT_REPLAY_FPS, realtime=True):
+        ReplaySource.__init__(self, realtime)
+        self._fps = fps
+        self._index = 0
+
+        self._image_files = sorted([image_file for image_file in
+            glob.glob(os.path.join(directory, "*"))
+            if os.path.splitext(image_file)[1].lower() in IMAGE_EXTENSIONS])
+
+        self._resolution = (0, 0)
+
+        if len(self._image_files) > 0:
+            first_frame = cv2.imread(self._image_files[0])
+
+            if first_frame is not None:
+                self._resolution = (first_frame.shape[1], first_frame.shape[0])
+                self._opened = True
+
+# A session recorded by SessionRecorder. Frames are read straight from the
+# recording, so shot detection sees exactly the frames it saw when the
+# session was recorded.
+#
+# The targets that were on the feed change part way through most
+# recordings (targets are usually placed after recording started), so
+# they are looked up per replayed frame. A replayed frame is numbered by
+# how many frames were read before it since the replay started, which is
+# the sequence number FrameCapture gives it.
+class RecordingSource(ReplaySource):
+    def _read_frame(self, buffer):
+        if self._index >= self._recording.get_frame_count():
+            return (False, None)
+
+        frame = self._recording.read_frame(self._index)[2]
+        self._index += 1
+
+        if (buffer is not None and buffer.shape == frame.shape and
+            buffer.dtype == frame.dtype):
+
+            numpy.copyto(buffer, frame)
+            return (True, buffer)
+
+        # Frames read from the recording are read only
+        return (True, frame.copy())
+
+    # Starts replaying from the frame with number index (see
+    # SessionRecording)
+    def seek(self, index):
+        self._index = max(0, min(index, self._recording.get_frame_count()))
+        self._start_index = self._index
+        self._start_time = None
+        self._frame_count = 0
+
+    # Starts replaying lead_in frames before the frame the shot_number-th
+    # shot (counting from 0) was found in. Returns False if the recording
+    # doesn't have that many shots.
+    def seek_to_shot(self, shot_number, lead_in=SHOT_LEAD_IN_FRAMES):
+        index = self._recording.find_shot(shot_number)
+
+        if index is None:
+            return False
+
+        self.seek(index - lead_in)
+        return True
+
+    # Returns the targets that were on the feed when the replayed frame
+    # with sequence was recorded (see SessionRecording.get_targets)
+    def get_targets(self, sequence=0):
+        recorded_sequence = self._get_recorded_sequence(sequence)
+
+        if recorded_sequence is None:
+            return []
+
+        return self._recording.get_targets(recorded_sequence)
+
+    # Returns a number for the targets of the replayed frame with sequence
+    # that only changes when they do (see SessionRecording.get_targets_id)
+    def get_targets_id(self, sequence=0):
+        recorded_sequence = self._get_recorded_sequence(sequence)
+
+        if recorded_sequence is None:
+            return -1
+
+        return self._recording.get_targets_id(recorded_sequence)
+
+    # Returns the sequence number the replayed frame with sequence had when
+    # it was recorded, or None if the recording doesn't have any frames
+    def _get_recorded_sequence(self, sequence):
+        count = self._recording.get_frame_count()
+
+        if count == 0:
+            return None
+
+        return self._recording.get_sequence(
+            max(0, min(self._start_index + sequence, count - 1)))
+
+    def get_recording(self):
+        return self._recording
+
+    def get_resolution(self):
+        return self._resolution
+
+    def get_fps(self):
+        fps = self._recording.get_fps()
+
+        if fps <= 0:
+            return DEFAULT_REPLAY_FPS
+
+        return fps
+
+    def release(self):
+        self._recording.close()
+
+    def __init__(self, path, realtime=True):
+        ReplaySource.__init__(self, realtime)
+        self._recording = SessionRecording(path)
+        self._index = 0
+        self._start_index = 0
+        self._resolution = (0, 0)
+
+        if self._recording.get_frame_count() > 0:
+            first_frame = self._recording.read_frame(0)[2]
+            self._resolution = (first_frame.shape[1], first_frame.shape[0])
+            self._opened = True
+
+# Returns a source that replays path, which is either a video file, a
+# directory of images, or a session recording
+def open_replay_source(path, realtime=True, fps=DEFAULT_REPLAY_FPS):
+    if os.path.isdir(path):
+        return ImageSequenceSource(path, fps, realtime)
+    elif is_recording(path):
+        return RecordingSource(path, realtime)
+    else:
+        return VideoFileSource(path, realtime)
+
+# Continuously reads frames from a capture source on its own thread so that
+# slow work on the Tk thread never causes camera frames to be dropped.
+class FrameCapture():
+    def start(self):
+        self._start_time = time.time()
+        self._capture_thread = Thread(target=self._capture_frames,
+            name="capture_thread")
+        self._capture_thread.daemon = True
+        self._capture_thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._ring.close()
+
+        if self._capture_thread is not None:
+            self._capture_thread.join()
+            self._capture_thread = None
+
+    def _capture_frames(self):
+        while not self._stopped:
+            buffer = self._ring.begin_write()
+
+            if self._stopped:
+                return
+
+            if buffer is None:
+                rval, frame = self._source.read()
+            else:
+                rval, frame = self._source.read(buffer)
+
+            if not rval and self._source.is_finished():
+                self._logger.info("Replay finished: %d frames in %.2f s (%.1f fps)",
+                    self._frame_count, time.time() - self._start_time,
+                    self.get_capture_rate())
+                self._finished = True
+                return
+
+            if not rval:
+                if self._miss_count == 0:
+                    self._first_miss_time = time.time()
+
+                self._miss_count += 1
+                self._logger.debug("Missed %d webcam frames. If we miss too many " +
+                    "ShootOFF will stop processing shots.", self._miss_count)
+
+                if (self._miss_count >= MAX_MISSED_FRAMES and
+                    time.time() - self._first_miss_time >= DISCONNECT_TIMEOUT):
+
+                    self._logger.critical("Missed %d webcam frames. The camera is " +
+                        "probably disconnected so ShootOFF will stop processing " +
+                        "shots.", self._miss_count)
+                    self._disconnected = True
+                    return
+
+                time.sleep(MISSED_FRAME_DELAY)
+                continue
+
+            self._miss_count = 0
+            self._frame_count += 1
+            self._ring.end_write(frame, time.time())
+
+    def get_ring(self):
+        return self._ring
+
+    def is_disconnected(self):
+        return self._disconnected
+
+    # True once a source with an end (e.g. a video file) has been read to
+    # the end
+    def is_finished(self):
+        return self._finished
+
+    # Returns how many frames per second have been captured since start
+    def get_capture_rate(self):
+        if self._start_time is None:
+            return 0
+
+        elapsed = time.time() - self._start_time
+
+        if elapsed <= 0:
+            return 0
+
+        return float(self._frame_count) / elapsed
+
+    # When lossless is True the capture thread waits for the ring's
+    # consumer instead of overwriting frames it hasn't seen (see FrameRing)
+    def __init__(self, source, logger, ring_size=RING_SIZE, lossless=False):
+        self._source = source
+        self._logger = logger
+        self._ring = FrameRing(ring_size, lossless)
+        self._capture_thread = None
+        self._start_time = None
+        self._frame_count = 0
+        self._miss_count = 0
+        self._first_miss_time = None
+        self._disconnected = False
+        self._finished = False
+        self._stopped = False
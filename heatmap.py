@@ -0,0 +1,223 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import numpy
+import os
+
+HEATMAP_DIR = "heatmaps"
+HEATMAP_EXTENSION = ".npz"
+GRID_SIZE = 64
+
+# How opaque the coldest and hottest cells are drawn [0,255]
+MIN_ALPHA = 90
+MAX_ALPHA = 200
+
+# Counts where the shots that hit a target landed on a GRID_SIZE x GRID_SIZE
+# grid over the target's bounding box. Shots are given in target space
+# ((0, 0) is the top left of the target and (1, 1) the bottom right), so
+# shots on the same target file land in the same cells wherever it was on
+# the feed and however it was scaled. Shots are binned in batches with
+# numpy.histogram2d when the counts are needed.
+class TargetHeatmap():
+    def add_shot(self, u, v):
+        self._pending_u.append(u)
+        self._pending_v.append(v)
+
+    # Adds arrays of shots in target space
+    def add_shots(self, u, v):
+        self._flush()
+        self._counts += self._bin(u, v)
+
+    def _bin(self, u, v):
+        (counts, u_edges, v_edges) = numpy.histogram2d(v, u,
+            bins=self._counts.shape, range=((0, 1), (0, 1)))
+
+        return counts.astype(numpy.int64)
+
+    def _flush(self):
+        if len(self._pending_u) == 0:
+            return
+
+        self._counts += self._bin(self._pending_u, self._pending_v)
+        self._pending_u = []
+        self._pending_v = []
+
+    # Adds the shots of another heatmap (e.g. from another session or lane)
+    def merge(self, other):
+        counts = other.get_counts()
+
+        if counts.shape != self._counts.shape:
+            raise ValueError("Can't merge a %dx%d heatmap into a %dx%d one" %
+                (counts.shape + self._counts.shape))
+
+        self._flush()
+        self._counts += counts
+
+    # Returns the (rows, columns) array of shot counts, row 0 is the top of
+    # the target
+    def get_counts(self):
+        self._flush()
+        return self._counts
+
+    def get_shot_count(self):
+        return int(self.get_counts().sum())
+
+    # Writes the heatmap to path. It is written to a temporary file first,
+    # so a heatmap is never left half written.
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        temp_path = path + ".writing"
+        temp_file = open(temp_path, "wb")
+        numpy.savez_compressed(temp_file, counts=self.get_counts())
+        temp_file.close()
+
+        # Windows won't rename a file over one that exists
+        if os.name == "nt" and os.path.exists(path):
+            os.remove(path)
+
+        os.rename(temp_path, path)
+
+    def __init__(self, grid_size=GRID_SIZE, counts=None):
+        if counts is None:
+            counts = numpy.zeros((grid_size, grid_size), numpy.int64)
+
+        self._counts = counts.astype(numpy.int64)
+        self._pending_u = []
+        self._pending_v = []
+
+# Returns the TargetHeatmap in path
+def read_heatmap(path):
+    heatmap_file = numpy.load(path)
+
+    try:
+        counts = heatmap_file["counts"]
+    finally:
+        heatmap_file.close()
+
+    return TargetHeatmap(counts=counts)
+
+# Adds up the heatmaps in paths (e.g. from different lanes) and writes them
+# to merged_path
+def merge_heatmap_files(paths, merged_path):
+    merged = None
+
+    for path in paths:
+        heatmap = read_heatmap(path)
+
+        if merged is None:
+            merged = heatmap
+        else:
+            merged.merge(heatmap)
+
+    if merged is not None:
+        merged.write(merged_path)
+
+    return merged
+
+# Returns an RGBA uint8 array of counts for drawing over a target: cells
+# without shots are transparent and the rest go from blue (few shots) to
+# red (the most shots)
+def render_heatmap(counts):
+    heat = counts.astype(numpy.float64)
+
+    if heat.max() > 0:
+        heat /= heat.max()
+
+    rgba = numpy.zeros(counts.shape + (4,), numpy.uint8)
+    rgba[..., 0] = numpy.clip(heat * 2, 0, 1) * 255
+    rgba[..., 1] = (1 - numpy.abs(heat * 2 - 1)) * 255
+    rgba[..., 2] = numpy.clip(2 - heat * 2, 0, 1) * 255
+    rgba[..., 3] = numpy.where(counts > 0,
+        MIN_ALPHA + heat * (MAX_ALPHA - MIN_ALPHA), 0)
+
+    return rgba
+
+# Keeps a TargetHeatmap for every target file shots have hit. Each target
+# file's heatmap is saved in directory named after the file (e.g.
+# heatmaps/SimpleBullseye_score.target.npz), and saving adds this session's
+# shots to whatever is already saved, so a heatmap keeps growing across
+# sessions (and lanes sharing the directory).
+class HeatmapAccumulator():
+    # Adds a shot at (x, y) on the feed that hit a target loaded from
+    # target_file that is at bbox (x1, y1, x2, y2) on the feed
+    def add_shot(self, target_file, bbox, x, y):
+        (x1, y1, x2, y2) = bbox
+
+        if x2 <= x1 or y2 <= y1:
+            return
+
+        if target_file not in self._session_heatmaps:
+            self._session_heatmaps[target_file] = TargetHeatmap(
+                self._grid_size)
+
+        self._session_heatmaps[target_file].add_shot(
+            float(x - x1) / (x2 - x1), float(y - y1) / (y2 - y1))
+
+    # Returns the TargetHeatmap for target_file with every shot that has
+    # ever been saved for it plus the shots from this session
+    def get_heatmap(self, target_file):
+        if target_file not in self._saved_heatmaps:
+            self._saved_heatmaps[target_file] = self._read_saved(target_file)
+
+        heatmap = TargetHeatmap(
+            counts=self._saved_heatmaps[target_file].get_counts())
+
+        if target_file in self._session_heatmaps:
+            heatmap.merge(self._session_heatmaps[target_file])
+
+        return heatmap
+
+    def get_path(self, target_file):
+        return os.path.join(self._directory,
+            os.path.basename(target_file) + HEATMAP_EXTENSION)
+
+    def _read_saved(self, target_file):
+        path = self.get_path(target_file)
+
+        if os.path.exists(path):
+            return read_heatmap(path)
+
+        return TargetHeatmap(self._grid_size)
+
+    # Adds this session's shots to the saved heatmaps and returns the paths
+    # that were written. A heatmap that can't be saved (e.g. the saved one
+    # has a different grid size, which is never overwritten) is logged and
+    # keeps its shots, and the other heatmaps are still saved.
+    def save(self):
+        paths = []
+
+        for (target_file, session_heatmap) in self._session_heatmaps.items():
+            if session_heatmap.get_shot_count() == 0:
+                continue
+
+            path = self.get_path(target_file)
+
+            try:
+                # Read the saved heatmap again in case another lane saved
+                # to it
+                heatmap = self._read_saved(target_file)
+                heatmap.merge(session_heatmap)
+                heatmap.write(path)
+            except (IOError, OSError, ValueError) as e:
+                self._logger.warning("Couldn't save the target heatmap %s: %s",
+                    path, e)
+                continue
+
+            paths.append(path)
+
+            self._saved_heatmaps[target_file] = heatmap
+            self._session_heatmaps[target_file] = TargetHeatmap(
+                self._grid_size)
+
+        return paths
+
+    def __init__(self, logger, directory=HEATMAP_DIR, grid_size=GRID_SIZE):
+        self._logger = logger
+        self._directory = directory
+        self._grid_size = grid_size
+        self._saved_heatmaps = {}
+        self._session_heatmaps = {}
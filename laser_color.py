@@ -0,0 +1,57 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import numpy
+
+LASER_COLOR_RADIUS = 10 # px
+
+# Decides what color laser made a spot by looking at the average color
+# of the pixels in a circle around it. The circle is a small kernel that
+# is built once and applied to a slice of the frame around the spot, so
+# nothing the size of the frame is allocated or scanned for each shot.
+class LaserColorClassifier():
+    # Returns "red" or "green2" if the dominant color around (x, y) in frame
+    # (a BGR image) is red or green. Otherwise it's probably not a laser
+    # trainer, so None is returned.
+    def classify(self, frame, x, y):
+        radius = self._radius
+        x = int(round(x))
+        y = int(round(y))
+
+        # Clip the slice to the frame, then clip the kernel by the same
+        # amount so that it still lines up with (x, y)
+        x1 = max(0, x - radius)
+        y1 = max(0, y - radius)
+        x2 = min(frame.shape[1], x + radius + 1)
+        y2 = min(frame.shape[0], y + radius + 1)
+
+        if x1 >= x2 or y1 >= y2:
+            return None
+
+        kx = x1 - (x - radius)
+        ky = y1 - (y - radius)
+        kernel = self._kernel[ky:ky + (y2 - y1), kx:kx + (x2 - x1)]
+
+        mean_color = cv2.mean(frame[y1:y2, x1:x2], kernel)
+
+        # Remember that frame is in BGR
+        r = mean_color[2]
+        g = mean_color[1]
+        b = mean_color[0]
+
+        if (r > g) and (r > b):
+            return "red"
+
+        if (g > r) and (g > b):
+            return "green2"
+
+        return None
+
+    def __init__(self, radius=LASER_COLOR_RADIUS):
+        self._radius = radius
+
+        size = radius * 2 + 1
+        self._kernel = numpy.zeros((size, size), numpy.uint8)
+        cv2.circle(self._kernel, (radius, radius), radius, 255, -1)
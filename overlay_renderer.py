@@ -0,0 +1,249 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import numpy
+from region_raster import DRAW_SHIFT
+
+# cv2.CV_AA, which is called cv2.LINE_AA in newer versions of OpenCV
+ANTIALIASED = 16
+
+# How much of a region's fill each of the canvas' stipple patterns lets
+# through
+STIPPLE_ALPHA = {"": 1.0, "gray12": .125, "gray25": .25, "gray50": .5,
+    "gray75": .75}
+
+# Draws targets and shot markers into camera frames instead of leaving them
+# to the canvas. Everything is drawn once into an RGBA layer the size of the
+# frames, which is blended into each frame before it is shown, so showing a
+# frame costs the same no matter how many targets and shots there are. The
+# layer is only drawn again when the items on it change.
+#
+# An item is a (shape, coords, fill, outline, fill_alpha) tuple, where shape
+# is "rectangle", "oval", or "polygon" (see region_raster.get_region_shape),
+# coords are its canvas coordinates, fill and outline are (r, g, b) tuples
+# or None if that part isn't drawn, and fill_alpha is how opaque the fill is
+# from 0 to 1. Outlines are always opaque and one pixel wide.
+class OverlayRenderer():
+    # Blends the overlay into frame, an RGB uint8 image, in place
+    def composite(self, frame):
+        (height, width) = frame.shape[:2]
+        if (width, height) != self._size:
+            self.resize(width, height)
+
+        if self._dirty:
+            self._render()
+
+        if self._area is None:
+            return frame
+
+        (x1, y1, x2, y2) = self._area
+        frame_area = frame[y1:y2, x1:x2]
+        work = self._work[y1:y2, x1:x2]
+
+        # Both the color and the inverse alpha are stored times 256 so that
+        # blending only takes integer math
+        numpy.multiply(frame_area, self._inverse_alpha[y1:y2, x1:x2], out=work)
+        numpy.add(work, self._color[y1:y2, x1:x2], out=work)
+        numpy.right_shift(work, 8, out=work)
+        frame_area[...] = work
+
+        return frame
+
+    # Replaces every item with items, a list from the bottom most item to
+    # the top most. The layer is drawn again before the next frame.
+    def set_items(self, items):
+        self._items = list(items)
+        self._dirty = True
+
+    # Adds items on top of the others and draws only them, which is much
+    # cheaper than drawing every item again (e.g. for a new shot marker)
+    def add_items(self, items):
+        self._items.extend(items)
+
+        if self._dirty:
+            return
+
+        area = self._draw_items(items)
+
+        if area is not None:
+            self._area = _union(self._area, area)
+            self._update_blend(area)
+
+    def get_items(self):
+        return self._items
+
+    def get_size(self):
+        return self._size
+
+    # Changes the size of the layer (it should be the size of the frames)
+    # and draws every item on it again
+    def resize(self, width, height):
+        self._size = (width, height)
+        self._layer_color = numpy.zeros((height, width, 3), numpy.float32)
+        self._layer_alpha = numpy.zeros((height, width), numpy.float32)
+        self._color = numpy.zeros((height, width, 3), numpy.uint16)
+        self._inverse_alpha = numpy.zeros((height, width, 1), numpy.uint16)
+        self._work = numpy.zeros((height, width, 3), numpy.uint16)
+        self._dirty = True
+
+    def _render(self):
+        self._layer_color[...] = 0
+        self._layer_alpha[...] = 0
+        self._area = self._draw_items(self._items)
+        self._dirty = False
+
+        if self._area is not None:
+            self._update_blend(self._area)
+
+    # Draws items over the layer and returns the (x1, y1, x2, y2) area they
+    # cover, or None if none of them are on the layer
+    def _draw_items(self, items):
+        area = None
+        run = []
+
+        # Opaque items of the same color (e.g. shot markers) look the same
+        # no matter which is on top, so runs of them are blended together
+        # instead of one at a time
+        for item in items:
+            if (len(run) > 0 and (not _is_opaque(item) or
+                item[2:] != run[0][2:])):
+
+                area = _union(area, self._draw_run(run))
+                run = []
+
+            if _is_opaque(item):
+                run.append(item)
+            else:
+                area = _union(area, self._draw_run([item]))
+
+        if len(run) > 0:
+            area = _union(area, self._draw_run(run))
+
+        return area
+
+    # Draws items that all have the same fill, outline, and fill alpha
+    def _draw_run(self, items):
+        (width, height) = self._size
+        area = None
+        shapes = []
+
+        for (shape, coords, fill, outline, fill_alpha) in items:
+            if len(coords) < 4:
+                continue
+
+            xs = coords[::2]
+            ys = coords[1::2]
+
+            # Leave a pixel of room for the outline and edges that are
+            # rounded up
+            item_area = (max(0, int(numpy.floor(min(xs))) - 1),
+                max(0, int(numpy.floor(min(ys))) - 1),
+                min(width, int(numpy.ceil(max(xs))) + 2),
+                min(height, int(numpy.ceil(max(ys))) + 2))
+
+            if item_area[0] < item_area[2] and item_area[1] < item_area[3]:
+                area = _union(area, item_area)
+                shapes.append((shape, xs, ys))
+
+        if area is None:
+            return None
+
+        (shape, coords, fill, outline, fill_alpha) = items[0]
+        (x1, y1, x2, y2) = area
+        scale = 1 << DRAW_SHIFT
+        fill_mask = None
+        outline_mask = None
+
+        if fill is not None and fill_alpha > 0:
+            fill_mask = numpy.zeros((y2 - y1, x2 - x1), numpy.uint8)
+
+        if outline is not None:
+            # An outline the same color as an opaque fill can go in the
+            # same mask
+            if fill_mask is not None and fill_alpha == 1 and outline == fill:
+                outline_mask = fill_mask
+            else:
+                outline_mask = numpy.zeros((y2 - y1, x2 - x1), numpy.uint8)
+
+        for (shape, xs, ys) in shapes:
+            points = numpy.array([[(x - x1) * scale, (y - y1) * scale]
+                for (x, y) in zip(xs, ys)]).round().astype(numpy.int32)
+
+            if fill_mask is not None:
+                _draw_shape(fill_mask, shape, points, -1)
+
+            if outline_mask is not None:
+                _draw_shape(outline_mask, shape, points, 1)
+
+        if fill_mask is not None:
+            self._blend_mask(area, fill_mask, fill, fill_alpha)
+
+        if outline_mask is not None and outline_mask is not fill_mask:
+            self._blend_mask(area, outline_mask, outline, 1.0)
+
+        return area
+
+    # Puts color over the layer where mask (the size of area) is set
+    def _blend_mask(self, area, mask, color, alpha):
+        (x1, y1, x2, y2) = area
+        coverage = mask.astype(numpy.float32) * (alpha / 255.0)
+        remaining = 1 - coverage
+
+        layer_color = self._layer_color[y1:y2, x1:x2]
+        layer_color *= remaining[..., numpy.newaxis]
+        layer_color += (coverage[..., numpy.newaxis] *
+            numpy.array(color, numpy.float32))
+
+        layer_alpha = self._layer_alpha[y1:y2, x1:x2]
+        layer_alpha *= remaining
+        layer_alpha += coverage
+
+    # Works out the integer color and inverse alpha composite blends with
+    # for area from the layer
+    def _update_blend(self, area):
+        (x1, y1, x2, y2) = area
+
+        self._color[y1:y2, x1:x2] = numpy.rint(
+            self._layer_color[y1:y2, x1:x2] * 256)
+        self._inverse_alpha[y1:y2, x1:x2, 0] = 256 - numpy.rint(
+            self._layer_alpha[y1:y2, x1:x2] * 256)
+
+    def __init__(self, width, height):
+        self._items = []
+        self._area = None
+        self.resize(width, height)
+
+# Draws shape into mask with thickness (-1 to fill it)
+def _draw_shape(mask, shape, points, thickness):
+    if shape == "polygon":
+        if thickness < 0:
+            cv2.fillPoly(mask, [points], 255, ANTIALIASED, DRAW_SHIFT)
+        else:
+            cv2.polylines(mask, [points], True, 255, thickness, ANTIALIASED,
+                DRAW_SHIFT)
+        return
+
+    (left, top) = [int(v) for v in points[0]]
+    (right, bottom) = [int(v) for v in points[1]]
+
+    if shape == "oval":
+        cv2.ellipse(mask, ((left + right) / 2, (top + bottom) / 2),
+            (abs(right - left) / 2, abs(bottom - top) / 2), 0, 0, 360, 255,
+            thickness, ANTIALIASED, DRAW_SHIFT)
+    else:
+        cv2.rectangle(mask, (left, top), (right, bottom), 255, thickness,
+            ANTIALIASED, DRAW_SHIFT)
+
+def _is_opaque(item):
+    return item[4] >= 1
+
+def _union(area, other):
+    if area is None:
+        return other
+    if other is None:
+        return area
+
+    return (min(area[0], other[0]), min(area[1], other[1]),
+        max(area[2], other[2]), max(area[3], other[3]))
@@ -0,0 +1,174 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import imp
+import json
+import os
+import sys
+
+PROTOCOLS_DIR = "training_protocols"
+PLUGIN_MANIFEST = os.path.join(PROTOCOLS_DIR, ".manifest.json")
+MANIFEST_VERSION = 2
+
+# A training protocol that was found in the protocols directory. The info
+# is whatever the protocol's get_info() returned (e.g. its name), which may
+# have come from the manifest instead of the protocol itself.
+class Plugin():
+    def get_name(self):
+        return self._info["name"]
+
+    def get_info(self):
+        return self._info
+
+    def get_location(self):
+        return self._location
+
+    def __init__(self, location, info):
+        self._location = location
+        self._info = info
+
+# Finds the training protocols and imports them. Importing every protocol
+# just to get its name makes startup slow, so the info of each protocol is
+# kept in a manifest file. A protocol is only imported to get its info when
+# its files have changed since the manifest was written, otherwise it
+# isn't imported until it is loaded.
+#
+# Each protocol is imported as its own package (e.g.
+# training_protocols.random_shoot) and the module is kept, so picking the
+# same protocol again doesn't import it again unless one of its files
+# changed.
+class PluginLoader():
+    # Returns a list of Plugins sorted by name
+    def find_plugins(self):
+        manifest = self._read_manifest()
+        plugins = []
+        manifest_changed = False
+
+        for candidate in sorted(os.listdir(self._protocols_dir)):
+            location = os.path.join(self._protocols_dir, candidate)
+            init_file = os.path.join(location, "__init__.py")
+
+            if not os.path.isdir(location) or not os.path.isfile(init_file):
+                continue
+
+            signature = self._get_signature(location)
+
+            if (candidate in manifest and
+                manifest[candidate]["signature"] == signature):
+                info = manifest[candidate]["info"]
+            else:
+                info = self.load_module(location).get_info()
+                manifest[candidate] = {"signature": signature, "info": info}
+                manifest_changed = True
+
+            plugins.append(Plugin(location, info))
+
+        # Forget protocols that were removed
+        for candidate in manifest.keys():
+            if not os.path.isdir(os.path.join(self._protocols_dir, candidate)):
+                del manifest[candidate]
+                manifest_changed = True
+
+        if manifest_changed:
+            self._write_manifest(manifest)
+
+        return sorted(plugins, key=lambda plugin: plugin.get_name())
+
+    # Returns the module of the protocol in location, importing it if it
+    # hasn't been imported yet or its files changed since it was
+    def load_module(self, location):
+        signature = self._get_signature(location)
+
+        if location in self._modules:
+            (module_signature, module) = self._modules[location]
+            if module_signature == signature:
+                return module
+
+        module_name = self._get_module_name(location)
+
+        # Get rid of the old version of the protocol and any modules in
+        # its package so that they are imported again too
+        for name in sys.modules.keys():
+            if name == module_name or name.startswith(module_name + "."):
+                del sys.modules[name]
+
+        # The protocols directory is a package, which has to be imported
+        # before one of its packages can be
+        __import__(self._package)
+
+        (plugin_file, path, description) = imp.find_module(
+            os.path.basename(location), [os.path.dirname(location)])
+
+        try:
+            module = imp.load_module(module_name, plugin_file, path,
+                description)
+        finally:
+            if plugin_file is not None:
+                plugin_file.close()
+
+        self._modules[location] = (signature, module)
+        self._logger.debug("Imported training protocol %s", module_name)
+
+        return module
+
+    def load(self, plugin):
+        return self.load_module(plugin.get_location())
+
+    def _get_module_name(self, location):
+        return self._package + "." + os.path.basename(location)
+
+    # Returns a list with the [path, size, modification time] of every
+    # Python file in the protocol in location, which changes if any of
+    # them are changed, added, or removed
+    def _get_signature(self, location):
+        signature = []
+
+        for (directory, directories, files) in os.walk(location):
+            directories.sort()
+
+            for name in sorted(files):
+                if not name.endswith(".py"):
+                    continue
+
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                signature.append([os.path.relpath(path, location),
+                    stat.st_size, stat.st_mtime])
+
+        return signature
+
+    def _read_manifest(self):
+        try:
+            manifest_file = open(self._manifest_file, "r")
+            manifest = json.load(manifest_file)
+            manifest_file.close()
+        except (IOError, ValueError):
+            return {}
+
+        if (not isinstance(manifest, dict) or
+            manifest.get("version") != MANIFEST_VERSION):
+            return {}
+
+        return manifest.get("plugins", {})
+
+    def _write_manifest(self, plugins):
+        try:
+            manifest_file = open(self._manifest_file, "w")
+            json.dump({"version": MANIFEST_VERSION, "plugins": plugins},
+                manifest_file, indent=2, sort_keys=True)
+            manifest_file.close()
+        except (IOError, TypeError, ValueError) as e:
+            # The manifest is only a cache, so protocols still work
+            # without it
+            self._logger.warning("Couldn't write the training protocol " +
+                "manifest %s: %s", self._manifest_file, e)
+
+    def __init__(self, logger, protocols_dir=PROTOCOLS_DIR,
+        manifest_file=PLUGIN_MANIFEST):
+
+        self._logger = logger
+        self._protocols_dir = protocols_dir
+        self._package = os.path.basename(os.path.normpath(protocols_dir))
+        self._manifest_file = manifest_file
+        self._modules = {}
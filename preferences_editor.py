@@ -11,6 +11,10 @@ DEFAULT_DETECTION_RATE = 100 #ms
 DEFAULT_LASER_INTENSITY = 230
 DEFAULT_MARKER_RADIUS = 2 #px
 DEFAULT_IGNORE_LASER_COLOR = "none"
+DEFAULT_DETECTION_MODE = configurator.POLL_DETECTION
+DEFAULT_DETECTION_ROI = False
+DEFAULT_ROI_MARGIN = 50 #px
+DEFAULT_COMPOSITE_OVERLAY = False
 
 class PreferencesEditor():
     @staticmethod
@@ -43,11 +47,39 @@ class PreferencesEditor():
                     configurator.IGNORE_LASER_COLOR)
             except ConfigParser.NoOptionError:
                 preferences[configurator.IGNORE_LASER_COLOR] = DEFAULT_IGNORE_LASER_COLOR
+
+            try:
+                preferences[configurator.DETECTION_MODE] = config.get("ShootOFF",
+                    configurator.DETECTION_MODE)
+            except ConfigParser.NoOptionError:
+                preferences[configurator.DETECTION_MODE] = DEFAULT_DETECTION_MODE
+
+            try:
+                preferences[configurator.DETECTION_ROI] = config.getboolean("ShootOFF",
+                    configurator.DETECTION_ROI)
+            except ConfigParser.NoOptionError:
+                preferences[configurator.DETECTION_ROI] = DEFAULT_DETECTION_ROI
+
+            try:
+                preferences[configurator.ROI_MARGIN] = config.getint("ShootOFF",
+                    configurator.ROI_MARGIN)
+            except ConfigParser.NoOptionError:
+                preferences[configurator.ROI_MARGIN] = DEFAULT_ROI_MARGIN
+
+            try:
+                preferences[configurator.COMPOSITE_OVERLAY] = config.getboolean(
+                    "ShootOFF", configurator.COMPOSITE_OVERLAY)
+            except ConfigParser.NoOptionError:
+                preferences[configurator.COMPOSITE_OVERLAY] = DEFAULT_COMPOSITE_OVERLAY
         else:
             preferences[configurator.DETECTION_RATE] = DEFAULT_DETECTION_RATE
             preferences[configurator.LASER_INTENSITY] = DEFAULT_LASER_INTENSITY
             preferences[configurator.MARKER_RADIUS] = DEFAULT_MARKER_RADIUS
             preferences[configurator.IGNORE_LASER_COLOR] = DEFAULT_IGNORE_LASER_COLOR
+            preferences[configurator.DETECTION_MODE] = DEFAULT_DETECTION_MODE
+            preferences[configurator.DETECTION_ROI] = DEFAULT_DETECTION_ROI
+            preferences[configurator.ROI_MARGIN] = DEFAULT_ROI_MARGIN
+            preferences[configurator.COMPOSITE_OVERLAY] = DEFAULT_COMPOSITE_OVERLAY
 
             config.add_section("ShootOFF")
             config.set("ShootOFF", configurator.DETECTION_RATE, 
@@ -58,6 +90,14 @@ class PreferencesEditor():
                 str(preferences[configurator.MARKER_RADIUS]))
             config.set("ShootOFF", configurator.IGNORE_LASER_COLOR, 
                 preferences[configurator.IGNORE_LASER_COLOR])    
+            config.set("ShootOFF", configurator.DETECTION_MODE, 
+                preferences[configurator.DETECTION_MODE])
+            config.set("ShootOFF", configurator.DETECTION_ROI, 
+                str(preferences[configurator.DETECTION_ROI]))
+            config.set("ShootOFF", configurator.ROI_MARGIN, 
+                str(preferences[configurator.ROI_MARGIN]))
+            config.set("ShootOFF", configurator.COMPOSITE_OVERLAY, 
+                str(preferences[configurator.COMPOSITE_OVERLAY]))
 
             with open("settings.conf", "w") as config_file:
                 config.write(config_file)
@@ -88,6 +128,23 @@ class PreferencesEditor():
         else:
             self._preferences[configurator.IGNORE_LASER_COLOR] = DEFAULT_IGNORE_LASER_COLOR
 
+        if self._detection_mode_combo.get():
+            self._preferences[configurator.DETECTION_MODE] = self._detection_mode_combo.get()
+        else:
+            self._preferences[configurator.DETECTION_MODE] = DEFAULT_DETECTION_MODE
+
+        self._preferences[configurator.DETECTION_ROI] = bool(
+            self._detection_roi_state.get())
+
+        if self._roi_margin_spinbox.get():
+            self._preferences[configurator.ROI_MARGIN] = int(
+                self._roi_margin_spinbox.get())
+        else:
+            self._preferences[configurator.ROI_MARGIN] = DEFAULT_ROI_MARGIN
+
+        self._preferences[configurator.COMPOSITE_OVERLAY] = bool(
+            self._composite_overlay_state.get())
+
         self._config_parser.set("ShootOFF", configurator.DETECTION_RATE, 
             str(self._preferences[configurator.DETECTION_RATE]))
         self._config_parser.set("ShootOFF", configurator.LASER_INTENSITY,
@@ -96,6 +153,14 @@ class PreferencesEditor():
             str(self._preferences[configurator.MARKER_RADIUS]))
         self._config_parser.set("ShootOFF", configurator.IGNORE_LASER_COLOR,
             self._preferences[configurator.IGNORE_LASER_COLOR])
+        self._config_parser.set("ShootOFF", configurator.DETECTION_MODE,
+            self._preferences[configurator.DETECTION_MODE])
+        self._config_parser.set("ShootOFF", configurator.DETECTION_ROI,
+            str(self._preferences[configurator.DETECTION_ROI]))
+        self._config_parser.set("ShootOFF", configurator.ROI_MARGIN,
+            str(self._preferences[configurator.ROI_MARGIN]))
+        self._config_parser.set("ShootOFF", configurator.COMPOSITE_OVERLAY,
+            str(self._preferences[configurator.COMPOSITE_OVERLAY]))
 
         with open("settings.conf", "w") as config_file:
             self._config_parser.write(config_file)
@@ -158,12 +223,53 @@ class PreferencesEditor():
         self._ignore_laser_color_combo.set(self._preferences[configurator.IGNORE_LASER_COLOR])
         self._ignore_laser_color_combo.grid(column=1, row=3)
 
+        ttk.Label(self._frame, 
+            text="Detection Mode (takes effect after restart): ").grid(
+            column=0, row=4)
+
+        self._detection_mode_combo = ttk.Combobox(self._frame,
+            values=[configurator.POLL_DETECTION, configurator.FRAME_DETECTION],
+            state="readonly")
+        self._detection_mode_combo.set(self._preferences[configurator.DETECTION_MODE])
+        self._detection_mode_combo.grid(column=1, row=4)
+
+        ttk.Label(self._frame, 
+            text="Only Detect Near Targets: ").grid(column=0, row=5)
+
+        self._detection_roi_state = Tkinter.IntVar()
+        self._detection_roi_state.set(self._preferences[configurator.DETECTION_ROI])
+        ttk.Checkbutton(self._frame,
+            variable=self._detection_roi_state).grid(column=1, row=5)
+
+        ttk.Label(self._frame, 
+            text="Target Margin (px): ").grid(column=0, row=6)
+
+        self._roi_margin_spinbox = Tkinter.Spinbox(self._frame, from_=0,
+            to=1000)
+        self._roi_margin_spinbox.delete(0, Tkinter.END)
+        self._roi_margin_spinbox.insert(0, 
+            self._preferences[configurator.ROI_MARGIN])
+        margin_validator = (self._window.register(self.check_roi_margin),'%P')
+        self._roi_margin_spinbox.config(validate="key",
+            validatecommand=margin_validator)
+        self._roi_margin_spinbox.grid(column=1, row=6)
+
+        ttk.Label(self._frame, 
+            text="Draw Targets Into Feed (takes effect after restart): ").grid(
+            column=0, row=7)
+
+        self._composite_overlay_state = Tkinter.IntVar()
+        self._composite_overlay_state.set(
+            self._preferences[configurator.COMPOSITE_OVERLAY])
+        ttk.Checkbutton(self._frame,
+            variable=self._composite_overlay_state).grid(column=1, row=7)
+
         self._ok_button = ttk.Button(self._frame, text="OK",
             command=self.save_preferences, width=10)
-        self._ok_button.grid(column=0, row=4)
+        self._ok_button.grid(column=0, row=8)
         self._cancel_button = ttk.Button(self._frame, text="Cancel",
             command=self._window.destroy, width=10)
-        self._cancel_button.grid(column=1, row=4)
+        self._cancel_button.grid(column=1, row=8)
 
         # Center this window on its parent
         parent_width = parent.winfo_width()
@@ -197,6 +303,12 @@ class PreferencesEditor():
         else:
             return False
 
+    def check_roi_margin(self, P):
+        if P.isdigit() or not P:
+            return True
+        else:
+            return False
+
     def __init__(self, parent, config_parser, preferences):
         self._config_parser = config_parser
         self._preferences = preferences
@@ -0,0 +1,304 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from collections import OrderedDict
+import cv2
+import numpy
+
+# Regions are drawn with this many fractional bits so that targets at
+# fractional canvas coordinates are rasterized where they really are
+DRAW_SHIFT = 4
+MAX_LABELS = 65535
+
+# A frame-sized map of which target region is on top at each pixel, so
+# that checking what a shot hit is a single array lookup instead of asking
+# the canvas about every item under the shot.
+#
+# Each target is a list of (region, coords, tags) tuples from the bottom
+# most region to the top most, where region is whatever identifies the
+# region to the caller (e.g. its canvas id), coords are its canvas
+# coordinates, and tags is its dictionary of parsed tags. Targets added
+# later are on top. When a target is added, changed, or removed only that
+# target is drawn again and only the part of the map it covers is updated.
+#
+# Targets are changed on one thread (Tk) while shots are checked on
+# another, so changes are made to a copy of the map that then replaces
+# the old one.
+class RegionRaster():
+    # Returns a (region, tags) tuple for the top most target region at
+    # (x, y) or (None, None) if no target was hit
+    def hit_test(self, x, y):
+        (labels, regions, target_bboxes) = self._state
+
+        x = int(round(x))
+        y = int(round(y))
+
+        if y < 0 or y >= labels.shape[0] or x < 0 or x >= labels.shape[1]:
+            return (None, None)
+
+        label = labels[y, x]
+
+        if label == 0:
+            return (None, None)
+
+        return regions[label]
+
+    # Returns a list with the (x1, y1, x2, y2) bounding box of each target
+    def get_target_bboxes(self):
+        return self._state[2]
+
+    def get_size(self):
+        return self._size
+
+    # Changes the size of the map (it should be the size of the frames shots
+    # are found in) and draws every target on it again
+    def resize(self, width, height):
+        self._size = (width, height)
+        labels = numpy.zeros((height, width), numpy.uint16)
+        self._draw(labels, (0, 0, width, height))
+        self._publish(labels)
+
+    # Replaces every target. targets is a list of (name, regions) tuples from
+    # the bottom most target to the top most.
+    def set_targets(self, targets):
+        for target in self._targets.values():
+            self._free_labels(target)
+
+        self._targets = OrderedDict()
+        for (name, regions) in targets:
+            self._targets[name] = _RasterTarget(regions, self._allocate_labels)
+
+        self.resize(*self._size)
+
+    # Adds a target on top of the others or replaces the regions of an
+    # existing target without changing where it is in the stack. mask is
+    # an optional (patch, origin) tuple with the regions already drawn
+    # with the labels 1 to n (see rasterize). If there aren't enough labels
+    # for the regions a ValueError is raised and the target is left as it
+    # was.
+    def set_target(self, name, regions, mask=None):
+        old_target = None
+
+        if name in self._targets:
+            old_target = self._targets[name]
+            self._free_labels(old_target)
+
+        try:
+            target = _RasterTarget(regions, self._allocate_labels, mask)
+        except ValueError:
+            if old_target is not None:
+                self._take_labels(old_target)
+            raise
+
+        self._targets[name] = target
+        self._update(old_target, target)
+
+    def remove_target(self, name):
+        if name not in self._targets:
+            return
+
+        target = self._targets.pop(name)
+        self._free_labels(target)
+        self._update(target, None)
+
+    # Draws the area covered by a target before and after it changed again
+    def _update(self, old_target, new_target):
+        (width, height) = self._size
+        labels = self._state[0].copy()
+
+        for target in (old_target, new_target):
+            if target is None or target.get_patch() is None:
+                continue
+
+            (x, y) = target.get_origin()
+            (patch_height, patch_width) = target.get_patch().shape
+            area = (max(0, x), max(0, y), min(width, x + patch_width),
+                min(height, y + patch_height))
+
+            if area[0] < area[2] and area[1] < area[3]:
+                self._draw(labels, area)
+
+        self._publish(labels)
+
+    # Copies every target that overlaps area (x1, y1, x2, y2) into that part
+    # of labels, bottom most first so that the top most region wins
+    def _draw(self, labels, area):
+        (x1, y1, x2, y2) = area
+        patch = numpy.zeros((y2 - y1, x2 - x1), numpy.uint16)
+
+        for target in self._targets.values():
+            target_patch = target.get_patch()
+
+            if target_patch is None:
+                continue
+
+            (target_x, target_y) = target.get_origin()
+
+            # The part of the target's own patch that is in area
+            left = max(x1, target_x)
+            top = max(y1, target_y)
+            right = min(x2, target_x + target_patch.shape[1])
+            bottom = min(y2, target_y + target_patch.shape[0])
+
+            if left >= right or top >= bottom:
+                continue
+
+            source = target_patch[top - target_y:bottom - target_y,
+                left - target_x:right - target_x]
+            destination = patch[top - y1:bottom - y1, left - x1:right - x1]
+
+            covered = source > 0
+            destination[covered] = source[covered]
+
+        labels[y1:y2, x1:x2] = patch
+
+    # Replaces the state seen by hit_test all at once
+    def _publish(self, labels):
+        regions = {}
+        target_bboxes = []
+
+        for target in self._targets.values():
+            regions.update(target.get_regions())
+
+            if target.get_bbox() is not None:
+                target_bboxes.append(target.get_bbox())
+
+        self._state = (labels, regions, target_bboxes)
+
+    # Returns count unused labels. Either every label is allocated or, if
+    # there aren't enough, none are and a ValueError is raised.
+    def _allocate_labels(self, count):
+        if count > len(self._unused_labels) + MAX_LABELS + 1 - self._next_label:
+            raise ValueError("There are too many target regions to hit test")
+
+        labels = []
+
+        for i in range(count):
+            if len(self._unused_labels) > 0:
+                labels.append(self._unused_labels.pop())
+            else:
+                labels.append(self._next_label)
+                self._next_label += 1
+
+        return labels
+
+    def _free_labels(self, target):
+        self._unused_labels.extend(target.get_regions().keys())
+
+    # Gives a target back the labels that were freed by _free_labels
+    def _take_labels(self, target):
+        labels = target.get_regions()
+        self._unused_labels = [label for label in self._unused_labels
+            if label not in labels]
+
+    def __init__(self, width=0, height=0):
+        self._targets = OrderedDict()
+        self._unused_labels = []
+        self._next_label = 1
+        self._size = (width, height)
+        self._state = (numpy.zeros((height, width), numpy.uint16), {}, [])
+
+# Returns the shape the hit test treats a region with coords and the
+# dictionary of parsed tags as: "rectangle", "oval", or "polygon"
+def get_region_shape(coords, tags):
+    # Ovals are converted to polygons on Windows when they are selected,
+    # so anything with more than two points is a polygon
+    if len(coords) > 4:
+        return "polygon"
+    elif "_shape" in tags and tags["_shape"] == "oval":
+        return "oval"
+    else:
+        return "rectangle"
+
+# Returns the (x1, y1, x2, y2) box around a list of region coords
+def get_bbox(coords_list):
+    xs = [x for coords in coords_list for x in coords[::2]]
+    ys = [y for coords in coords_list for y in coords[1::2]]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+# Draws shapes, a list of (label, shape, coords) tuples from the bottom
+# most to the top most, into a patch just big enough to hold them. Returns
+# (patch, origin) where origin is the (x, y) coordinates of the patch's
+# top left pixel.
+def rasterize(shapes):
+    bbox = get_bbox([coords for (label, shape, coords) in shapes])
+    (x_offset, y_offset) = (int(numpy.floor(bbox[0])) - 1,
+        int(numpy.floor(bbox[1])) - 1)
+    scale = 1 << DRAW_SHIFT
+
+    # Leave a pixel of room for edges that are rounded up
+    patch = numpy.zeros((int(numpy.ceil(bbox[3])) - y_offset + 2,
+        int(numpy.ceil(bbox[2])) - x_offset + 2), numpy.uint16)
+
+    for (label, shape, coords) in shapes:
+        points = numpy.array([[(x - x_offset) * scale, (y - y_offset) * scale]
+            for (x, y) in zip(coords[::2], coords[1::2])]).round().astype(
+            numpy.int32)
+
+        if shape == "polygon":
+            cv2.fillPoly(patch, [points], label, 8, DRAW_SHIFT)
+            continue
+
+        (x1, y1) = [int(v) for v in points[0]]
+        (x2, y2) = [int(v) for v in points[1]]
+
+        if shape == "oval":
+            cv2.ellipse(patch, ((x1 + x2) / 2, (y1 + y2) / 2),
+                (abs(x2 - x1) / 2, abs(y2 - y1) / 2), 0, 0, 360, label, -1,
+                8, DRAW_SHIFT)
+        else:
+            cv2.rectangle(patch, (x1, y1), (x2, y2), label, -1, 8, DRAW_SHIFT)
+
+    return (patch, (x_offset, y_offset))
+
+# The regions of one target and the labels they are drawn with. Each
+# target is drawn once into its own patch, which is copied onto the map,
+# so it looks the same no matter which part of the map is being drawn.
+#
+# mask is an optional (patch, origin) tuple like the one returned by
+# rasterize for regions that were already drawn with the labels 1 to n in
+# the same order (e.g. by a compiled target). Its labels are swapped for
+# the ones given to this target instead of drawing the regions again.
+class _RasterTarget():
+    def get_bbox(self):
+        return self._bbox
+
+    # Returns a dictionary mapping each label to its (region, tags) tuple
+    def get_regions(self):
+        return self._regions
+
+    # Returns the labels of the target's regions in a patch the size of the
+    # target (0 where no region is), or None if the target has no regions
+    def get_patch(self):
+        return self._patch
+
+    # Returns the (x, y) map coordinates of the patch's top left pixel
+    def get_origin(self):
+        return self._origin
+
+    def __init__(self, regions, allocate_labels, mask=None):
+        self._regions = {}
+        self._bbox = None
+        self._patch = None
+        self._origin = None
+
+        regions = [r for r in regions if len(r[1]) >= 4]
+        if len(regions) == 0:
+            return
+
+        labels = allocate_labels(len(regions))
+        shapes = []
+
+        for (label, (region, coords, tags)) in zip(labels, regions):
+            shapes.append((label, get_region_shape(coords, tags), coords))
+            self._regions[label] = (region, tags)
+
+        self._bbox = get_bbox([coords for (region, coords, tags) in regions])
+
+        if mask is None:
+            (self._patch, self._origin) = rasterize(shapes)
+        else:
+            label_map = numpy.array([0] + labels, numpy.uint16)
+            self._patch = label_map[mask[0]]
+            self._origin = mask[1]
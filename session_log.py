@@ -0,0 +1,151 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import os
+import Queue
+from threading import Event, Thread
+import time
+
+SESSION_DIR = "sessions"
+SESSION_LOG_VERSION = 1
+FLUSH_INTERVAL = 1 # s
+
+# Record types
+SESSION_RECORD = "session"
+SHOT_RECORD = "shot"
+COLUMNS_RECORD = "columns"
+CLEAR_RECORD = "clear"
+PROTOCOL_RECORD = "protocol"
+
+# An append-only log of everything that happened in a session, so shots are
+# still around after they are cleared or ShootOFF is closed. Each session
+# gets its own file in JSON Lines format (one JSON object per line), which
+# starts with a SESSION_RECORD.
+#
+# Records are handed to a writer thread, so logging never waits for the
+# disk. The writer writes whatever has been logged every flush_interval
+# seconds and syncs it to the disk. Since the file is only ever appended to,
+# a crash can at worst cut off the last line, and every record before it is
+# still whole (see read_session_log).
+class SessionLog():
+    # Logs a dictionary of JSON serializable values. The type of the record
+    # is stored with the key "type" and the time it was logged with "logged".
+    def log(self, record_type, record):
+        record = dict(record)
+        record["type"] = record_type
+        record["logged"] = time.time()
+        self._records.put(record)
+
+    # Logs a shot. number is the shot's position in the shot list, coords
+    # its (x, y) on the feed, and tags the parsed tags of the region it hit
+    # (None for a miss). columns is a dictionary with the values of the shot
+    # list columns a training protocol added.
+    def log_shot(self, number, timestamp, captured, coords, color, tags,
+        columns):
+
+        self.log(SHOT_RECORD, {"shot": number, "time": timestamp,
+            "captured": captured, "x": float(coords[0]),
+            "y": float(coords[1]), "color": color, "hit": tags is not None,
+            "tags": tags, "columns": columns})
+
+    def get_path(self):
+        return self._path
+
+    def _write_records(self):
+        stopping = False
+
+        while not stopping:
+            # Closing the log wakes the writer up to write what's left
+            self._stopped.wait(self._flush_interval)
+            stopping = self._stopped.is_set()
+            records = []
+
+            try:
+                while True:
+                    records.append(self._records.get_nowait())
+            except Queue.Empty:
+                pass
+
+            if len(records) == 0:
+                continue
+
+            lines = []
+            for record in records:
+                try:
+                    lines.append(json.dumps(record, sort_keys=True) + "\n")
+                except (TypeError, ValueError) as e:
+                    self._logger.warning("Couldn't log a %s record: %s",
+                        record.get("type"), e)
+
+            # If the last write failed part way through, start on a new
+            # line so that only the record that was cut off is lost
+            if self._write_failed:
+                lines.insert(0, "\n")
+
+            try:
+                self._file.write("".join(lines))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._write_failed = False
+            except (IOError, OSError) as e:
+                self._write_failed = True
+                self._logger.warning("Couldn't write the session log %s: %s",
+                    self._path, e)
+
+    # Writes everything that was logged and closes the log
+    def close(self):
+        if self._stopped.is_set():
+            return
+
+        self._stopped.set()
+        self._writer_thread.join()
+        self._file.close()
+
+    def __init__(self, logger, directory=SESSION_DIR,
+        flush_interval=FLUSH_INTERVAL):
+
+        self._logger = logger
+        self._flush_interval = flush_interval
+        self._records = Queue.Queue()
+        self._stopped = Event()
+        self._write_failed = False
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Two sessions started in the same second get different files
+        started = time.time()
+        name = "session-%s" % time.strftime("%Y%m%d-%H%M%S",
+            time.localtime(started))
+        self._path = os.path.join(directory, name + ".jsonl")
+        suffix = 1
+        while os.path.exists(self._path):
+            suffix += 1
+            self._path = os.path.join(directory, "%s-%d.jsonl" % (name, suffix))
+
+        self._file = open(self._path, "a")
+        self.log(SESSION_RECORD, {"version": SESSION_LOG_VERSION,
+            "started": started})
+
+        self._writer_thread = Thread(target=self._write_records,
+            name="session_log_thread")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+# Returns the list of records in a session log. A line that was cut off
+# (e.g. because ShootOFF crashed while writing it) is skipped.
+def read_session_log(path):
+    records = []
+    session_log = open(path, "r")
+
+    for line in session_log:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+
+    session_log.close()
+
+    return records
@@ -0,0 +1,393 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Records the frames shots were looked for in, the shots that were found,
+# and where the targets were, so that a session can be replayed exactly
+# (e.g. to review a disputed hit or reproduce a detection bug). A recording
+# is three files:
+#
+#   name.srec             a header (magic and version) followed by chunks:
+#                         frames compressed with zlib, and the shots found
+#                         in a frame and the targets on the feed as JSON
+#   name.srec.idx         one fixed size FRAME_INDEX_DTYPE record per frame
+#                         with its sequence number and timestamp and where
+#                         it is in the .srec
+#   name.srec.events.idx  the same for the shots and targets chunks
+#                         (EVENT_INDEX_DTYPE), which also says what kind of
+#                         chunk each one is, how many shots have been
+#                         recorded up to and including it, and which record
+#                         has the targets that were on the feed then
+#
+# Every file is only ever appended to, and a chunk is written before its
+# index record, so a recording that was cut off by a crash can still be
+# replayed up to the last whole chunk. The indexes are memory mapped when
+# the recording is read, and are only ever searched, never copied, so
+# finding a frame or a shot doesn't read the whole index or any frames.
+
+import json
+import numpy
+import os
+import Queue
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = "SREC"
+VERSION = 2
+HEADER = struct.Struct("<4sH")
+FRAME_HEADER = struct.Struct("<HHB")
+
+RECORDING_EXTENSION = ".srec"
+INDEX_EXTENSION = ".idx"
+EVENT_INDEX_EXTENSION = ".events.idx"
+RECORDING_DIR = "recordings"
+
+# How many frames can be waiting to be compressed before new frames are
+# dropped instead of queued
+RECORDING_QUEUE_SIZE = 32
+COMPRESSION_LEVEL = 1
+
+# Chunk kinds
+FRAME_CHUNK = 0
+SHOTS_CHUNK = 1
+TARGETS_CHUNK = 2
+
+FRAME_INDEX_DTYPE = numpy.dtype([("sequence", "<i8"), ("timestamp", "<f8"),
+    ("offset", "<u8"), ("length", "<u4")])
+EVENT_INDEX_DTYPE = numpy.dtype([("kind", "<u1"), ("sequence", "<i8"),
+    ("timestamp", "<f8"), ("offset", "<u8"), ("length", "<u4"),
+    ("shots", "<u8"), ("targets", "<i8")])
+
+class RecordingError(Exception):
+    pass
+
+# Records a session from whatever thread frames and shots are seen on. Frames
+# are copied and handed to an encoder thread that compresses and writes
+# them, so recording never waits for compression or the disk. If the encoder
+# falls RECORDING_QUEUE_SIZE frames behind, frames are dropped (and counted)
+# until it catches up. Shots and targets are never dropped.
+#
+# Targets are changed on the Tk thread, which can't know which frame the
+# thread looking for shots is on, so the recorder puts target changes with
+# the latest frame recorded. This keeps the events in sequence order.
+class SessionRecorder():
+    # Records a BGR frame that shots were looked for in
+    def record_frame(self, frame, sequence, timestamp):
+        with self._lock:
+            self._latest_sequence = sequence
+
+            if self._queued_frames >= self._queue_size:
+                self._dropped_frames += 1
+                return
+
+            self._queued_frames += 1
+
+        self._chunks.put((FRAME_CHUNK, sequence, timestamp, frame.copy()))
+
+    # Records the ShotEvents found in the frame with sequence
+    def record_shots(self, sequence, timestamp, shot_events):
+        shots = []
+
+        for shot_event in shot_events:
+            (x, y) = shot_event.get_coords()
+            shots.append({"x": float(x), "y": float(y),
+                "color": shot_event.get_color(),
+                "tags": shot_event.get_tags()})
+
+        self._chunks.put((SHOTS_CHUNK, sequence, timestamp, shots))
+
+    # Records every target on the feed as of the latest frame recorded, or
+    # before the first frame if none have been. targets is a list of
+    # (name, region_object) tuples from the bottom most target to the top
+    # most, where region_object is a list of region dictionaries with the
+    # keys "tags", "coords", and "fill" (the same as a target file).
+    def record_targets(self, timestamp, targets):
+        targets = [{"name": name, "regions": region_object}
+            for (name, region_object) in targets]
+
+        with self._lock:
+            self._chunks.put((TARGETS_CHUNK, self._latest_sequence,
+                timestamp, targets))
+
+    def _encode_chunks(self):
+        while True:
+            try:
+                (kind, sequence, timestamp, data) = self._chunks.get(
+                    timeout=.1)
+            except Queue.Empty:
+                if self._stopped:
+                    return
+                continue
+
+            if kind == FRAME_CHUNK:
+                payload = FRAME_HEADER.pack(data.shape[0], data.shape[1],
+                    data.shape[2] if data.ndim == 3 else 1) + zlib.compress(
+                    data.tostring(), COMPRESSION_LEVEL)
+
+                with self._lock:
+                    self._queued_frames -= 1
+            else:
+                payload = json.dumps(data)
+
+            if kind == SHOTS_CHUNK:
+                self._shot_count += len(data)
+
+            try:
+                self._write_chunk(kind, sequence, timestamp, payload)
+            except (IOError, OSError) as e:
+                self._logger.warning("Couldn't write to the recording %s: %s",
+                    self._path, e)
+
+    def _write_chunk(self, kind, sequence, timestamp, payload):
+        offset = self._data_file.tell()
+        self._data_file.write(payload)
+        self._data_file.flush()
+
+        if kind == FRAME_CHUNK:
+            record = numpy.array([(sequence, timestamp, offset,
+                len(payload))], FRAME_INDEX_DTYPE)
+            self._index_file.write(record.tostring())
+            self._index_file.flush()
+            self._recorded_frames += 1
+        else:
+            if kind == TARGETS_CHUNK:
+                self._targets_event = self._event_count
+
+            record = numpy.array([(kind, sequence, timestamp, offset,
+                len(payload), self._shot_count, self._targets_event)],
+                EVENT_INDEX_DTYPE)
+            self._event_index_file.write(record.tostring())
+            self._event_index_file.flush()
+            self._event_count += 1
+
+    def get_path(self):
+        return self._path
+
+    # Returns (recorded frames, dropped frames)
+    def get_stats(self):
+        with self._lock:
+            return (self._recorded_frames, self._dropped_frames)
+
+    # Writes everything that was recorded and closes the recording
+    def close(self):
+        if self._stopped:
+            return
+
+        self._stopped = True
+        self._encoder_thread.join()
+        self._data_file.close()
+        self._index_file.close()
+        self._event_index_file.close()
+
+    def __init__(self, logger, path=None, queue_size=RECORDING_QUEUE_SIZE):
+        if path is None:
+            if not os.path.isdir(RECORDING_DIR):
+                os.makedirs(RECORDING_DIR)
+
+            path = os.path.join(RECORDING_DIR, "session-%s%s" % (
+                time.strftime("%Y%m%d-%H%M%S"), RECORDING_EXTENSION))
+
+        self._logger = logger
+        self._path = path
+        self._queue_size = queue_size
+        self._chunks = Queue.Queue()
+        self._lock = threading.Lock()
+        self._queued_frames = 0
+        self._recorded_frames = 0
+        self._dropped_frames = 0
+        self._latest_sequence = -1
+        self._stopped = False
+
+        # Only used by the encoder thread
+        self._shot_count = 0
+        self._event_count = 0
+        self._targets_event = -1
+
+        self._data_file = open(path, "wb")
+        self._data_file.write(HEADER.pack(MAGIC, VERSION))
+        self._index_file = open(path + INDEX_EXTENSION, "wb")
+        self._event_index_file = open(path + EVENT_INDEX_EXTENSION, "wb")
+
+        self._encoder_thread = threading.Thread(target=self._encode_chunks,
+            name="recording_encoder_thread")
+        self._encoder_thread.daemon = True
+        self._encoder_thread.start()
+
+# Reads a recording made by SessionRecorder. Frames are numbered from 0 in
+# the order they were recorded, which is not the same as their sequence
+# numbers if any frames weren't recorded.
+class SessionRecording():
+    def get_frame_count(self):
+        return len(self._frames)
+
+    # Returns a (sequence, timestamp, frame) tuple for frame number index
+    def read_frame(self, index):
+        entry = self._frames[index]
+        payload = self._read_chunk(entry)
+
+        (height, width, channels) = FRAME_HEADER.unpack_from(payload)
+
+        try:
+            pixels = zlib.decompress(payload[FRAME_HEADER.size:])
+        except zlib.error:
+            raise RecordingError("Frame %d of the recording is damaged" % index)
+
+        shape = (height, width)
+        if channels > 1:
+            shape = (height, width, channels)
+
+        if len(pixels) != height * width * channels:
+            raise RecordingError("Frame %d of the recording is damaged" % index)
+
+        frame = numpy.frombuffer(pixels, numpy.uint8).reshape(shape)
+
+        return (int(entry["sequence"]), float(entry["timestamp"]), frame)
+
+    # Returns the sequence number of frame number index without reading
+    # the frame
+    def get_sequence(self, index):
+        return int(self._frames[index]["sequence"])
+
+    # Returns the number of the first recorded frame with a sequence number
+    # of at least sequence
+    def find_frame(self, sequence):
+        return _bisect_left(self._frames, "sequence", sequence)
+
+    # Returns a list with a (sequence, timestamp, shots) tuple for every
+    # frame shots were found in, where shots is a list of dictionaries with
+    # the keys "x", "y", "color", and "tags" (None for a miss)
+    def get_shots(self):
+        shots = []
+
+        for entry in self._events:
+            if entry["kind"] == SHOTS_CHUNK:
+                shots.append((int(entry["sequence"]),
+                    float(entry["timestamp"]),
+                    json.loads(self._read_chunk(entry))))
+
+        return shots
+
+    # Returns the number of the frame the shot_number-th shot (counting from
+    # 0) was found in, or None if there aren't that many shots
+    def find_shot(self, shot_number):
+        index = _bisect_left(self._events, "shots", shot_number + 1)
+
+        if index == len(self._events):
+            return None
+
+        return self.find_frame(self._events[index]["sequence"])
+
+    # Returns the targets that were on the feed when the frame with sequence
+    # was seen as a list of (name, region_object) tuples (see
+    # SessionRecorder.record_targets)
+    def get_targets(self, sequence):
+        targets_id = self.get_targets_id(sequence)
+
+        if targets_id < 0:
+            return []
+
+        entry = self._events[targets_id]
+
+        return [(target["name"], target["regions"])
+            for target in json.loads(self._read_chunk(entry))]
+
+    # Returns a number for the targets that were on the feed when the frame
+    # with sequence was seen (the position of their record in the events
+    # index), or -1 if none were recorded yet. It only changes where the
+    # targets were changed, so the targets don't have to be read to find
+    # out whether they did.
+    def get_targets_id(self, sequence):
+        index = _bisect_left(self._events, "sequence", sequence + 1) - 1
+
+        if index < 0:
+            return -1
+
+        return int(self._events[index]["targets"])
+
+    # Returns the rate frames were recorded at, or 0 if it can't be worked
+    # out
+    def get_fps(self):
+        if len(self._frames) < 2:
+            return 0
+
+        elapsed = self._frames["timestamp"][-1] - self._frames["timestamp"][0]
+        if elapsed <= 0:
+            return 0
+
+        return (len(self._frames) - 1) / elapsed
+
+    def _read_chunk(self, entry):
+        self._data_file.seek(int(entry["offset"]))
+        return self._data_file.read(int(entry["length"]))
+
+    def close(self):
+        self._data_file.close()
+
+    def __init__(self, path):
+        self._data_file = open(path, "rb")
+        header = self._data_file.read(HEADER.size)
+
+        if len(header) < HEADER.size:
+            raise RecordingError("%s is not a recording" % path)
+
+        (magic, version) = HEADER.unpack(header)
+
+        if magic != MAGIC:
+            raise RecordingError("%s is not a recording" % path)
+
+        if version != VERSION:
+            raise RecordingError("The recording is from a different version " +
+                "of ShootOFF (format version %d)" % version)
+
+        self._data_file.seek(0, os.SEEK_END)
+        data_size = self._data_file.tell()
+
+        self._frames = _map_index(path + INDEX_EXTENSION, FRAME_INDEX_DTYPE,
+            data_size)
+        self._events = _map_index(path + EVENT_INDEX_EXTENSION,
+            EVENT_INDEX_DTYPE, data_size)
+
+# Memory maps the index in path and returns a view of the records whose
+# chunks are in the recording
+def _map_index(path, dtype, data_size):
+    count = 0
+    if os.path.exists(path):
+        # Leave off a record that was cut off
+        count = os.path.getsize(path) / dtype.itemsize
+
+    if count == 0:
+        return numpy.zeros(0, dtype)
+
+    index = numpy.memmap(path, dtype, "r", shape=(count,))
+
+    # Chunks are written before their records, so only the last few records
+    # can be for chunks that didn't make it into the recording
+    while (count > 0 and
+        index[count - 1]["offset"] + index[count - 1]["length"] > data_size):
+        count -= 1
+
+    return index[:count]
+
+# Returns the position of the first record in index whose field is at least
+# value (the field has to be sorted). Only the records looked at are read
+# from the memory mapped index.
+def _bisect_left(index, field, value):
+    low = 0
+    high = len(index)
+
+    while low < high:
+        middle = (low + high) / 2
+
+        if index[middle][field] < value:
+            low = middle + 1
+        else:
+            high = middle
+
+    return low
+
+# Returns True if path is a recording made by SessionRecorder
+def is_recording(path):
+    return (os.path.splitext(path)[1].lower() == RECORDING_EXTENSION and
+        os.path.isfile(path))
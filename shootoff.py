@@ -4,27 +4,44 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+from callback_profiler import CallbackProfiler
 from canvas_manager import CanvasManager
 import configurator
 from configurator import Configurator
 import cv2
+from detection_engine import DetectionEngine
+from display_scheduler import DisplayScheduler
+from frame_capture import (CameraSource, FrameCapture, RecordingSource,
+    open_replay_source)
 import glob
-import imp
-import numpy
+from heatmap import HeatmapAccumulator
 import os
+from overlay_renderer import OverlayRenderer, STIPPLE_ALPHA
 from PIL import Image, ImageTk
+from plugin_loader import PluginLoader
 from preferences_editor import PreferencesEditor
+import Queue
 import re
-from shot import Shot
+from region_raster import get_bbox, get_region_shape
+from session_log import (SessionLog, CLEAR_RECORD, COLUMNS_RECORD,
+    PROTOCOL_RECORD)
+from session_recording import SessionRecorder
+from shot_group_stats import ShotGroupStatistics
+from shot_list import VirtualShotList
+from shot_store import ShotStore
+from shot_latency import (ShotLatency, LATENCY_MARKER, LATENCY_PROCESS_HIT,
+    LATENCY_PROTOCOL)
 from tag_parser import TagParser
 from target_editor import TargetEditor
 from target_pickler import TargetPickler
 import time
 from training_protocols.protocol_operations import ProtocolOperations
-from threading import Thread
+from threading import Event, Thread
 import Tkinter, tkFileDialog, tkMessageBox, ttk
 
-FEED_FPS = 30  # ms
+INTERFERENCE_DURATION = 5 # s
+SHOT_QUEUE_RATE = 10 # ms
+FRAME_WAIT_TIMEOUT = .5 # s
 SHOT_MARKER = "shot_marker"
 TARGET_VISIBILTY_MENU_INDEX = 3
 
@@ -33,28 +50,37 @@ DEFAULT_SHOT_LIST_COLUMNS = ("Time", "Laser")
 
 class MainWindow:
     def refresh_frame(self, *args):
-        rval, self._webcam_frame = self._cv.read()
-
-        if (rval == False):
-            self._refresh_miss_count += 1
-            self.logger.debug ("Missed %d webcam frames. If we miss too many ShootOFF " +
-                "will stop processing shots.", self._refresh_miss_count)
-
-            if self._refresh_miss_count >= 25:
-                tkMessageBox.showerror("Webcam Disconnected", "Missed too many " +
-                    "webcam frames. The camera is probably disconnected so " +
-                    "ShootOFF will stop processing shots.")
-                self.logger.critical("Missed %d webcam frames. The camera is probably " +
-                    "disconnected so ShootOFF will stop processing shots.",
-                    self._refresh_miss_count)
-                self._shutdown = True
-            else:
-                if self._shutdown == False:
-                    self._window.after(FEED_FPS, self.refresh_frame)
+        if self._capture.is_disconnected():
+            tkMessageBox.showerror("Webcam Disconnected", "Missed too many " +
+                "webcam frames. The camera is probably disconnected so " +
+                "ShootOFF will stop processing shots.")
+            self._shutdown = True
+            return
+
+        latest_sequence = self._capture.get_ring().get_latest_sequence()
+
+        # Nothing new has been captured since the last refresh
+        if latest_sequence == self._displayed_sequence:
+            if self._shutdown == False:
+                self._window.after(self._display_scheduler.get_wait_delay(),
+                    self.refresh_frame)
+            return
+
+        # Only the latest frame is shown, so frames that were captured while
+        # the last one was being shown are dropped instead of queued
+        start = time.time()
+        frame = self._capture.get_ring().read_latest(self._webcam_frame)
 
+        if frame is None:
+            if self._shutdown == False:
+                self._window.after(self._display_scheduler.get_wait_delay(),
+                    self.refresh_frame)
             return
 
-        self._refresh_miss_count = 0
+        (self._displayed_sequence, timestamp, self._webcam_frame) = frame
+
+        if self._startup_start is not None:
+            self.report_startup()
 
         #OpenCV reads the frame in BGR, but PIL uses RGB, so we if we don't
         #convert it, the colors will be off.
@@ -62,209 +88,535 @@ class MainWindow:
 
         # If the shot detector saw interference, we need to show it now
         if self._show_interference:
-            if self._interference_iterations > 0:
-                self._interference_iterations -= 1
-
+            if time.time() < self._interference_end:
                 frame_bw = cv2.cvtColor(self._webcam_frame, cv2.cv.CV_BGR2GRAY)
                 (thresh, webcam_image) = cv2.threshold(frame_bw,
                     self._preferences[configurator.LASER_INTENSITY], 255,
                     cv2.THRESH_BINARY)
 
+        # Targets and shot markers are drawn into the frame itself when they
+        # are composited (the interference image is shown without them)
+        if self._overlay_renderer is not None and webcam_image.ndim == 3:
+            if self._overlay_changed:
+                self._overlay_changed = False
+                self._overlay_renderer.set_items(self.get_overlay_items())
+
+            self._overlay_renderer.composite(webcam_image)
+
         # Show webcam image a Tk image container (note:
         # if the image isn't stored in an instance variable
-        # it will be garbage collected and not show)
-        self._image = ImageTk.PhotoImage(image=Image.fromarray(webcam_image))
+        # it will be garbage collected and not show). The feed
+        # is one canvas item whose pixels are replaced in place,
+        # otherwise every frame would add an item to the canvas.
+        if self._feed_image is None:
+            self._feed_image = ImageTk.PhotoImage("RGB",
+                (webcam_image.shape[1], webcam_image.shape[0]))
+            self._feed_item = self._webcam_canvas.create_image(0, 0,
+                image=self._feed_image, anchor=Tkinter.NW, tags=("background"))
+            self.update_feed_stacking()
 
-        # If the target editor doesn't have its own copy of the image
-        # the webcam feed will never update again after the editor opens
-        self._editor_image = ImageTk.PhotoImage(
-            image=Image.fromarray(webcam_image))
+        self._feed_image.paste(Image.fromarray(webcam_image))
 
-        webcam_image = self._webcam_canvas.create_image(0, 0, image=self._image,
-            anchor=Tkinter.NW, tags=("background"))
+        if self._display_scheduler.frame_shown(self._displayed_sequence,
+            timestamp, time.time() - start):
 
-        # Drawing the new frame covers up our targets, so
-        # move it to the back if they are supposed to show
-        if self._show_targets:
+            self.update_feed_status()
+
+        if self._shutdown == False:
+            self._window.after(self._display_scheduler.get_delay(),
+                self.refresh_frame)
+
+    # Shows how fast the feed is really being refreshed under the feed
+    def update_feed_status(self):
+        scheduler = self._display_scheduler
+
+        self._feed_status_label.configure(text=("Feed: %.1f fps (camera " +
+            "%.1f fps, %.1f ms per frame, %d dropped)") % (scheduler.get_fps(),
+            scheduler.get_camera_fps(), scheduler.get_render_time() * 1000,
+            scheduler.get_dropped_frames()))
+
+    # Puts the feed behind the targets and shot markers, or behind only
+    # the shot markers when the targets are hidden. This needs to be
+    # called whenever a target is added or shown/hidden.
+    #
+    # When targets and shot markers are composited into the feed they are
+    # all kept behind it instead (they are still there to be selected and
+    # hit) and the overlay is drawn again before the next frame.
+    def update_feed_stacking(self):
+        if self._feed_item is None:
+            return
+
+        if self._overlay_renderer is not None:
+            for target in self._targets:
+                self._webcam_canvas.tag_lower(target, self._feed_item)
+            self._webcam_canvas.tag_lower(SHOT_MARKER, self._feed_item)
+            self._overlay_changed = True
+        elif self._show_targets:
             # Not raising existing targets while lowering the webcam feed
-            # will cause hits to stop registering on targets
+            # will hide them behind the feed
             for target in self._targets:
                 self._webcam_canvas.tag_raise(target)
             self._webcam_canvas.tag_raise(SHOT_MARKER)
-            self._webcam_canvas.tag_lower(webcam_image)
+            self._webcam_canvas.tag_lower(self._feed_item)
         else:
             # We have to lower canvas then the targets so
             # that anything drawn by plugins will still show
             # but the targets won't
             self._webcam_canvas.tag_raise(SHOT_MARKER)
-            self._webcam_canvas.tag_lower(webcam_image)
+            self._webcam_canvas.tag_lower(self._feed_item)
             for target in self._targets:
                 self._webcam_canvas.tag_lower(target)
 
-        if self._shutdown == False:
-            self._window.after(FEED_FPS, self.refresh_frame)
+    # Needs to be called whenever something that changes how targets or
+    # shot markers look (e.g. moving or selecting them) happens
+    def overlay_changed(self):
+        if self._overlay_renderer is not None:
+            self.update_feed_stacking()
+
+    # Returns the canvas items the overlay is drawn from, from the bottom
+    # most to the top most, in the format OverlayRenderer takes
+    def get_overlay_items(self):
+        items = []
+
+        if self._show_targets:
+            for target in self._targets:
+                for region in self._webcam_canvas.find_withtag(target):
+                    items.append(self.get_overlay_item(region, True))
+
+        for marker in self._webcam_canvas.find_withtag(SHOT_MARKER):
+            items.append(self.get_overlay_item(marker, False))
+
+        return items
+
+    def get_overlay_item(self, item, is_region):
+        coords = self._webcam_canvas.coords(item)
+
+        if is_region:
+            tags = TagParser.parse_tags(self._webcam_canvas.gettags(item))
+            shape = get_region_shape(coords, tags)
+            fill_alpha = STIPPLE_ALPHA.get(
+                self._webcam_canvas.itemcget(item, "stipple"), 1.0)
+        else:
+            shape = "oval"
+            fill_alpha = 1.0
+
+        return (shape, coords,
+            self.get_rgb(self._webcam_canvas.itemcget(item, "fill")),
+            self.get_rgb(self._webcam_canvas.itemcget(item, "outline")),
+            fill_alpha)
+
+    # Returns the (r, g, b) of a Tk color name, or None if it is empty
+    def get_rgb(self, color):
+        if not color:
+            return None
+
+        if color not in self._overlay_colors:
+            self._overlay_colors[color] = tuple(
+                [value >> 8 for value in self._webcam_canvas.winfo_rgb(color)])
+
+        return self._overlay_colors[color]
+
+    # If the target editor doesn't have its own copy of the image
+    # the webcam feed will never update again after the editor opens,
+    # so it gets a snapshot of the frame that is showing
+    def get_editor_image(self):
+        if self._webcam_frame is None:
+            image = Image.new("RGB", (int(self._webcam_canvas["width"]),
+                int(self._webcam_canvas["height"])))
+        else:
+            image = Image.fromarray(cv2.cvtColor(self._webcam_frame,
+                cv2.cv.CV_BGR2RGB))
+
+        self._editor_image = ImageTk.PhotoImage(image=image)
+        return self._editor_image
+
+    # Returns the ShotStore with the shots that haven't been cleared
+    def get_shots(self):
+        return self._shots
+
+    # Returns the ShotGroupStatistics for the shots that haven't been cleared
+    def get_group_stats(self):
+        return self._group_stats
 
     def detect_shots(self):
-        if (self._webcam_frame is None):
+        frame = None
+
+        # Only look at a frame once, otherwise a slow camera would make
+        # the same laser spot show up as multiple shots
+        if (self._capture.get_ring().get_latest_sequence() !=
+            self._detected_sequence):
+
+            frame = self._capture.get_ring().read_latest(self._detection_frame)
+
+        if frame is None:
             self._window.after(self._preferences[configurator.DETECTION_RATE], self.detect_shots)
             return
 
-        # Makes feed black and white
-        frame_bw = cv2.cvtColor(self._webcam_frame, cv2.cv.CV_BGR2GRAY)
-
-        # Threshold the image
-        (thresh, frame_thresh) = cv2.threshold(frame_bw, 
-            self._preferences[configurator.LASER_INTENSITY], 255, cv2.THRESH_BINARY)
+        (self._detected_sequence, timestamp, self._detection_frame) = frame
 
-        # Determine if we have a light source or glare on the feed
-        if not self._seen_interference:
-            self.detect_interfence(frame_thresh)
+        replay_targets = self.get_replay_targets(self._detected_sequence)
+        if replay_targets is not None:
+            self.replace_targets(replay_targets)
 
-        # Find min and max values on the black and white frame
-        min_max = cv2.minMaxLoc(frame_thresh)
+        if self._recorder is not None:
+            self._recorder.record_frame(self._detection_frame,
+                self._detected_sequence, timestamp)
 
-        # The minimum and maximum are the same if there was
-        # nothing detected
-        if (min_max[0] != min_max[1]):
-            x = min_max[3][0]
-            y = min_max[3][1]
+        shots = self._detection_engine.process_frame(self._detection_frame,
+            self._detected_sequence, timestamp)
 
-            laser_color = self.detect_laser_color(x, y)
+        if self._recorder is not None and len(shots) > 0:
+            self._recorder.record_shots(self._detected_sequence, timestamp,
+                shots)
 
-            # If we couldn't detect a laser color, it's probably not a
-            # shot
-            if (laser_color is not None and
-                self._preferences[configurator.IGNORE_LASER_COLOR] not in laser_color):
+        if self._interference_detected:
+            self.show_interference_prompt()
 
-                self.handle_shot(laser_color, x, y)
+        for shot_event in shots:
+            self.handle_shot(shot_event)
 
         if self._shutdown == False:
             self._window.after(self._preferences[configurator.DETECTION_RATE],
                 self.detect_shots)
 
-    def handle_shot(self, laser_color, x, y):
+    # Runs on its own thread when the detection mode is FRAME_DETECTION
+    # and looks for shots in every frame the webcam captures. Shots
+    # are queued for the Tk thread to handle.
+    def detect_shots_per_frame(self):
+        ring = self._capture.get_ring()
+
+        while not self._shutdown:
+            if not ring.wait_for_frame(self._detected_sequence,
+                FRAME_WAIT_TIMEOUT):
+                continue
+
+            frame = ring.read_next(self._detected_sequence,
+                self._detection_frame)
+
+            if frame is None:
+                continue
+
+            (sequence, timestamp, self._detection_frame) = frame
+
+            # Targets can only be changed on the Tk thread, which first
+            # handles the shots that were queued before they changed
+            replay_targets = self.get_replay_targets(sequence)
+            if replay_targets is not None:
+                self._replay_targets_replaced.clear()
+                self._replay_targets = replay_targets
+
+                while (not self._replay_targets_replaced.wait(
+                    FRAME_WAIT_TIMEOUT) and not self._shutdown):
+                    pass
+
+            if self._recorder is not None:
+                self._recorder.record_frame(self._detection_frame, sequence,
+                    timestamp)
+
+            shots = self._detection_engine.process_frame(
+                self._detection_frame, sequence, timestamp)
+
+            if self._recorder is not None and len(shots) > 0:
+                self._recorder.record_shots(sequence, timestamp, shots)
+
+            for shot_event in shots:
+                self._detected_shots.put(shot_event)
+
+            self._detected_sequence = sequence
+            ring.release(sequence)
+
+    # Handles shots queued by detect_shots_per_frame on the Tk thread
+    def process_detected_shots(self):
+        if self._interference_detected:
+            self.show_interference_prompt()
+
+        # Every shot queued before the replayed targets changed is in the
+        # queue by now and is handled before they are replaced
+        replay_targets = self._replay_targets
+
+        while True:
+            try:
+                shot_event = self._detected_shots.get_nowait()
+            except Queue.Empty:
+                break
+
+            self.handle_shot(shot_event)
+
+        if replay_targets is not None:
+            self._replay_targets = None
+            self.replace_targets(replay_targets)
+            self._replay_targets_replaced.set()
+
+        if self._shutdown == False:
+            self._window.after(SHOT_QUEUE_RATE, self.process_detected_shots)
+
+    # Returns the geometry of target's regions in the format the detection
+    # engine expects. The engine has to be given this whenever the target
+    # is added, moved, scaled, or deleted.
+    def get_target_regions(self, target):
+        regions = []
+
+        for region in self._webcam_canvas.find_withtag(target):
+            regions.append((region, self._webcam_canvas.coords(region),
+                TagParser.parse_tags(self._webcam_canvas.gettags(region))))
+
+        return regions
+
+    # Returns the (x1, y1, x2, y2) box around target's regions on the feed
+    def get_target_bbox(self, target):
+        return get_bbox([self._webcam_canvas.coords(region)
+            for region in self._webcam_canvas.find_withtag(target)])
+
+    # Returns the TargetHeatmap for the file target was loaded from, or None
+    # if it wasn't loaded from a file (e.g. it came from a session recording)
+    def get_target_heatmap(self, target):
+        if target not in self._target_files:
+            return None
+
+        return self._heatmaps.get_heatmap(self._target_files[target])
+
+    def target_changed_listener(self, selection):
+        if selection in self._targets:
+            self._detection_engine.set_target(selection,
+                self.get_target_regions(selection))
+            self.overlay_changed()
+            self.record_targets()
+
+    # Records where every target is, which has to be done whenever a target
+    # is added, moved, scaled, or deleted
+    def record_targets(self):
+        if self._recorder is None:
+            return
+
+        targets = []
+
+        for target in self._targets:
+            region_object = []
+
+            for region in self._webcam_canvas.find_withtag(target):
+                region_object.append({"tags": [tag for tag in
+                    self._webcam_canvas.gettags(region)
+                    if tag != target and tag != "current"],
+                    "coords": self._webcam_canvas.coords(region),
+                    "fill": self._webcam_canvas.itemcget(region, "fill")})
+
+            targets.append((target, region_object))
+
+        self._recorder.record_targets(time.time(), targets)
+
+    # Called by the detection engine, which may not be running on the
+    # Tk thread, so the prompt is shown by whoever handles the shots
+    def interference_listener(self, percent_dark):
+        self._interference_detected = True
+
+    def handle_shot(self, shot_event):
         timestamp = 0
 
         # Start the shot timer if it has not been started yet,
         # otherwise get the time offset
         if self._shot_timer_start is None:
-            self._shot_timer_start = time.time()
+            self._shot_timer_start = shot_event.get_timestamp()
         else:
-            timestamp = time.time() - self._shot_timer_start
+            timestamp = shot_event.get_timestamp() - self._shot_timer_start
 
+        laser_color = shot_event.get_color()
         tree_item = None
 
         if "green" in laser_color:
-            tree_item = self._shot_timer_tree.insert("", "end",
-                values=[timestamp, "green"])
+            tree_item = self._shot_list.append([timestamp, "green"])
         else:
-            tree_item = self._shot_timer_tree.insert("", "end",
-                values=[timestamp, laser_color])
-        self._shot_timer_tree.see(tree_item)
-
-        new_shot = Shot((x, y), self._webcam_canvas,
-            self._preferences[configurator.MARKER_RADIUS],
-            laser_color, timestamp)
-        self._shots.append(new_shot)
+            tree_item = self._shot_list.append([timestamp, laser_color])
+
+        self._unlogged_shot_item = tree_item
+
+        target = None
+        if shot_event.is_hit() and "_internal_name" in shot_event.get_tags():
+            target = "_internal_name:" + shot_event.get_tags()["_internal_name"]
+
+        new_shot = self._shots.append(shot_event.get_coords(), laser_color,
+            timestamp, shot_event.get_region(), target,
+            self._preferences[configurator.MARKER_RADIUS])
         new_shot.draw_marker()
 
+        # Training protocols see the group statistics with this shot in them
+        (x, y) = shot_event.get_coords()
+        self._group_stats.add_shot(laser_color, target, x, y, timestamp)
+
+        if target in self._target_files:
+            self._heatmaps.add_shot(self._target_files[target],
+                self.get_target_bbox(target), x, y)
+
+        if self._overlay_renderer is None:
+            shot_event.mark(LATENCY_MARKER)
+
         # Process the shot to see if we hit a region and perform
         # a training protocol specific action and any if we did
         # command tag actions if we did
-        self.process_hit(new_shot, tree_item)
-
-    def detect_interfence(self, image_thresh):
-        brightness_hist = cv2.calcHist([image_thresh], [0], None, [256], [0, 255])
-        percent_dark = brightness_hist[0] / image_thresh.size
-
-        # If 99% of thresholded image isn't dark, we probably have
-        # a light source or glare in the image
-        if (percent_dark < .99):
-            # We will only warn about interference once each run
-            self._seen_interference = True
-
-            self.logger.warning(
-                "Glare or light source detected. %f of the image is dark." %
-                percent_dark)
-
-            self._show_interference = tkMessageBox.askyesno("Interference Detected", "Bright glare or a light source has been detected on the webcam feed, which will interfere with shot detection. Do you want to see a feed where the interference will be white and everything else will be black for a short period of time?")
-
-            if self._show_interference:
-                # calculate the number of times we should show the
-                # interference image (this should be roughly 5 seconds)
-                self._interference_iterations = 2500 / FEED_FPS
-
-    def detect_laser_color(self, x, y):
-        # Get the average color around the coordinates. If
-        # the dominant color is red, it's a red laser, if
-        # it's green it's a green laser, otherwise it's probably
-        # not a laser trainer, so ignore it
-        l = self._webcam_frame.shape[1]
-        h = self._webcam_frame.shape[0]
-        mask = numpy.zeros((h, l, 1), numpy.uint8)
-        cv2.circle(mask, (x, y), 10, (255, 255, 555), -1)
-        mean_color = cv2.mean(self._webcam_frame, mask)
-
-        # Remember that self._webcam_frame is in BGR
-        r = mean_color[2]
-        g = mean_color[1]
-        b = mean_color[0]
-
-        if (r > g) and (r > b):
-            return "red"
-
-        if (g > r) and (g > b):
-            return "green2"
+        self.process_hit(new_shot, tree_item, shot_event)
 
-        return None
+        # Only the new marker is drawn on the overlay, after the training
+        # protocol had a chance to change it
+        if self._overlay_renderer is not None and self._feed_item is not None:
+            self._webcam_canvas.tag_lower(SHOT_MARKER, self._feed_item)
+
+            if not self._overlay_changed:
+                self._overlay_renderer.add_items([self.get_overlay_item(
+                    new_shot.get_canvas_id(), False)])
+
+            shot_event.mark(LATENCY_MARKER)
+
+        self._shot_latency.record(shot_event)
+        self.update_latency_status()
+
+        # The shot is logged with the columns the training protocol filled
+        # in while it processed the shot
+        self._unlogged_shot_item = None
+        if self._session_log is not None:
+            tags = None
+            if shot_event.is_hit():
+                tags = shot_event.get_tags()
+
+            self._session_log.log_shot(len(self._shots) - 1, timestamp,
+                shot_event.get_timestamp(), shot_event.get_coords(),
+                laser_color, tags, self.get_shot_list_column_values(tree_item))
+
+    # Shows how long shots are taking to get from the camera through the
+    # training protocol under the feed
+    def update_latency_status(self):
+        percentiles = self._shot_latency.get_percentiles(LATENCY_PROTOCOL)
+
+        if percentiles is None:
+            return
+
+        self._latency_status_label.configure(text=("Shot latency: p50 " +
+            "%.0f ms, p95 %.0f ms, p99 %.0f ms") % tuple(
+            [latency * 1000 for latency in percentiles]))
+
+    def show_shot_latency(self):
+        summary = self._shot_latency.get_summary()
+
+        if len(summary) == 0:
+            tkMessageBox.showinfo("Shot Latency", "No shots have been " +
+                "detected yet.", parent=self._window)
+            return
 
-    def process_hit(self, shot, shot_list_item):
-        is_hit = False
+        # Every stage is timed from when the frame was captured
+        lines = ["%-12s %6s %8s %8s %8s %8s" % ("Stage", "Shots", "p50 ms",
+            "p95 ms", "p99 ms", "max ms")]
+        for (stage, count, p50, p95, p99, slowest) in summary:
+            lines.append("%-12s %6d %8.1f %8.1f %8.1f %8.1f" % (stage, count,
+                p50 * 1000, p95 * 1000, p99 * 1000, slowest * 1000))
 
-        x = shot.get_coords()[0]
-        y = shot.get_coords()[1]
+        tkMessageBox.showinfo("Shot Latency", "\n".join(lines),
+            parent=self._window)
+
+    def show_interference_prompt(self):
+        self._interference_detected = False
+
+        self._show_interference = tkMessageBox.askyesno("Interference Detected", "Bright glare or a light source has been detected on the webcam feed, which will interfere with shot detection. Do you want to see a feed where the interference will be white and everything else will be black for a short period of time?")
+
+        if self._show_interference:
+            # The interference image is shown for a fixed time no matter
+            # how fast the feed is refreshed
+            self._interference_end = time.time() + INTERFERENCE_DURATION
 
-        regions = self._webcam_canvas.find_overlapping(x, y, x, y)
+    def process_hit(self, shot, shot_list_item, shot_event):
+        # The detection engine already found the top most target
+        # region the shot hit (if any)
+        region = shot_event.get_region()
+        tags = shot_event.get_tags()
+        shot_event.mark(LATENCY_PROCESS_HIT)
 
         # If we hit a targert region, run its commands and notify the
         # loaded plugin of the hit
-        for region in reversed(regions):
-            tags = TagParser.parse_tags(
-                self._webcam_canvas.gettags(region))
-
-            if "_internal_name" in tags and "command" in tags:
+        if shot_event.is_hit():
+            if "command" in tags:
                 self.execute_region_commands(tags["command"])
 
-            if "_internal_name" in tags and self._loaded_training != None:
+            if self._loaded_training != None:
                 self._loaded_training.hit_listener(region, tags, shot, shot_list_item)
 
-            if "_internal_name" in tags:
-                is_hit = True
-                # only run the commands and notify a hit for the top most
-                # region
-                break
-
         if self._loaded_training != None:
-            self._loaded_training.shot_listener(shot, shot_list_item, is_hit)
+            self._loaded_training.shot_listener(shot, shot_list_item,
+                shot_event.is_hit())
+
+        shot_event.mark(LATENCY_PROTOCOL)
 
     def open_target_editor(self):
-        TargetEditor(self._frame, self._editor_image,
+        TargetEditor(self._frame, self.get_editor_image(),
                      notifynewfunc=self.new_target_listener)
 
     def add_target(self, name):
+        target_name = self.get_new_target_name()
+
+        target_pickler = TargetPickler()
+        (compiled_target, regions) = target_pickler.load(
+            name, self._webcam_canvas, target_name)
+
+        self._target_files[target_name] = name
+        self.place_target(target_name, compiled_target)
+
+    # When a session recording is replayed the targets on the feed are
+    # changed to the recorded ones whenever a replayed frame reaches a
+    # point in the recording where they were changed, so every shot is hit
+    # tested against the targets that were there when it was recorded.
+    # Returns the targets the replayed frame with sequence needs, or None
+    # if they are already on the feed (or this isn't a replay of a
+    # recording).
+    def get_replay_targets(self, sequence):
+        if not isinstance(self._capture_source, RecordingSource):
+            return None
+
+        targets_id = self._capture_source.get_targets_id(sequence)
+        if targets_id == self._replay_targets_id:
+            return None
+
+        self._replay_targets_id = targets_id
+        return self._capture_source.get_targets(sequence)
+
+    # Replaces every target with targets from a session recording
+    def replace_targets(self, targets):
+        for target in list(self._targets):
+            self.remove_target(target)
+
+        self.restore_targets(targets)
+
+    # Puts targets from a session recording back where they were
+    def restore_targets(self, targets):
+        target_pickler = TargetPickler()
+
+        for (name, region_object) in targets:
+            target_name = self.get_new_target_name()
+            (compiled_target, regions) = target_pickler.load_regions(
+                region_object, self._webcam_canvas, target_name)
+
+            self.place_target(target_name, compiled_target)
+
+    def get_new_target_name(self):
         # The target count is just supposed to prevent target naming collisions,
         # not keep track of how many active targets there are
         target_name = "_internal_name:target" + str(self._target_count)
         self._target_count += 1
 
-        target_pickler = TargetPickler()
-        (region_object, regions) = target_pickler.load(
-            name, self._webcam_canvas, target_name)
+        return target_name
 
+    # Called once a target's regions are on the canvas
+    def place_target(self, target_name, compiled_target):
         self._targets.append(target_name)
 
+        # The compiled target already has the regions rasterized for
+        # hit testing, as long as every region made it onto the canvas
+        target_regions = self.get_target_regions(target_name)
+        mask = None
+        if len(target_regions) == len(compiled_target.get_regions()):
+            mask = compiled_target.get_mask()
+
+        self._detection_engine.set_target(target_name, target_regions, mask)
+        self.update_feed_stacking()
+        self.record_targets()
+
     def edit_target(self, name):
-        TargetEditor(self._frame, self._editor_image, name,
+        TargetEditor(self._frame, self.get_editor_image(), name,
                      self.new_target_listener)
 
     def new_target_listener(self, target_file):
@@ -306,68 +658,132 @@ class MainWindow:
                 label="Hide Targets")
 
         self._show_targets = not self._show_targets
+        self.update_feed_stacking()
 
     def clear_shots(self):
         self._webcam_canvas.delete(SHOT_MARKER)
-        self._shots = []
+        self._shots.clear()
+        self._group_stats.clear()
+        self.overlay_changed()
+
+        if self._session_log is not None:
+            self._session_log.log(CLEAR_RECORD, {})
 
         if self._loaded_training != None:
             self._loaded_training.reset(self.aggregate_targets())
 
         self._shot_timer_start = None
-        shot_entries = self._shot_timer_tree.get_children()
-        for shot in shot_entries: self._shot_timer_tree.delete(shot)
+        self._shot_list.clear()
         self._previous_shot_time_selection = None
 
         self._webcam_canvas.focus_set()
 
     def quit(self):
         self._shutdown = True
-        self._cv.release()
+        self._detection_engine.get_stats().report()
+
+        if self._profiler is not None:
+            self.save_profile()
+
+        if self._session_log is not None:
+            self._session_log.close()
+            self.logger.info("Session saved to %s",
+                self._session_log.get_path())
+
+        if self._recorder is not None:
+            self._recorder.close()
+            (recorded, dropped) = self._recorder.get_stats()
+            self.logger.info("Recorded %d frames to %s (%d frames were " +
+                "dropped because they couldn't be saved fast enough)",
+                recorded, self._recorder.get_path(), dropped)
+
+        for heatmap_file in self._heatmaps.save():
+            self.logger.info("Saved the target heatmap %s", heatmap_file)
+
+        try:
+            latency_file = self._shot_latency.write()
+            if latency_file is not None:
+                self.logger.info("Shot latency for this session was saved " +
+                    "to %s", latency_file)
+        except (IOError, OSError) as e:
+            self.logger.warning("Couldn't save the shot latency: %s", e)
+        self._capture.stop()
+        self._capture_source.release()
         self._window.quit()
 
     def canvas_click_red(self, event):
         if self._preferences[configurator.DEBUG]:
-            self.handle_shot("red", event.x, event.y)
+            self.handle_shot(self._detection_engine.create_shot("red",
+                event.x, event.y))
 
     def canvas_click_green(self, event):
         if self._preferences[configurator.DEBUG]:
-            self.handle_shot("green", event.x, event.y)
+            self.handle_shot(self._detection_engine.create_shot("green",
+                event.x, event.y))
 
     def canvas_click(self, event):
         # find the target that was selected
         # if a target wasn't clicked, _selected_target
         # will be empty and all targets will be dim
-        selected_region = event.widget.find_closest(
-            event.x, event.y)
+        selected_region = None
         target_name = ""
 
-        for tag in self._webcam_canvas.gettags(selected_region):
-            if tag.startswith("_internal_name:"):
-                target_name = tag
-                break
+        # Composited targets are behind the feed, which would always be
+        # closest, so ask the detection engine what is on top there
+        if self._overlay_renderer is None:
+            selected_region = event.widget.find_closest(
+                event.x, event.y)
+        elif self._show_targets:
+            (selected_region, tags) = self._detection_engine.hit_test(
+                event.x, event.y)
+
+        if selected_region is not None:
+            for tag in self._webcam_canvas.gettags(selected_region):
+                if tag.startswith("_internal_name:"):
+                    target_name = tag
+                    break
 
         if self._selected_target == target_name:
             return
 
-        self._canvas_manager.selection_update_listener(self._selected_target,
+        old_selection = self._selected_target
+        self._canvas_manager.selection_update_listener(old_selection,
                                                        target_name)
         self._selected_target = target_name
 
+        # Selecting a target can recreate its regions as new canvas items
+        # (ovals on Windows), so the detection engine's copy of both targets
+        # is rebuilt from what is on the canvas now
+        self.target_changed_listener(old_selection)
+        self.target_changed_listener(target_name)
+        self.overlay_changed()
+
     def canvas_delete_target(self, event):
         if (self._selected_target):
-            for target in self._targets:
-                if target == self._selected_target:
-                    self._targets.remove(target)
-            event.widget.delete(self._selected_target)
+            self.remove_target(self._selected_target)
+
+    def remove_target(self, target):
+        if target in self._targets:
+            self._targets.remove(target)
+        self._target_files.pop(target, None)
+        self._webcam_canvas.delete(target)
+        self._detection_engine.remove_target(target)
+
+        if self._selected_target == target:
             self._selected_target = ""
 
+        self.overlay_changed()
+        self.record_targets()
+
     def cancel_training(self):
         if self._loaded_training:
             self._loaded_training.destroy()
             self._protocol_operations.destroy()
             self._loaded_training = None
 
+            if self._session_log is not None:
+                self._session_log.log(PROTOCOL_RECORD, {"name": None})
+
     def aggregate_targets(self):
         # Create a list of targets, their regions, and the tags attached
         # to those regions so that the plugin can have a stock of what
@@ -396,8 +812,52 @@ class MainWindow:
             self._protocol_operations.destroy()
 
         self._protocol_operations = ProtocolOperations(self._webcam_canvas, self)
-        self._loaded_training = imp.load_module("__init__", *plugin).load(
+
+        # Protocols aren't imported until they are picked
+        start = time.time()
+        self._loaded_training = self._plugin_loader.load(plugin).load(
             self._protocol_operations, targets)
+        self.logger.debug("Loaded %s in %.0f ms", plugin.get_name(),
+            (time.time() - start) * 1000)
+
+        if self._session_log is not None:
+            self._session_log.log(PROTOCOL_RECORD, {"name": plugin.get_name()})
+
+        if self._profiler is not None:
+            for listener in ("hit_listener", "shot_listener"):
+                setattr(self._loaded_training, listener, self._profiler.wrap(
+                    plugin.get_name() + "." + listener,
+                    getattr(self._loaded_training, listener)))
+
+    # Wraps the callbacks that run every frame or shot so that they are
+    # profiled. Training protocol listeners are wrapped when the protocol
+    # is loaded.
+    def start_profiling(self, mode):
+        self._profiler = CallbackProfiler(mode)
+
+        for callback in ("refresh_frame", "detect_shots",
+            "process_detected_shots", "handle_shot"):
+
+            setattr(self, callback, self._profiler.wrap(callback,
+                getattr(self, callback)))
+
+        self._detection_engine.process_frame = self._profiler.wrap(
+            "process_frame", self._detection_engine.process_frame)
+
+        self._profiler.start()
+        self.logger.info("Profiling (%s)", mode)
+
+    def save_profile(self):
+        self._profiler.stop()
+
+        for line in self._profiler.format_summary():
+            self.logger.info(line)
+
+        try:
+            for profile_file in self._profiler.write():
+                self.logger.info("Profile saved to %s", profile_file)
+        except (IOError, OSError) as e:
+            self.logger.warning("Couldn't save the profile: %s", e)
 
     def edit_preferences(self):
         preferences_editor = PreferencesEditor(self._window, self._config_parser,
@@ -455,15 +915,14 @@ class MainWindow:
         else:
             self._webcam_canvas.postscript(file=(file_name + ".eps"))
 
-    def shot_time_selected(self, event):
-        selected_shots = event.widget.focus()
-        shot_index = event.widget.index(selected_shots)
+    def shot_time_selected(self, shot_index):
         self._shots[shot_index].toggle_selected()
 
         if self._previous_shot_time_selection is not None:
             self._previous_shot_time_selection.toggle_selected()
 
         self._previous_shot_time_selection = self._shots[shot_index]
+        self.overlay_changed()
 
         self._webcam_canvas.focus_set()
 
@@ -471,26 +930,15 @@ class MainWindow:
         self.configure_shot_list_columns(DEFAULT_SHOT_LIST_COLUMNS, [50, 50])
 
     def add_shot_list_columns(self, id_list):
-        current_columns = self._shot_timer_tree.cget("columns")
-        if not current_columns:
-            self._shot_timer_tree.configure(columns=(id_list))
-        else:
-            self._shot_timer_tree.configure(columns=(current_columns + id_list))
+        self._shot_list.add_columns(id_list)
 
     def resize_shot_list(self):
-        self._shot_timer_tree.configure(displaycolumns="#all")
+        self._shot_list.resize()
 
     # This method removes all but the default columns for the shot list
     def revert_shot_list_columns(self):
-        self._shot_timer_tree.configure(columns=DEFAULT_SHOT_LIST_COLUMNS)
+        self._shot_list.revert_columns(len(DEFAULT_SHOT_LIST_COLUMNS))
         self.configure_default_shot_list_columns()
-
-        shot_entries = self._shot_timer_tree.get_children()
-        for shot in shot_entries:
-            current_values = self._shot_timer_tree.item(shot, "values")
-            default_values = current_values[0:len(DEFAULT_SHOT_LIST_COLUMNS)]
-            self._shot_timer_tree.item(shot, values=default_values)
-
         self.resize_shot_list()
 
     def configure_shot_list_columns(self, names, widths):
@@ -500,12 +948,21 @@ class MainWindow:
         self.resize_shot_list()
 
     def append_shot_list_column_data(self, item, values):
-        current_values = self._shot_timer_tree.item(item, "values")
-        self._shot_timer_tree.item(item, values=(current_values + values))
+        self._shot_list.append_values(item, tuple(values))
+
+        # Shots that are still being handled are logged with their columns
+        if self._session_log is not None and item != self._unlogged_shot_item:
+            self._session_log.log(COLUMNS_RECORD, {"shot": item,
+                "columns": self.get_shot_list_column_values(item)})
+
+    # Returns a dictionary with the values of the columns a training protocol
+    # added to item in the shot list
+    def get_shot_list_column_values(self, item):
+        return self._shot_list.get_column_values(item,
+            len(DEFAULT_SHOT_LIST_COLUMNS))
 
     def configure_shot_list_column(self, name, width):
-        self._shot_timer_tree.heading(name, text=name)
-        self._shot_timer_tree.column(name, width=width, stretch=False)
+        self._shot_list.configure_column(name, width)
 
     def build_gui(self, feed_dimensions=(600, 480)):
         # Create the main window
@@ -520,6 +977,8 @@ class MainWindow:
         self._webcam_canvas = Tkinter.Canvas(self._frame,
             width=feed_dimensions[0], height=feed_dimensions[1])
         self._webcam_canvas.grid(row=0, column=0)
+        self._shots = ShotStore(self._webcam_canvas,
+            self._preferences[configurator.MARKER_RADIUS])
 
         self._webcam_canvas.bind('<ButtonPress-1>', self.canvas_click)
         self._webcam_canvas.bind('<Delete>', self.canvas_delete_target)
@@ -528,23 +987,29 @@ class MainWindow:
             self._webcam_canvas.bind('<Shift-ButtonPress-1>', self.canvas_click_red)
             self._webcam_canvas.bind('<Control-ButtonPress-1>', self.canvas_click_green)
 
-        self._canvas_manager = CanvasManager(self._webcam_canvas)
+        self._canvas_manager = CanvasManager(self._webcam_canvas,
+            self.target_changed_listener)
 
         # Create a button to clear shots
         self._clear_shots_button = ttk.Button(
             self._frame, text="Clear Shots", command=self.clear_shots)
         self._clear_shots_button.grid(row=1, column=0)
 
-        # Create the shot timer tree
+        # Show how fast the feed is being shown and how long shots take
+        self._feed_status_label = ttk.Label(self._frame)
+        self._feed_status_label.grid(row=2, column=0, sticky=Tkinter.W)
+        self._latency_status_label = ttk.Label(self._frame)
+        self._latency_status_label.grid(row=3, column=0, sticky=Tkinter.W)
+
+        # Create the shot timer tree. Only the shots that fit in it have an
+        # item, so the shot list scrolls it instead of the tree's yview.
         self._shot_timer_tree = ttk.Treeview(self._frame, selectmode="browse",
                                              show="headings")
-        self.add_shot_list_columns(DEFAULT_SHOT_LIST_COLUMNS)
+        tree_scrolly = ttk.Scrollbar(self._frame, orient=Tkinter.VERTICAL)
+        self._shot_list = VirtualShotList(self._shot_timer_tree, tree_scrolly,
+            self.shot_time_selected, DEFAULT_SHOT_LIST_COLUMNS)
         self.configure_default_shot_list_columns()
 
-        tree_scrolly = ttk.Scrollbar(self._frame, orient=Tkinter.VERTICAL,
-                                     command=self._shot_timer_tree.yview)
-        self._shot_timer_tree['yscroll'] = tree_scrolly.set
-
         tree_scrollx = ttk.Scrollbar(self._frame, orient=Tkinter.HORIZONTAL,
                                      command=self._shot_timer_tree.xview)
         self._shot_timer_tree['xscroll'] = tree_scrollx.set
@@ -552,7 +1017,6 @@ class MainWindow:
         self._shot_timer_tree.grid(row=0, column=1, rowspan=2, sticky=Tkinter.NSEW)
         tree_scrolly.grid(row=0, column=2, rowspan=2, stick=Tkinter.NS)
         tree_scrollx.grid(row=1, column=1, stick=Tkinter.EW)
-        self._shot_timer_tree.bind("<<TreeviewSelect>>", self.shot_time_selected)
 
         self.create_menu()
 
@@ -563,6 +1027,8 @@ class MainWindow:
         file_menu = Tkinter.Menu(menu_bar, tearoff=False)
         file_menu.add_command(label="Preferences", command=self.edit_preferences)
         file_menu.add_command(label="Save Feed Image...", command=self.save_feed_image)
+        file_menu.add_command(label="Shot Latency...",
+            command=self.show_shot_latency)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.quit)
         menu_bar.add_cascade(label="File", menu=file_menu)
@@ -589,7 +1055,9 @@ class MainWindow:
                 variable=self._training_selection, value=name)
         self._training_selection.set(name)
 
+        start = time.time()
         self.create_training_list(training_menu, self.load_training)
+        self._startup_times.append(("training protocols", time.time() - start))
         menu_bar.add_cascade(label="Training", menu=training_menu)
 
     def callback_factory(self, func, name):
@@ -609,70 +1077,154 @@ class MainWindow:
 
         return target_list_menu
 
-    def create_training_list(self, menu, func):
-        protocols_dir = "training_protocols"
+    # Logs how long it took to show the first frame and how long the
+    # slow parts of getting there took
+    def report_startup(self):
+        total = time.time() - self._startup_start
+        self._startup_start = None
 
-        plugin_candidates = os.listdir(protocols_dir)
-        for candidate in plugin_candidates:
-            plugin_location = os.path.join(protocols_dir, candidate)
-            if (not os.path.isdir(plugin_location) or
-                not "__init__.py" in os.listdir(plugin_location)):
-                continue
-            plugin_info = imp.find_module("__init__", [plugin_location])
-            training_info = imp.load_module("__init__", *plugin_info).get_info()
-            menu.add_radiobutton(label=training_info["name"],
-                command=self.callback_factory(self.load_training, plugin_info),
-                variable=self._training_selection, value=training_info["name"])
+        self.logger.info("Startup took %.0f ms to show the first frame (%s)",
+            total * 1000, ", ".join(["%s %.0f ms" % (phase, elapsed * 1000)
+            for (phase, elapsed) in self._startup_times]))
+
+    def create_training_list(self, menu, func):
+        for plugin in self._plugin_loader.find_plugins():
+            menu.add_radiobutton(label=plugin.get_name(),
+                command=self.callback_factory(func, plugin),
+                variable=self._training_selection, value=plugin.get_name())
 
     def __init__(self, config):
-        self._shots = []
+        self._startup_start = time.time()
+        self._startup_times = []
+        self._shots = None
+        self._group_stats = ShotGroupStatistics()
         self._targets = []
         self._target_count = 0
-        self._refresh_miss_count = 0
+        self._target_files = {}
         self._show_targets = True
         self._selected_target = ""
         self._loaded_training = None
-        self._seen_interference = False
         self._show_interference = False
+        self._interference_detected = False
+        self._interference_end = 0
+        self._detected_shots = Queue.Queue()
+        self._replay_targets_id = None
+        self._replay_targets = None
+        self._replay_targets_replaced = Event()
         self._webcam_frame = None
+        self._feed_image = None
+        self._feed_item = None
+        self._overlay_renderer = None
+        self._overlay_changed = False
+        self._overlay_colors = {}
+        self._display_scheduler = DisplayScheduler()
+        self._shot_latency = ShotLatency()
+        self._profiler = None
+        self._session_log = None
+        self._unlogged_shot_item = None
+        self._recorder = None
+        self._editor_image = None
+        self._detection_frame = None
+        self._displayed_sequence = -1
+        self._detected_sequence = -1
         self._config_parser = config.get_config_parser()
         self._preferences = config.get_preferences()
         self._shot_timer_start = None
         self._previous_shot_time_selection = None
         self.logger = config.get_logger()
+        self._plugin_loader = PluginLoader(self.logger)
+        self._detection_engine = DetectionEngine(self._preferences, self.logger,
+            self.interference_listener)
+        self._heatmaps = HeatmapAccumulator(self.logger)
+
+        if self._preferences[configurator.PROFILE]:
+            self.start_profiling(self._preferences[configurator.PROFILE])
+
+        replay = self._preferences[configurator.REPLAY]
+        lossless = False
+
+        if replay:
+            realtime = (self._preferences[configurator.REPLAY_SPEED] ==
+                configurator.REALTIME_REPLAY)
 
-        self._cv = cv2.VideoCapture(0)
+            if self._preferences[configurator.REPLAY_FPS]:
+                self._capture_source = open_replay_source(replay, realtime,
+                    self._preferences[configurator.REPLAY_FPS])
+            else:
+                self._capture_source = open_replay_source(replay, realtime)
+
+            if self._preferences[configurator.REPLAY_SHOT]:
+                if not isinstance(self._capture_source, RecordingSource):
+                    self.logger.warning("Only session recordings can be " +
+                        "replayed from a shot, %s will be replayed from the " +
+                        "start.", replay)
+                elif not self._capture_source.seek_to_shot(
+                    self._preferences[configurator.REPLAY_SHOT] - 1):
+                    self.logger.warning("%s doesn't have %d shots, it will " +
+                        "be replayed from the start.", replay,
+                        self._preferences[configurator.REPLAY_SHOT])
+
+            # When frames are replayed as fast as possible and every frame
+            # is checked for shots, don't let the replay get ahead of
+            # shot detection
+            lossless = (not realtime and
+                self._preferences[configurator.DETECTION_MODE] ==
+                configurator.FRAME_DETECTION)
+        else:
+            self._capture_source = CameraSource(0)
+
+        self._startup_times.append(("camera", time.time() - self._startup_start))
 
-        if self._cv.isOpened():
-            width = self._cv.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH)
-            height = self._cv.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT)
+        if self._capture_source.is_opened():
+            (width, height) = self._capture_source.get_resolution()
 
             # If the resolution is too low, try to force it higher.
             # Some users have drivers that default to extremely low
             # resolutions and opencv doesn't currently make it easy
             # to enumerate valid resolutions and switch to them
-            if width < 640 and height < 480:
+            if not replay and width < 640 and height < 480:
                 self.logger.info("Webcam resolution is current low (%dx%d), " +
                                  "attempting to increase it to 640x480", width, height)
-                self._cv.set(cv2.cv.CV_CAP_PROP_FRAME_WIDTH, 640)
-                self._cv.set(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT, 480)
-                width = self._cv.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH)
-                height = self._cv.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT)
+                self._capture_source.set_resolution(640, 480)
+                (width, height) = self._capture_source.get_resolution()
 
             self.logger.debug("Webcam resolution is %dx%d", width, height)
+            self._capture = FrameCapture(self._capture_source, self.logger,
+                lossless=lossless)
+            start = time.time()
             self.build_gui((width, height))
+            self._startup_times.append(("gui", time.time() - start))
+
+            self._detection_engine.set_frame_size(width, height)
+
+            # Targets are drawn into the feed or onto the canvas for the
+            # whole run, changing the preference takes effect after a restart
+            if self._preferences[configurator.COMPOSITE_OVERLAY]:
+                self._overlay_renderer = OverlayRenderer(width, height)
+
             self._protocol_operations = ProtocolOperations(self._webcam_canvas, self)
 
-            fps = self._cv.get(cv2.cv.CV_CAP_PROP_FPS)
+            # Shots in a session recording are hit tested against the
+            # targets that were on the feed when it was recorded
+            replay_targets = self.get_replay_targets(0)
+            if replay_targets is not None:
+                self.replace_targets(replay_targets)
+
+            fps = self._capture_source.get_fps()
             if fps <= 0:
                 self.logger.info("Couldn't get webcam FPS, defaulting to 30.")
             else:
-                FEED_FPS = fps
+                self._display_scheduler.set_camera_fps(fps)
                 self.logger.info("Feed FPS set to %d.", fps)
 
             # Webcam related threads will end when this is true
             self._shutdown = False
 
+        elif replay:
+            tkMessageBox.showerror("Couldn't Open Replay", "Frames could not be " +
+                "read from " + replay + ". ShootOFF will shut down.")
+            self.logger.critical("Frames could not be read from %s.", replay)
+            self._shutdown = True
         else:
             tkMessageBox.showerror("Couldn't Connect to Webcam", "Video capturing " +
                 "could not be initialized either because there is no webcam or " +
@@ -682,16 +1234,42 @@ class MainWindow:
             self._shutdown = True
 
     def main(self):
+        if self._shutdown:
+            return
+
+        # Everything that happens in the session is logged from here on
+        try:
+            self._session_log = SessionLog(self.logger)
+        except (IOError, OSError) as e:
+            self.logger.warning("Couldn't start the session log: %s", e)
+
+        if self._preferences[configurator.RECORD]:
+            try:
+                self._recorder = SessionRecorder(self.logger)
+                self.record_targets()
+            except (IOError, OSError) as e:
+                self.logger.warning("Couldn't start recording: %s", e)
+
+        #Start reading frames from the webcam
+        self._capture.start()
+
         #Start the refresh loop that shows the webcam feed
         self._refresh_thread = Thread(target=self.refresh_frame, name="refresh_thread")
         self._refresh_thread.start()
 
         #Start the shot detection loop
-        self._shot_detection_thread = Thread(target=self.detect_shots, name="shot_detection_thread")
-        self._shot_detection_thread.start()
-        if not self._shutdown:
-            Tkinter.mainloop()
-            self._window.destroy()
+        if self._preferences[configurator.DETECTION_MODE] == configurator.FRAME_DETECTION:
+            self._shot_detection_thread = Thread(target=self.detect_shots_per_frame,
+                name="shot_detection_thread")
+            self._shot_detection_thread.daemon = True
+            self._shot_detection_thread.start()
+            self._window.after(SHOT_QUEUE_RATE, self.process_detected_shots)
+        else:
+            self._shot_detection_thread = Thread(target=self.detect_shots, name="shot_detection_thread")
+            self._shot_detection_thread.start()
+
+        Tkinter.mainloop()
+        self._window.destroy()
 
 if __name__ == "__main__":
     # Start the main window
@@ -8,7 +8,8 @@ class Shot:
     # Use the default color and radius for the
     # shot marker. Create a new shoot at coord
     # (a tuple representing the coordinate of 
-    # laser on the webcam feed). The timestamp
+    # laser on the webcam feed, which may be a
+    # fraction of a pixel). The timestamp
     # is the shot timer's time stamp when the
     # shot was detected.
     def __init__(self, coord, canvas, marker_radius=2, marker_color="green2", timestamp=0):
@@ -40,6 +41,9 @@ class Shot:
     def get_timestamp(self):
         return self._timestamp
 
+    def get_canvas_id(self):
+        return self._canvas_id
+
     def draw_marker(self):
         x = self._coord[0]
         y = self._coord[1]
@@ -0,0 +1,228 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import math
+
+# The statistics of a group of shots, kept up to date as each shot is added
+# so that reading them never means looking at every shot again:
+#
+# - the mean point of impact and the standard deviation of x and y use
+#   Welford's running mean and variance
+# - the extreme spread (the group size, the distance between the two shots
+#   furthest apart) is the diameter of the convex hull of the shots. Only
+#   the hull is kept, and it only changes when a shot lands outside of it,
+#   which gets rarer the more shots there are.
+# - split times are the times between consecutive shots
+#
+# Coordinates are in feed pixels and times in seconds.
+class GroupStats():
+    def add(self, x, y, timestamp):
+        self._count += 1
+
+        delta_x = x - self._mean_x
+        self._mean_x += delta_x / self._count
+        self._m2_x += delta_x * (x - self._mean_x)
+
+        delta_y = y - self._mean_y
+        self._mean_y += delta_y / self._count
+        self._m2_y += delta_y * (y - self._mean_y)
+
+        if self._count == 1:
+            self._bbox = (x, y, x, y)
+        else:
+            self._bbox = (min(self._bbox[0], x), min(self._bbox[1], y),
+                max(self._bbox[2], x), max(self._bbox[3], y))
+
+        if self._last_timestamp is not None:
+            split = timestamp - self._last_timestamp
+            self._split_count += 1
+            self._split_total += split
+            self._last_split = split
+
+            if self._min_split is None or split < self._min_split:
+                self._min_split = split
+            if self._max_split is None or split > self._max_split:
+                self._max_split = split
+
+        self._last_timestamp = timestamp
+
+        if not _is_inside(self._hull, (x, y)):
+            self._hull = _convex_hull(self._hull + [(x, y)])
+            self._extreme_spread = _diameter(self._hull)
+
+    def get_count(self):
+        return self._count
+
+    # Returns the (x, y) mean point of impact or None if there are no shots
+    def get_mean_poi(self):
+        if self._count == 0:
+            return None
+
+        return (self._mean_x, self._mean_y)
+
+    # Returns the sample standard deviation of x and y as (x, y) or None if
+    # there are less than two shots
+    def get_std_dev(self):
+        if self._count < 2:
+            return None
+
+        return (math.sqrt(self._m2_x / (self._count - 1)),
+            math.sqrt(self._m2_y / (self._count - 1)))
+
+    # Returns the radial standard deviation (how far shots typically are
+    # from the mean point of impact) or None if there are less than two
+    # shots
+    def get_radial_std_dev(self):
+        if self._count < 2:
+            return None
+
+        return math.sqrt((self._m2_x + self._m2_y) / (self._count - 1))
+
+    def get_extreme_spread(self):
+        return self._extreme_spread
+
+    # Returns the (x1, y1, x2, y2) box around the shots or None if there
+    # are no shots
+    def get_bbox(self):
+        return self._bbox
+
+    # Returns the corners of the convex hull around the shots in counter
+    # clockwise order
+    def get_hull(self):
+        return list(self._hull)
+
+    # Returns the time between the last two shots or None if there are
+    # less than two shots
+    def get_last_split(self):
+        return self._last_split
+
+    # Returns the (min, mean, max) time between consecutive shots or None
+    # if there are less than two shots
+    def get_splits(self):
+        if self._split_count == 0:
+            return None
+
+        return (self._min_split, self._split_total / self._split_count,
+            self._max_split)
+
+    def __init__(self):
+        self._count = 0
+        self._mean_x = 0.0
+        self._m2_x = 0.0
+        self._mean_y = 0.0
+        self._m2_y = 0.0
+        self._bbox = None
+        self._hull = []
+        self._extreme_spread = 0.0
+        self._last_timestamp = None
+        self._last_split = None
+        self._split_count = 0
+        self._split_total = 0.0
+        self._min_split = None
+        self._max_split = None
+
+# Keeps GroupStats for every shot, for each shooter (laser color), for each
+# target, and for each shooter on each target. A shot that missed is only
+# in the groups that aren't for a target. Colors are grouped the same way
+# the shot list shows them, so a detected "green2" shot and a clicked
+# "green" one are the same shooter.
+class ShotGroupStatistics():
+    def add_shot(self, color, target, x, y, timestamp):
+        color = _get_shooter(color)
+        keys = [(None, None), (color, None)]
+
+        if target is not None:
+            keys.append((None, target))
+            keys.append((color, target))
+
+        for key in keys:
+            if key not in self._groups:
+                self._groups[key] = GroupStats()
+
+            self._groups[key].add(x, y, timestamp)
+
+    # Returns the GroupStats for the shots with color that hit target,
+    # either can be None to include every shot (e.g. get_group("red")
+    # for every red shot). A group without shots is empty.
+    def get_group(self, color=None, target=None):
+        if color is not None:
+            color = _get_shooter(color)
+
+        return self._groups.get((color, target), self._empty_group)
+
+    # Returns the colors that have shot
+    def get_colors(self):
+        return [color for (color, target) in self._groups
+            if color is not None and target is None]
+
+    # Returns the targets that have been hit
+    def get_targets(self):
+        return [target for (color, target) in self._groups
+            if color is None and target is not None]
+
+    def clear(self):
+        self._groups = {}
+
+    def __init__(self):
+        self._groups = {}
+        self._empty_group = GroupStats()
+
+# Returns the name of the shooter with laser color (e.g. "green" for
+# "green2")
+def _get_shooter(color):
+    if "green" in color:
+        return "green"
+
+    if "red" in color:
+        return "red"
+
+    return color
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+# Returns True if point is inside or on the edge of hull (counter
+# clockwise). A hull with less than three corners has no inside.
+def _is_inside(hull, point):
+    if len(hull) < 3:
+        return point in hull
+
+    for i in range(len(hull)):
+        if _cross(hull[i], hull[(i + 1) % len(hull)], point) < 0:
+            return False
+
+    return True
+
+# Andrew's monotone chain, returns the hull counter clockwise
+def _convex_hull(points):
+    points = sorted(set(points))
+
+    if len(points) < 3:
+        return points
+
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+
+    return lower[:-1] + upper[:-1]
+
+# The largest distance between any two corners of the hull. Hulls of shot
+# groups only have a handful of corners, so every pair is checked.
+def _diameter(hull):
+    diameter = 0.0
+
+    for i in range(len(hull)):
+        for j in range(i + 1, len(hull)):
+            diameter = max(diameter, math.hypot(hull[i][0] - hull[j][0],
+                hull[i][1] - hull[j][1]))
+
+    return diameter
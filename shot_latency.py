@@ -0,0 +1,121 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import numpy
+import os
+import time
+
+# The stages a shot goes through after the frame it is in was captured, in
+# the order they happen. Each shot is marked with the time it got through
+# each stage (see ShotEvent.mark).
+LATENCY_DETECT = "detect" # shot detection started on the frame
+LATENCY_THRESHOLD = "threshold"
+LATENCY_BLOB = "blob"
+LATENCY_COLOR = "color"
+LATENCY_HIT_TEST = "hit_test"
+LATENCY_MARKER = "marker" # the shot marker was drawn
+LATENCY_PROCESS_HIT = "process_hit" # region commands are about to run
+LATENCY_PROTOCOL = "protocol" # the training protocol's listeners returned
+LATENCY_STAGES = (LATENCY_DETECT, LATENCY_THRESHOLD, LATENCY_BLOB,
+    LATENCY_COLOR, LATENCY_HIT_TEST, LATENCY_MARKER, LATENCY_PROCESS_HIT,
+    LATENCY_PROTOCOL)
+
+PERCENTILES = (50, 95, 99)
+
+# The upper edges of the histogram buckets in ms, the last bucket has
+# everything slower
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+LATENCY_DIR = "latency"
+
+# Keeps how long it took each shot of a session to get through each stage,
+# measured from when the frame it was found in was captured, so that the
+# latency percentiles and histogram of every stage can be shown and saved.
+class ShotLatency():
+    # Records the marks of a handled shot. Shots that weren't found in a
+    # frame (e.g. clicked in debug mode) are ignored.
+    def record(self, shot_event):
+        if shot_event.get_sequence() is None:
+            return
+
+        captured = shot_event.get_timestamp()
+        marks = shot_event.get_marks()
+
+        for stage in LATENCY_STAGES:
+            if stage in marks:
+                self._latencies[stage].append(marks[stage] - captured)
+
+        self._shot_count += 1
+
+    def get_shot_count(self):
+        return self._shot_count
+
+    # Returns a list with a (stage, count, p50, p95, p99, max) tuple for
+    # each stage that has been recorded, with the times in seconds
+    def get_summary(self):
+        summary = []
+
+        for stage in LATENCY_STAGES:
+            latencies = self._latencies[stage]
+
+            if len(latencies) == 0:
+                continue
+
+            percentiles = numpy.percentile(latencies, PERCENTILES)
+            summary.append((stage, len(latencies)) + tuple(percentiles) +
+                (max(latencies),))
+
+        return summary
+
+    # Returns the (p50, p95, p99) time in seconds for shots to get through
+    # stage, or None if no shot has
+    def get_percentiles(self, stage):
+        if len(self._latencies[stage]) == 0:
+            return None
+
+        return tuple(numpy.percentile(self._latencies[stage], PERCENTILES))
+
+    # Returns the number of shots in each of HISTOGRAM_BUCKETS for stage,
+    # plus one more for the shots slower than the last bucket
+    def get_histogram(self, stage):
+        edges = [0] + [bucket / 1000.0 for bucket in HISTOGRAM_BUCKETS] + [
+            float("inf")]
+        (counts, edges) = numpy.histogram(self._latencies[stage], edges)
+
+        return counts.tolist()
+
+    # Writes the session's latencies to a JSON file in directory named after
+    # when the session started and returns its path, or None if no shots
+    # were recorded
+    def write(self, directory=LATENCY_DIR):
+        if self._shot_count == 0:
+            return None
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        stages = {}
+        for (stage, count, p50, p95, p99, slowest) in self.get_summary():
+            stages[stage] = {"count": count, "p50_ms": p50 * 1000,
+                "p95_ms": p95 * 1000, "p99_ms": p99 * 1000,
+                "max_ms": slowest * 1000,
+                "histogram": self.get_histogram(stage)}
+
+        path = os.path.join(directory, "latency-%s.json" %
+            time.strftime("%Y%m%d-%H%M%S", time.localtime(self._start_time)))
+
+        latency_file = open(path, "w")
+        json.dump({"started": self._start_time, "shots": self._shot_count,
+            "stage_order": LATENCY_STAGES,
+            "histogram_buckets_ms": HISTOGRAM_BUCKETS, "stages": stages},
+            latency_file, indent=2, sort_keys=True)
+        latency_file.close()
+
+        return path
+
+    def __init__(self):
+        self._start_time = time.time()
+        self._shot_count = 0
+        self._latencies = dict([(stage, []) for stage in LATENCY_STAGES])
@@ -0,0 +1,248 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import ttk
+
+REFRESH_DELAY = 33 # ms, about once per feed frame
+DEFAULT_ROW_HEIGHT = 20 # px
+WHEEL_ROWS = 3
+
+# The values shown in the shot list, kept as one list per column. A row is a
+# shot and only has values for its first few columns until a training
+# protocol appends the rest (see append_values).
+class ShotListStore():
+    def add_columns(self, names):
+        for name in names:
+            self._columns.append(name)
+            self._values.append([None] * self._row_count)
+
+    # Removes every column after the first count
+    def truncate_columns(self, count):
+        del self._columns[count:]
+        del self._values[count:]
+        self._lengths = [min(length, count) for length in self._lengths]
+
+    # Adds a row with values for its first columns and returns the row's
+    # index
+    def append_row(self, values):
+        for (i, column) in enumerate(self._values):
+            if i < len(values):
+                column.append(values[i])
+            else:
+                column.append(None)
+
+        self._lengths.append(min(len(values), len(self._columns)))
+        self._row_count += 1
+
+        return self._row_count - 1
+
+    # Fills in the next columns of row that don't have a value yet. Values
+    # for columns that don't exist are dropped.
+    def append_values(self, row, values):
+        start = self._lengths[row]
+        values = values[:len(self._columns) - start]
+
+        for (i, value) in enumerate(values):
+            self._values[start + i][row] = value
+
+        self._lengths[row] = start + len(values)
+
+    # Returns the tuple of values row has
+    def get_row(self, row):
+        return tuple([column[row] for column in
+            self._values[:self._lengths[row]]])
+
+    def get_columns(self):
+        return tuple(self._columns)
+
+    def get_row_count(self):
+        return self._row_count
+
+    def clear(self):
+        self._values = [[] for column in self._columns]
+        self._lengths = []
+        self._row_count = 0
+
+    def __init__(self, columns=()):
+        self._columns = []
+        self._values = []
+        self._lengths = []
+        self._row_count = 0
+        self.add_columns(columns)
+
+# Shows a ShotListStore in a ttk.Treeview without giving the tree an item
+# per shot, which makes inserting and clearing slow once there are a few
+# thousand shots. The tree only has an item for each row that fits in it,
+# and scrolling (with scrollbar, which has to be passed in instead of being
+# hooked up to the tree's yview) changes which rows those items show.
+# Changes are drawn at most once every REFRESH_DELAY ms, however many shots
+# came in.
+#
+# Rows are identified by their index in the store, which is what the
+# training protocols get as the shot list item. selectfunc is called with
+# the index of a row when it is selected.
+class VirtualShotList():
+    def add_columns(self, names):
+        self._store.add_columns(names)
+        self._tree.configure(columns=self._store.get_columns())
+        self._schedule_refresh()
+
+    # Removes every column after the first count
+    def revert_columns(self, count):
+        self._store.truncate_columns(count)
+        self._tree.configure(columns=self._store.get_columns())
+        self._schedule_refresh()
+
+    def configure_column(self, name, width):
+        self._tree.heading(name, text=name)
+        self._tree.column(name, width=width, stretch=False)
+
+    def resize(self):
+        self._tree.configure(displaycolumns="#all")
+
+    # Adds a row, scrolls to it, and returns its index
+    def append(self, values):
+        row = self._store.append_row(values)
+        self._following = True
+        self._schedule_refresh()
+
+        return row
+
+    # Fills in the next columns of row (see ShotListStore.append_values)
+    def append_values(self, row, values):
+        self._store.append_values(row, values)
+
+        if self._first <= row < self._first + len(self._items):
+            self._schedule_refresh()
+
+    # Returns a dictionary with the values row has for the columns after
+    # the first start
+    def get_column_values(self, row, start=0):
+        return dict(zip(self._store.get_columns()[start:],
+            self._store.get_row(row)[start:]))
+
+    def get_store(self):
+        return self._store
+
+    def clear(self):
+        self._store.clear()
+        self._first = 0
+        self._following = True
+        self._selected_row = None
+        self._schedule_refresh()
+
+    # The scrollbar's command
+    def scroll(self, *args):
+        if args[0] == "moveto":
+            first = int(round(float(args[1]) * self._store.get_row_count()))
+        elif args[2] == "pages":
+            first = self._first + int(args[1]) * self._visible_rows
+        else:
+            first = self._first + int(args[1])
+
+        self._scroll_to(first)
+
+    def _scroll_to(self, first):
+        last_first = max(0, self._store.get_row_count() - self._visible_rows)
+        self._first = max(0, min(first, last_first))
+        self._following = self._first == last_first
+        self._schedule_refresh()
+
+    def _wheel_scrolled(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._scroll_to(self._first - WHEEL_ROWS)
+        else:
+            self._scroll_to(self._first + WHEEL_ROWS)
+
+        return "break"
+
+    def _resized(self, event):
+        row_height = DEFAULT_ROW_HEIGHT
+        try:
+            row_height = int(ttk.Style().lookup("Treeview", "rowheight"))
+        except ValueError:
+            pass
+
+        # Leave room for the headings
+        visible_rows = max(1, event.height / row_height - 1)
+
+        if visible_rows != self._visible_rows:
+            self._visible_rows = visible_rows
+            self._scroll_to(self._first)
+
+    def _selected(self, event):
+        selection = self._tree.selection()
+
+        if len(selection) == 0 or selection[0] not in self._items:
+            return
+
+        row = self._first + self._items.index(selection[0])
+
+        # Selection is also set when the rows are redrawn
+        if row == self._selected_row:
+            return
+
+        self._selected_row = row
+        self._select_func(row)
+
+    def _schedule_refresh(self):
+        if self._refresh_pending:
+            return
+
+        self._refresh_pending = True
+        self._tree.after(REFRESH_DELAY, self._refresh)
+
+    def _refresh(self):
+        self._refresh_pending = False
+        row_count = self._store.get_row_count()
+
+        if self._following:
+            self._first = max(0, row_count - self._visible_rows)
+
+        shown_rows = min(self._visible_rows, row_count - self._first)
+
+        while len(self._items) < shown_rows:
+            self._items.append(self._tree.insert("", "end"))
+
+        while len(self._items) > shown_rows:
+            self._tree.delete(self._items.pop())
+
+        for (i, item) in enumerate(self._items):
+            self._tree.item(item, values=self._store.get_row(self._first + i))
+
+        # The selected shot stays selected when it is scrolled away from
+        if (self._selected_row is not None and
+            self._first <= self._selected_row < self._first + shown_rows):
+
+            self._tree.selection_set(self._items[self._selected_row -
+                self._first])
+        elif len(self._tree.selection()) > 0:
+            self._tree.selection_remove(self._tree.selection())
+
+        if row_count == 0:
+            self._scrollbar.set(0, 1)
+        else:
+            self._scrollbar.set(float(self._first) / row_count,
+                float(self._first + shown_rows) / row_count)
+
+    def __init__(self, tree, scrollbar, selectfunc, columns=()):
+        self._tree = tree
+        self._scrollbar = scrollbar
+        self._select_func = selectfunc
+        self._store = ShotListStore()
+        self._items = []
+        self._first = 0
+        self._visible_rows = int(tree.cget("height"))
+        self._following = True
+        self._selected_row = None
+        self._refresh_pending = False
+
+        scrollbar.configure(command=self.scroll)
+        tree.bind("<<TreeviewSelect>>", self._selected)
+        tree.bind("<Configure>", self._resized)
+        tree.bind("<MouseWheel>", self._wheel_scrolled)
+        tree.bind("<Button-4>", self._wheel_scrolled)
+        tree.bind("<Button-5>", self._wheel_scrolled)
+
+        self.add_columns(columns)
@@ -0,0 +1,279 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import numpy
+
+INITIAL_CAPACITY = 256
+
+# Region and target ids for a miss
+NO_REGION = -1
+NO_TARGET = -1
+
+SELECTED_MARKER_COLOR = "gold"
+
+# Keeps a session's shots as columns of numpy arrays (x, y, timestamp, marker
+# color, the canvas ids of the region hit and of the shot's marker, and the
+# target hit) so that they can be looked at with vectorized numpy calls
+# instead of a loop over Shot objects. Colors and targets are stored as
+# small integer codes, see get_color_code and get_target_code.
+#
+# Indexing the store (or appending to it) returns a StoredShot, which works
+# like a Shot for training protocols but keeps nothing of its own.
+#
+# The arrays returned by get_x, get_y, etc. are views of the columns. They
+# are only good until the next shot is appended (the columns may have to be
+# moved to grow) or the store is cleared, so take a copy to keep them.
+class ShotStore():
+    # Adds a shot and returns its StoredShot. region is the canvas id of the
+    # target region that was hit and target the name of the target it
+    # belongs to (both are None for a miss). The store's marker radius is
+    # used if marker_radius is None.
+    def append(self, coords, color, timestamp, region=None, target=None,
+        marker_radius=None):
+
+        if self._count == len(self._x):
+            self._grow(len(self._x) * 2)
+
+        index = self._count
+        self._x[index] = coords[0]
+        self._y[index] = coords[1]
+        self._timestamps[index] = timestamp
+        self._colors[index] = self.get_color_code(color)
+        self._canvas_ids[index] = 0
+        self._selected[index] = False
+
+        if marker_radius is None:
+            self._radii[index] = self._marker_radius
+        else:
+            self._radii[index] = marker_radius
+
+        if region is None:
+            self._regions[index] = NO_REGION
+        else:
+            self._regions[index] = region
+
+        if target is None:
+            self._targets[index] = NO_TARGET
+        else:
+            self._targets[index] = self.get_target_code(target)
+
+        self._count += 1
+
+        return StoredShot(self, index)
+
+    # Doubling the capacity keeps appends amortized O(1)
+    def _grow(self, capacity):
+        for name in ("_x", "_y", "_timestamps", "_colors", "_radii",
+            "_regions", "_targets", "_canvas_ids", "_selected"):
+
+            old_column = getattr(self, name)
+            column = numpy.zeros(capacity, old_column.dtype)
+            column[:self._count] = old_column[:self._count]
+            setattr(self, name, column)
+
+    def get_x(self):
+        return self._x[:self._count]
+
+    def get_y(self):
+        return self._y[:self._count]
+
+    # Returns an (n, 2) array with every shot's (x, y)
+    def get_coords(self):
+        return numpy.column_stack((self.get_x(), self.get_y()))
+
+    def get_timestamps(self):
+        return self._timestamps[:self._count]
+
+    # Returns every shot's marker color code
+    def get_colors(self):
+        return self._colors[:self._count]
+
+    # Returns the canvas id of the region every shot hit (NO_REGION for a
+    # miss)
+    def get_regions(self):
+        return self._regions[:self._count]
+
+    # Returns the code of the target every shot hit (NO_TARGET for a miss)
+    def get_targets(self):
+        return self._targets[:self._count]
+
+    def get_canvas_ids(self):
+        return self._canvas_ids[:self._count]
+
+    # Returns a boolean array that is True for the shots that hit a target
+    def get_hits(self):
+        return self.get_regions() != NO_REGION
+
+    # Returns the indices of the shots with color (a color name) that hit
+    # target (a target name), either can be None to match every shot
+    def find(self, color=None, target=None):
+        matches = numpy.ones(self._count, numpy.bool_)
+
+        if color is not None:
+            if color not in self._color_codes:
+                return numpy.zeros(0, numpy.intp)
+            matches &= self.get_colors() == self._color_codes[color]
+
+        if target is not None:
+            if target not in self._target_codes:
+                return numpy.zeros(0, numpy.intp)
+            matches &= self.get_targets() == self._target_codes[target]
+
+        return numpy.flatnonzero(matches)
+
+    # Returns the code for a color name, giving it one if it doesn't have
+    # one yet. Codes are kept when the store is cleared.
+    def get_color_code(self, color):
+        if color not in self._color_codes:
+            self._color_codes[color] = len(self._color_names)
+            self._color_names.append(color)
+
+        return self._color_codes[color]
+
+    def get_color_name(self, code):
+        return self._color_names[code]
+
+    # Returns the code for a target name (e.g. "_internal_name:target0"),
+    # giving it one if it doesn't have one yet
+    def get_target_code(self, target):
+        if target not in self._target_codes:
+            self._target_codes[target] = len(self._target_names)
+            self._target_names.append(target)
+
+        return self._target_codes[target]
+
+    # Returns the name of the target with code, or None for NO_TARGET
+    def get_target_name(self, code):
+        if code == NO_TARGET:
+            return None
+
+        return self._target_names[code]
+
+    def clear(self):
+        self._count = 0
+
+    def get_canvas(self):
+        return self._canvas
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+
+        if index < 0 or index >= self._count:
+            raise IndexError("shot index out of range")
+
+        return StoredShot(self, index)
+
+    def __iter__(self):
+        for index in xrange(self._count):
+            yield StoredShot(self, index)
+
+    def __init__(self, canvas, marker_radius=2, capacity=INITIAL_CAPACITY):
+        self._canvas = canvas
+        self._marker_radius = marker_radius
+        self._count = 0
+        self._color_codes = {}
+        self._color_names = []
+        self._target_codes = {}
+        self._target_names = []
+
+        self._x = numpy.zeros(capacity, numpy.float64)
+        self._y = numpy.zeros(capacity, numpy.float64)
+        self._timestamps = numpy.zeros(capacity, numpy.float64)
+        self._colors = numpy.zeros(capacity, numpy.uint8)
+        self._radii = numpy.zeros(capacity, numpy.float32)
+        self._regions = numpy.zeros(capacity, numpy.int64)
+        self._targets = numpy.zeros(capacity, numpy.int32)
+        self._canvas_ids = numpy.zeros(capacity, numpy.int64)
+        self._selected = numpy.zeros(capacity, numpy.bool_)
+
+# One shot in a ShotStore with the same methods as a Shot, so training
+# protocols can't tell the difference. It is only an index into the store,
+# so it is cheap to make one for any shot whenever it is needed.
+class StoredShot(object):
+    __slots__ = ("_store", "_index")
+
+    def set_marker_color(self, marker_color):
+        store = self._store
+        store._colors[self._index] = store.get_color_code(marker_color)
+        store.get_canvas().itemconfig(self.get_canvas_id(), fill=marker_color)
+
+    def set_marker_radius(self, marker_radius):
+        self._store._radii[self._index] = marker_radius
+
+        # Redraw the marker with the new radius
+        self._store.get_canvas().delete(self.get_canvas_id())
+        self.draw_marker()
+
+    def get_color(self):
+        return self._store.get_color_name(self._store._colors[self._index])
+
+    def get_coords(self):
+        return (float(self._store._x[self._index]),
+            float(self._store._y[self._index]))
+
+    def get_timestamp(self):
+        return float(self._store._timestamps[self._index])
+
+    def get_canvas_id(self):
+        canvas_id = int(self._store._canvas_ids[self._index])
+
+        if canvas_id == 0:
+            return None
+
+        return canvas_id
+
+    # Returns the canvas id of the region the shot hit or None for a miss
+    def get_region(self):
+        region = int(self._store._regions[self._index])
+
+        if region == NO_REGION:
+            return None
+
+        return region
+
+    # Returns the name of the target the shot hit or None for a miss
+    def get_target(self):
+        return self._store.get_target_name(
+            int(self._store._targets[self._index]))
+
+    def get_index(self):
+        return self._index
+
+    def draw_marker(self):
+        (x, y) = self.get_coords()
+        radius = float(self._store._radii[self._index])
+        color = self.get_color()
+
+        self._store._canvas_ids[self._index] = (
+            self._store.get_canvas().create_oval(x - radius, y - radius,
+            x + radius, y + radius, fill=color, outline=color,
+            tags=("shot_marker")))
+
+    def toggle_selected(self):
+        selected = not self._store._selected[self._index]
+        self._store._selected[self._index] = selected
+
+        if selected:
+            self._store.get_canvas().itemconfig(self.get_canvas_id(),
+                fill=SELECTED_MARKER_COLOR, outline=SELECTED_MARKER_COLOR)
+            self._store.get_canvas().tag_raise(self.get_canvas_id())
+        else:
+            color = self.get_color()
+            self._store.get_canvas().itemconfig(self.get_canvas_id(),
+                fill=color, outline=color)
+
+    def __eq__(self, other):
+        return (isinstance(other, StoredShot) and
+            self._store is other._store and self._index == other._index)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
@@ -0,0 +1,168 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from collections import OrderedDict
+import hashlib
+import os
+from region_raster import get_bbox, get_region_shape, rasterize
+from tag_parser import TagParser
+import threading
+
+TARGET_CACHE_ENTRIES = 64
+TARGET_CACHE_BYTES = 64 * 1024 * 1024
+DEFAULT_INTERNAL_NAME = "_internal_name:target"
+
+# Everything about a target file that can be worked out without a canvas:
+# each region's coordinates, fill, tags (raw and parsed), and commands, the
+# bounding box of the target, and its regions rasterized with the labels 1
+# to n (in the order of get_regions).
+class CompiledTarget():
+    # Returns a list of dictionaries, one per region from the bottom most
+    # to the top most, with the keys "coords", "fill", "tags" (the raw tags
+    # without an internal name), "parsed_tags", "commands", "shape" (how
+    # the region is drawn on a canvas), and "hit_shape" (how the region is
+    # hit tested, see region_raster.get_region_shape)
+    def get_regions(self):
+        return self._regions
+
+    def get_bbox(self):
+        return self._bbox
+
+    # Returns (patch, origin), see region_raster.rasterize
+    def get_mask(self):
+        return self._mask
+
+    def get_size(self):
+        return self._size
+
+    def __init__(self, region_object):
+        self._regions = []
+        self._bbox = None
+        self._mask = None
+        self._size = 0
+
+        for region in region_object:
+            # Get rid of the default internal name otherwise every target
+            # will have it and selection won't work
+            raw_tags = tuple([value for value in region["tags"]
+                if value != DEFAULT_INTERNAL_NAME])
+            parsed_tags = TagParser.parse_tags(raw_tags)
+
+            if parsed_tags.get("_shape") not in ("rectangle", "oval",
+                "triangle", "freeform_polygon"):
+                continue
+
+            coords = list(region["coords"])
+
+            self._regions.append({"coords": coords,
+                "fill": region["fill"],
+                "tags": raw_tags,
+                "parsed_tags": parsed_tags,
+                "commands": parsed_tags.get("command", []),
+                "shape": parsed_tags["_shape"],
+                "hit_shape": get_region_shape(coords, parsed_tags)})
+
+        shapes = [(i + 1, region["hit_shape"], region["coords"])
+            for (i, region) in enumerate(self._regions)
+            if len(region["coords"]) >= 4]
+
+        if len(shapes) == len(self._regions) and len(shapes) > 0:
+            self._bbox = get_bbox([coords for (label, shape, coords) in shapes])
+            self._mask = rasterize(shapes)
+            self._size = self._mask[0].nbytes
+
+        # A rough guess at the memory used by the rest of the target
+        self._size += sum([len(region["coords"]) * 8 + 512
+            for region in self._regions])
+
+# Keeps the CompiledTargets for recently used target files so that adding
+# the same target again (e.g. the same bullseye in several lanes) doesn't
+# mean reading, unpickling, and rasterizing it again. Targets are keyed by
+# the hash of the target file's contents. The least recently used targets
+# are dropped when there are more than max_entries targets or they use more
+# than max_bytes.
+#
+# loadfunc reads a target file. It takes the file's path and returns the
+# list of region dictionaries that was saved in it.
+class TargetCache():
+    # Returns the CompiledTarget for target_file
+    def get(self, target_file):
+        key = self._hash_file(target_file)
+
+        with self._lock:
+            if key in self._targets:
+                compiled_target = self._targets.pop(key)
+                self._targets[key] = compiled_target
+                self._hits += 1
+                return compiled_target
+
+        compiled_target = CompiledTarget(self._load_func(target_file))
+
+        with self._lock:
+            self._misses += 1
+            self._add(key, compiled_target)
+
+        return compiled_target
+
+    def _add(self, key, compiled_target):
+        if key in self._targets:
+            self._size -= self._targets.pop(key).get_size()
+
+        self._targets[key] = compiled_target
+        self._size += compiled_target.get_size()
+
+        # Always keep the target that was just added, even if it is
+        # bigger than the limit by itself
+        while (len(self._targets) > 1 and
+            (len(self._targets) > self._max_entries or
+            self._size > self._max_bytes)):
+
+            (old_key, old_target) = self._targets.popitem(last=False)
+            self._size -= old_target.get_size()
+
+    # Hashing a file means reading all of it, so the hash is remembered
+    # until the file's size or modification time changes
+    def _hash_file(self, target_file):
+        path = os.path.abspath(target_file)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            if path in self._file_hashes:
+                (file_signature, content_hash) = self._file_hashes[path]
+                if file_signature == signature:
+                    return content_hash
+
+        target = open(path, 'rb')
+        content_hash = hashlib.sha1(target.read()).hexdigest()
+        target.close()
+
+        with self._lock:
+            self._file_hashes[path] = (signature, content_hash)
+
+        return content_hash
+
+    def clear(self):
+        with self._lock:
+            self._targets.clear()
+            self._file_hashes.clear()
+            self._size = 0
+
+    # Returns (hits, misses, entries, bytes)
+    def get_stats(self):
+        with self._lock:
+            return (self._hits, self._misses, len(self._targets), self._size)
+
+    def __init__(self, loadfunc, max_entries=TARGET_CACHE_ENTRIES,
+        max_bytes=TARGET_CACHE_BYTES):
+
+        self._load_func = loadfunc
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._targets = OrderedDict()
+        self._file_hashes = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
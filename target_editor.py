@@ -415,7 +415,7 @@ class TargetEditor():
 
         if target is not None:
             target_pickler = TargetPickler()
-            (region_object, self._regions) = target_pickler.load(
+            (compiled_target, self._regions) = target_pickler.load(
                 target, self._target_canvas)
 
         self._notify_new_target = notifynewfunc
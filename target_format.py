@@ -0,0 +1,209 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Reads and writes the binary target file format. A target file is:
+#
+#   header     magic, version, region count, string count, tag count,
+#              coordinate count, and the target's bounding box
+#   strings    every distinct tag and fill color once, each as a length
+#              followed by UTF-8 bytes
+#   regions    one fixed size record per region: shape, fill (a string
+#              index), and where its tags and coordinates start and how
+#              many there are
+#   tags       string indexes for the tags of every region
+#   coords     the coordinates of every region as one float64 array
+#
+# Everything is little endian. The header has everything needed to index a
+# target library (e.g. the bounding box) without reading the rest of the
+# file, and nothing in the file is executed when it is loaded, unlike the
+# pickled files ShootOFF used to save.
+
+import numpy
+import struct
+
+MAGIC = "SOFT"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHIIII4d")
+STRING_LENGTH = struct.Struct("<H")
+REGION = struct.Struct("<BIIIII")
+
+# The shape of a region is stored as a number instead of a tag
+SHAPES = ("rectangle", "oval", "triangle", "freeform_polygon")
+SHAPE_TAG = "_shape:"
+
+class TargetFormatError(Exception):
+    pass
+
+# The part of a target file that describes the whole target
+class TargetHeader():
+    def get_version(self):
+        return self._version
+
+    def get_region_count(self):
+        return self._region_count
+
+    # Returns the (x1, y1, x2, y2) box around every region, or None if the
+    # target doesn't have any regions
+    def get_bbox(self):
+        return self._bbox
+
+    def __init__(self, version, region_count, bbox):
+        self._version = version
+        self._region_count = region_count
+        self._bbox = bbox
+
+# Returns True if the file starts like a file in this format
+def is_target_file(target_file):
+    target = open(target_file, "rb")
+    magic = target.read(len(MAGIC))
+    target.close()
+
+    return magic == MAGIC
+
+# Writes region_object (a list of region dictionaries with the keys "tags",
+# "coords", and "fill", the same as the old pickled format) to target_file
+def write_target(target_file, region_object):
+    strings = []
+    string_indexes = {}
+
+    # Every string is only stored once
+    def add_string(string):
+        if isinstance(string, unicode):
+            string = string.encode("utf-8")
+
+        if string not in string_indexes:
+            string_indexes[string] = len(strings)
+            strings.append(string)
+
+        return string_indexes[string]
+
+    region_records = []
+    tag_indexes = []
+    coords = []
+
+    for region in region_object:
+        shape = None
+        region_tags = []
+
+        for tag in region["tags"]:
+            if tag.startswith(SHAPE_TAG) and shape is None:
+                shape = tag[len(SHAPE_TAG):]
+            else:
+                region_tags.append(add_string(tag))
+
+        if shape not in SHAPES:
+            raise TargetFormatError("A region has an unknown shape: %s" % shape)
+
+        region_records.append((SHAPES.index(shape), add_string(region["fill"]),
+            len(tag_indexes), len(region_tags), len(coords),
+            len(region["coords"])))
+        tag_indexes.extend(region_tags)
+        coords.extend(region["coords"])
+
+    bbox = (0, 0, 0, 0)
+    if len(coords) > 0:
+        xs = coords[::2]
+        ys = coords[1::2]
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    target = open(target_file, "wb")
+    target.write(HEADER.pack(MAGIC, VERSION, len(region_records), len(strings),
+        len(tag_indexes), len(coords), *bbox))
+
+    for string in strings:
+        target.write(STRING_LENGTH.pack(len(string)))
+        target.write(string)
+
+    for record in region_records:
+        target.write(REGION.pack(*record))
+
+    target.write(numpy.array(tag_indexes, "<u4").tostring())
+    target.write(numpy.array(coords, "<f8").tostring())
+    target.close()
+
+def _unpack_header(data):
+    if len(data) < HEADER.size:
+        raise TargetFormatError("The target file is too short")
+
+    fields = HEADER.unpack_from(data)
+
+    if fields[0] != MAGIC:
+        raise TargetFormatError("This is not a target file")
+
+    if fields[1] > VERSION:
+        raise TargetFormatError("The target file is from a newer version " +
+            "of ShootOFF (format version %d)" % fields[1])
+
+    return fields
+
+# Returns the TargetHeader of target_file without reading the regions
+def read_header(target_file):
+    target = open(target_file, "rb")
+    data = target.read(HEADER.size)
+    target.close()
+
+    fields = _unpack_header(data)
+
+    bbox = None
+    if fields[2] > 0:
+        bbox = fields[6:10]
+
+    return TargetHeader(fields[1], fields[2], bbox)
+
+# Returns the regions in target_file in the same format write_target takes
+def read_target(target_file):
+    target = open(target_file, "rb")
+    data = target.read()
+    target.close()
+
+    (magic, version, region_count, string_count, tag_count,
+        coord_count) = _unpack_header(data)[:6]
+    offset = HEADER.size
+
+    try:
+        strings = []
+        for i in range(string_count):
+            (length,) = STRING_LENGTH.unpack_from(data, offset)
+            offset += STRING_LENGTH.size
+            strings.append(data[offset:offset + length])
+            offset += length
+
+        region_records = []
+        for i in range(region_count):
+            region_records.append(REGION.unpack_from(data, offset))
+            offset += REGION.size
+
+        tag_indexes = numpy.frombuffer(data, "<u4", tag_count, offset)
+        offset += tag_indexes.nbytes
+        coords = numpy.frombuffer(data, "<f8", coord_count, offset)
+    except (struct.error, ValueError):
+        raise TargetFormatError("The target file is truncated")
+
+    # Check every index before using it, a damaged file shouldn't be able
+    # to make us read past the end of anything
+    if (len(strings) != string_count or
+        (tag_count > 0 and tag_indexes.max() >= string_count)):
+        raise TargetFormatError("The target file is damaged")
+
+    tag_strings = [strings[i] for i in tag_indexes]
+    coords = coords.tolist()
+    region_object = []
+
+    for (shape, fill, tag_start, region_tag_count, coord_start,
+        region_coord_count) in region_records:
+
+        if (shape >= len(SHAPES) or fill >= string_count or
+            tag_start + region_tag_count > tag_count or
+            coord_start + region_coord_count > coord_count):
+            raise TargetFormatError("The target file is damaged")
+
+        tags = ((SHAPE_TAG + SHAPES[shape],) +
+            tuple(tag_strings[tag_start:tag_start + region_tag_count]))
+
+        region_object.append({"tags": tags,
+            "coords": coords[coord_start:coord_start + region_coord_count],
+            "fill": strings[fill]})
+
+    return region_object
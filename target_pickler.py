@@ -2,8 +2,11 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import os
 import pickle
-from tag_parser import TagParser
+from target_cache import CompiledTarget, TargetCache
+from target_format import (is_target_file, read_target, write_target,
+    TargetFormatError)
 
 class TargetPickler():
     def save(self, target_file, region_list, canvas):
@@ -18,55 +21,68 @@ class TargetPickler():
                 "coords":region_coords,
                 "fill":region_fill})
 
-        target = open(target_file, 'wb')
-        pickle.dump(region_object, target, pickle.HIGHEST_PROTOCOL)
-        target.close()
+        write_target(target_file, region_object)
 
     # the target_name is set on every region in a target
     # and should be unique for the webcam feed so that
-    # multiple instances of a target can exist
+    # multiple instances of a target can exist. Returns
+    # the target's CompiledTarget and the canvas ids of its
+    # regions (in the same order).
     def load(self, target_file, canvas,
 		internal_target_name="_internal_name:target"):
 
-        target = open(target_file, 'rb')
-        region_object = pickle.load(target)
-        target.close()
+        compiled_target = self.compile(target_file)
 
-        regions = self._draw_target(region_object, canvas,
+        regions = self._draw_target(compiled_target, canvas,
 			internal_target_name)
                 
-        return (region_object, regions)
+        return (compiled_target, regions)
+
+    # Same as load for a target that isn't in a file (e.g. one
+    # from a session recording). region_object is a list of
+    # region dictionaries like the ones in a target file.
+    def load_regions(self, region_object, canvas,
+        internal_target_name="_internal_name:target"):
+
+        compiled_target = CompiledTarget(region_object)
+
+        regions = self._draw_target(compiled_target, canvas,
+            internal_target_name)
+
+        return (compiled_target, regions)
 
-    def _draw_target(self, region_object, canvas, internal_target_name):
+    # Returns the CompiledTarget for target_file. Targets are
+    # cached, so this is cheap for a target that was already loaded.
+    def compile(self, target_file):
+        return _target_cache.get(target_file)
+
+    @staticmethod
+    def get_cache():
+        return _target_cache
+
+    def _draw_target(self, compiled_target, canvas, internal_target_name):
         regions = []
 
-        for region in region_object:
+        for region in compiled_target.get_regions():
             shape = 0
-            raw_tags = region["tags"]
-    
-            # Get rid of the default internal name otherwise every target
-            # will have it and selection won't work
-            raw_tags = tuple([value for value in raw_tags if value != "_internal_name:target"])
-
-            raw_tags += (internal_target_name,)
-            parsed_tags = TagParser.parse_tags(raw_tags)	
+            raw_tags = region["tags"] + (internal_target_name,)
 
-            if parsed_tags["_shape"] == "rectangle":
+            if region["shape"] == "rectangle":
                 shape = canvas.create_rectangle(region["coords"],
                     fill=region["fill"], stipple="gray25",
                     tags=raw_tags)
 
-            if parsed_tags["_shape"] == "oval":
+            if region["shape"] == "oval":
                 shape = canvas.create_oval(region["coords"],
                     fill=region["fill"], stipple="gray25",
                     tags=raw_tags)
 
-            if parsed_tags["_shape"] == "triangle":
+            if region["shape"] == "triangle":
                 shape = canvas.create_polygon(region["coords"],
                     fill=region["fill"], outline="black",
                     stipple="gray25", tags=raw_tags)
 
-            if parsed_tags["_shape"] == "freeform_polygon":
+            if region["shape"] == "freeform_polygon":
                 shape = canvas.create_polygon(region["coords"],
                     fill=region["fill"], outline="black",
                     stipple="gray25", tags=raw_tags)
@@ -75,3 +91,95 @@ class TargetPickler():
                 regions.append(shape)
 
         return regions
+
+def _read_target(target_file):
+    if is_target_file(target_file):
+        return read_target(target_file)
+
+    # Targets used to be pickled. They are converted the first time they
+    # are loaded so that they never have to be unpickled again.
+    region_object = _unpickle_target(target_file)
+    _convert_target(target_file, region_object)
+
+    return region_object
+
+# Old targets are only lists of dictionaries of strings, numbers, lists,
+# and tuples, so nothing that would need a class (which is how a pickle
+# runs code) is ever unpickled
+class _TargetUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError("Targets can't contain %s.%s" %
+            (module, name))
+
+def _unpickle_target(target_file):
+    target = open(target_file, 'rb')
+
+    try:
+        region_object = _TargetUnpickler(target).load()
+    except (pickle.UnpicklingError, EOFError, ValueError, KeyError,
+        IndexError, TypeError, AttributeError) as e:
+        raise TargetFormatError("%s is not a target file: %s" %
+            (target_file, e))
+    finally:
+        target.close()
+
+    if not _is_region_object(region_object):
+        raise TargetFormatError("%s is not a target file" % target_file)
+
+    return region_object
+
+def _is_region_object(region_object):
+    if not isinstance(region_object, list):
+        return False
+
+    for region in region_object:
+        if (not isinstance(region, dict) or
+            not isinstance(region.get("tags"), (list, tuple)) or
+            not isinstance(region.get("coords"), (list, tuple)) or
+            not isinstance(region.get("fill"), basestring)):
+            return False
+
+        if not all([isinstance(tag, basestring) for tag in region["tags"]]):
+            return False
+
+        if not all([isinstance(value, (int, long, float))
+            for value in region["coords"]]):
+            return False
+
+    return True
+
+def _convert_target(target_file, region_object):
+    converted_file = target_file + ".converting"
+    backup_file = target_file + ".unconverted"
+
+    try:
+        write_target(converted_file, region_object)
+    except (IOError, OSError, TargetFormatError):
+        # The old file still loads, it just can't be converted (e.g. it
+        # is read only or has a region the new format can't hold)
+        if os.path.exists(converted_file):
+            os.remove(converted_file)
+        return
+
+    try:
+        # Windows won't rename a file over one that exists, so the old
+        # file is moved out of the way and only removed once the
+        # converted file is in its place
+        if os.name == "nt":
+            os.rename(target_file, backup_file)
+
+            try:
+                os.rename(converted_file, target_file)
+            except OSError:
+                os.rename(backup_file, target_file)
+                raise
+
+            os.remove(backup_file)
+        else:
+            os.rename(converted_file, target_file)
+    except OSError:
+        if os.path.exists(converted_file):
+            os.remove(converted_file)
+
+# Every target that is loaded goes through this cache
+_target_cache = TargetCache(_read_target)
@@ -0,0 +1,83 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import blob_detector
+from blob_detector import BLOB_X, BLOB_Y, BLOB_AREA, BLOB_PEAK
+import cv2
+import numpy
+import unittest
+
+# A black and white frame with a square spot of each (x, y, size, peak),
+# brightest in its bottom right pixel, and the frame thresholded at 100
+def make_frames(spots, shape=(60, 80)):
+    frame_bw = numpy.zeros(shape, numpy.uint8)
+
+    for (x, y, size, peak) in spots:
+        frame_bw[y:y + size, x:x + size] = 150
+        frame_bw[y + size - 1, x + size - 1] = peak
+
+    (ret, frame_thresh) = cv2.threshold(frame_bw, 100, 255, cv2.THRESH_BINARY)
+
+    return (frame_thresh, frame_bw)
+
+class BlobDetectorTest(unittest.TestCase):
+    def find_blobs_both_ways(self, frame_thresh, frame_bw):
+        finders = [blob_detector._find_contour_blobs]
+        if hasattr(cv2, "connectedComponentsWithStats"):
+            finders.append(blob_detector._find_labelled_blobs)
+
+        return [sorted(find(frame_thresh, frame_bw)) for find in finders]
+
+    def test_no_blobs(self):
+        (frame_thresh, frame_bw) = make_frames([])
+
+        self.assertEqual(blob_detector.find_blobs(frame_thresh, frame_bw), [])
+
+    def test_blob_area_and_peak(self):
+        (frame_thresh, frame_bw) = make_frames([(10, 20, 4, 250),
+            (50, 5, 3, 200)])
+
+        for blobs in self.find_blobs_both_ways(frame_thresh, frame_bw):
+            self.assertEqual(len(blobs), 2)
+            self.assertEqual((blobs[0][BLOB_AREA], blobs[0][BLOB_PEAK]),
+                (16, 250))
+            self.assertEqual((blobs[1][BLOB_AREA], blobs[1][BLOB_PEAK]),
+                (9, 200))
+
+    def test_centroid_of_an_even_spot_is_its_center(self):
+        frame_bw = numpy.zeros((40, 40), numpy.uint8)
+        frame_bw[10:14, 20:26] = 200
+        (ret, frame_thresh) = cv2.threshold(frame_bw, 100, 255,
+            cv2.THRESH_BINARY)
+
+        for blobs in self.find_blobs_both_ways(frame_thresh, frame_bw):
+            self.assertAlmostEqual(blobs[0][BLOB_X], 22.5, places=4)
+            self.assertAlmostEqual(blobs[0][BLOB_Y], 11.5, places=4)
+
+    def test_centroid_is_weighted_by_brightness(self):
+        (frame_thresh, frame_bw) = make_frames([(10, 10, 3, 255)])
+
+        for blobs in self.find_blobs_both_ways(frame_thresh, frame_bw):
+            self.assertGreater(blobs[0][BLOB_X], 11)
+            self.assertGreater(blobs[0][BLOB_Y], 11)
+            self.assertLess(blobs[0][BLOB_X], 12)
+
+    def test_finders_agree(self):
+        (frame_thresh, frame_bw) = make_frames([(5, 5, 2, 180),
+            (30, 40, 5, 240), (70, 10, 1, 255)])
+
+        results = self.find_blobs_both_ways(frame_thresh, frame_bw)
+
+        for blobs in results[1:]:
+            self.assertEqual(len(blobs), len(results[0]))
+
+            for (blob, expected) in zip(blobs, results[0]):
+                self.assertAlmostEqual(blob[BLOB_X], expected[BLOB_X],
+                    places=4)
+                self.assertAlmostEqual(blob[BLOB_Y], expected[BLOB_Y],
+                    places=4)
+                self.assertEqual(blob[BLOB_AREA:], expected[BLOB_AREA:])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+# Run from the ShootOFF directory: python -m unittest discover -s tests -t .
+
+from frame_capture import FrameRing
+import numpy
+from threading import Thread
+import time
+import unittest
+
+def make_frame(value, shape=(4, 6, 3)):
+    return numpy.ones(shape, numpy.uint8) * value
+
+class FrameRingTest(unittest.TestCase):
+    def write(self, ring, value, timestamp=0.0):
+        ring.begin_write()
+        ring.end_write(make_frame(value), timestamp)
+
+    def test_empty_ring_has_no_frames(self):
+        ring = FrameRing(4)
+
+        self.assertEqual(ring.get_latest_sequence(), -1)
+        self.assertIsNone(ring.begin_write())
+        self.assertIsNone(ring.read_latest())
+        self.assertIsNone(ring.read_next(-1))
+        self.assertIsNone(ring.read(0))
+
+    def test_read_returns_a_copy_of_the_frame(self):
+        ring = FrameRing(4)
+        self.write(ring, 7, 1.5)
+
+        (timestamp, frame) = ring.read(0)
+
+        self.assertEqual(timestamp, 1.5)
+        self.assertTrue((frame == 7).all())
+
+        # Writing into the copy doesn't change the ring
+        frame[:] = 0
+        self.assertTrue((ring.read(0)[1] == 7).all())
+
+    def test_read_into_out(self):
+        ring = FrameRing(4)
+        self.write(ring, 3)
+        out = numpy.zeros((4, 6, 3), numpy.uint8)
+
+        (timestamp, frame) = ring.read(0, out)
+
+        self.assertIs(frame, out)
+        self.assertTrue((out == 3).all())
+
+        # An out of the wrong shape is replaced
+        wrong_out = numpy.zeros((2, 2), numpy.uint8)
+        self.assertIsNot(ring.read(0, wrong_out)[1], wrong_out)
+
+    def test_begin_write_returns_the_next_slot(self):
+        ring = FrameRing(4)
+        self.write(ring, 1)
+
+        buffer = ring.begin_write()
+        buffer[:] = 2
+        ring.end_write(buffer, 0.0)
+
+        self.assertEqual(ring.get_latest_sequence(), 1)
+        self.assertTrue((ring.read(1)[1] == 2).all())
+
+    def test_lapped_frames_are_gone(self):
+        ring = FrameRing(4)
+        for value in range(6):
+            self.write(ring, value)
+
+        self.assertIsNone(ring.read(0))
+        self.assertIsNone(ring.read(1))
+        self.assertTrue((ring.read(5)[1] == 5).all())
+
+        (sequence, timestamp, frame) = ring.read_latest()
+        self.assertEqual(sequence, 5)
+        self.assertTrue((frame == 5).all())
+
+    def test_slot_being_written_is_invalid(self):
+        ring = FrameRing(4)
+        for value in range(4):
+            self.write(ring, value)
+
+        # The next frame goes in frame 0's slot
+        ring.begin_write()
+        self.assertIsNone(ring.read(0))
+
+    def test_copy_is_thrown_away_if_the_writer_laps_the_reader(self):
+        ring = FrameRing(4)
+        for value in range(4):
+            self.write(ring, value)
+
+        # Stands in for the writer getting to frame 0's slot during the copy
+        class LappingArray(numpy.ndarray):
+            def copy(self):
+                ring.begin_write()
+                return numpy.ndarray.copy(self)
+
+        ring._buffers[0] = ring._buffers[0].view(LappingArray)
+
+        self.assertIsNone(ring.read(0))
+
+    def test_read_next_skips_to_the_oldest_readable_frame(self):
+        ring = FrameRing(4)
+        for value in range(10):
+            self.write(ring, value)
+
+        # The slot after the latest frame may be mid-write
+        (sequence, timestamp, frame) = ring.read_next(0)
+        self.assertEqual(sequence, 7)
+        self.assertTrue((frame == 7).all())
+
+        self.assertEqual(ring.read_next(8)[0], 9)
+        self.assertIsNone(ring.read_next(9))
+
+    def test_size_change_reallocates(self):
+        ring = FrameRing(4)
+        self.write(ring, 1)
+
+        ring.begin_write()
+        ring.end_write(make_frame(2, (8, 8, 3)), 0.0)
+
+        self.assertEqual(ring.read(1)[1].shape, (8, 8, 3))
+        self.assertEqual(ring.begin_write().shape, (8, 8, 3))
+
+    def test_wait_for_frame_times_out(self):
+        ring = FrameRing(4)
+
+        self.assertFalse(ring.wait_for_frame(-1, .01))
+
+        self.write(ring, 1)
+        self.assertTrue(ring.wait_for_frame(-1, .01))
+        self.assertFalse(ring.wait_for_frame(0, .01))
+
+class LosslessFrameRingTest(unittest.TestCase):
+    def write_in_thread(self, ring, count):
+        def write():
+            for value in range(count):
+                ring.begin_write()
+                ring.end_write(make_frame(value), 0.0)
+
+        writer = Thread(target=write)
+        writer.daemon = True
+        writer.start()
+
+        return writer
+
+    def test_writer_waits_for_the_consumer(self):
+        ring = FrameRing(4, lossless=True)
+        writer = self.write_in_thread(ring, 10)
+
+        # Without releases the writer stops before the frame after the last
+        # released one could be overwritten
+        time.sleep(.3)
+        self.assertTrue(writer.is_alive())
+        self.assertEqual(ring.get_latest_sequence(), 2)
+
+        ring.close()
+        writer.join(1)
+
+    def test_consumer_sees_every_frame(self):
+        ring = FrameRing(4, lossless=True)
+        writer = self.write_in_thread(ring, 50)
+        last_sequence = -1
+
+        while last_sequence < 49:
+            ring.wait_for_frame(last_sequence, .1)
+            frame = ring.read_next(last_sequence)
+
+            if frame is None:
+                continue
+
+            (sequence, timestamp, pixels) = frame
+            self.assertEqual(sequence, last_sequence + 1)
+            self.assertTrue((pixels == sequence).all())
+
+            last_sequence = sequence
+            ring.release(sequence)
+
+        writer.join(1)
+        self.assertFalse(writer.is_alive())
+
+    def test_close_stops_the_writer_waiting(self):
+        ring = FrameRing(4, lossless=True)
+        writer = self.write_in_thread(ring, 10)
+
+        ring.close()
+        writer.join(1)
+
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(ring.get_latest_sequence(), 9)
+
+    def test_lossy_ring_never_waits(self):
+        ring = FrameRing(4)
+        writer = self.write_in_thread(ring, 10)
+        writer.join(1)
+
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(ring.get_latest_sequence(), 9)
+
+if __name__ == "__main__":
+    unittest.main()
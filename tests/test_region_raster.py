@@ -0,0 +1,145 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import region_raster
+from region_raster import RegionRaster, rasterize
+import unittest
+
+def rectangle(region, x1, y1, x2, y2, **tags):
+    return (region, [x1, y1, x2, y2], tags)
+
+class RegionRasterTest(unittest.TestCase):
+    def test_miss(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("a", [rectangle(1, 10, 10, 20, 20)])
+
+        self.assertEqual(raster.hit_test(50, 50), (None, None))
+        self.assertEqual(raster.hit_test(-1, 15), (None, None))
+        self.assertEqual(raster.hit_test(15, 100), (None, None))
+
+    def test_top_most_region_wins(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("a", [rectangle(1, 10, 10, 50, 50, points="5"),
+            rectangle(2, 20, 20, 30, 30, points="10")])
+
+        self.assertEqual(raster.hit_test(25, 25), (2, {"points": "10"}))
+        self.assertEqual(raster.hit_test(40, 40), (1, {"points": "5"}))
+
+    def test_top_most_target_wins(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("bottom", [rectangle(1, 10, 10, 50, 50)])
+        raster.set_target("top", [rectangle(2, 30, 30, 70, 70)])
+
+        self.assertEqual(raster.hit_test(40, 40)[0], 2)
+        self.assertEqual(raster.hit_test(20, 20)[0], 1)
+        self.assertEqual(raster.hit_test(60, 60)[0], 2)
+
+    def test_changed_target_keeps_its_place(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("bottom", [rectangle(1, 10, 10, 50, 50)])
+        raster.set_target("top", [rectangle(2, 30, 30, 70, 70)])
+
+        # Moving the bottom target still leaves it under the top one
+        raster.set_target("bottom", [rectangle(3, 20, 20, 60, 60)])
+
+        self.assertEqual(raster.hit_test(40, 40)[0], 2)
+        self.assertEqual(raster.hit_test(25, 25)[0], 3)
+        self.assertEqual(raster.hit_test(15, 15), (None, None))
+
+    def test_removed_target_uncovers_the_one_below(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("bottom", [rectangle(1, 10, 10, 50, 50)])
+        raster.set_target("top", [rectangle(2, 30, 30, 70, 70)])
+
+        raster.remove_target("top")
+
+        self.assertEqual(raster.hit_test(40, 40)[0], 1)
+        self.assertEqual(raster.hit_test(60, 60), (None, None))
+        self.assertEqual(raster.get_target_bboxes(), [(10, 10, 50, 50)])
+
+    def test_set_targets_replaces_every_target(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("a", [rectangle(1, 10, 10, 50, 50)])
+
+        raster.set_targets([("b", [rectangle(2, 60, 60, 90, 90)]),
+            ("c", [rectangle(3, 70, 70, 80, 80)])])
+
+        self.assertEqual(raster.hit_test(20, 20), (None, None))
+        self.assertEqual(raster.hit_test(65, 65)[0], 2)
+        self.assertEqual(raster.hit_test(75, 75)[0], 3)
+
+    def test_resize_draws_targets_again(self):
+        raster = RegionRaster(50, 50)
+        raster.set_target("a", [rectangle(1, 60, 60, 80, 80)])
+        self.assertEqual(raster.hit_test(70, 70), (None, None))
+
+        raster.resize(100, 100)
+
+        self.assertEqual(raster.get_size(), (100, 100))
+        self.assertEqual(raster.hit_test(70, 70)[0], 1)
+
+    def test_oval(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("a", [rectangle(1, 10, 10, 50, 50,
+            _shape="oval")])
+
+        self.assertEqual(raster.hit_test(30, 30)[0], 1)
+        self.assertEqual(raster.hit_test(12, 12), (None, None))
+
+    def test_polygon(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("a", [(1, [10, 10, 50, 10, 10, 50], {})])
+
+        self.assertEqual(raster.hit_test(15, 15)[0], 1)
+        self.assertEqual(raster.hit_test(45, 45), (None, None))
+
+    def test_mask_matches_drawing_the_regions(self):
+        regions = [rectangle(1, 10, 10, 50, 50), rectangle(2, 20, 20, 30, 30)]
+        mask = rasterize([(i + 1, "rectangle", coords)
+            for (i, (region, coords, tags)) in enumerate(regions)])
+
+        drawn = RegionRaster(100, 100)
+        drawn.set_target("a", regions)
+        masked = RegionRaster(100, 100)
+        masked.set_target("a", regions, mask)
+
+        for (x, y) in ((5, 5), (15, 15), (25, 25), (45, 45), (55, 55)):
+            self.assertEqual(masked.hit_test(x, y), drawn.hit_test(x, y))
+
+    def test_labels_are_reused(self):
+        raster = RegionRaster(100, 100)
+
+        for i in range(10):
+            raster.set_target("a", [rectangle(i, 10, 10, 20, 20)])
+
+        self.assertEqual(raster._next_label, 2)
+        self.assertEqual(raster.hit_test(15, 15)[0], 9)
+
+class RegionRasterLabelsTest(unittest.TestCase):
+    def setUp(self):
+        self._max_labels = region_raster.MAX_LABELS
+        region_raster.MAX_LABELS = 3
+
+    def tearDown(self):
+        region_raster.MAX_LABELS = self._max_labels
+
+    def test_too_many_regions_leaves_the_target_as_it_was(self):
+        raster = RegionRaster(100, 100)
+        raster.set_target("a", [rectangle(1, 10, 10, 50, 50),
+            rectangle(2, 20, 20, 30, 30)])
+
+        self.assertRaises(ValueError, raster.set_target, "a",
+            [rectangle(i, 10, 10, 50, 50) for i in range(4)])
+
+        self.assertEqual(raster.hit_test(25, 25)[0], 2)
+        self.assertEqual(raster.hit_test(40, 40)[0], 1)
+
+        # The old target's labels weren't given to anything else
+        raster.set_target("b", [rectangle(3, 60, 60, 70, 70)])
+        self.assertRaises(ValueError, raster.set_target, "c",
+            [rectangle(4, 80, 80, 90, 90)])
+        self.assertEqual(raster.hit_test(25, 25)[0], 2)
+
+if __name__ == "__main__":
+    unittest.main()
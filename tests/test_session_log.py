@@ -0,0 +1,105 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import logging
+import os
+import session_log
+from session_log import SessionLog, read_session_log
+import shutil
+import tempfile
+import time
+import unittest
+
+logger = logging.getLogger("test_session_log")
+logger.addHandler(logging.NullHandler())
+
+class SessionLogTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def test_session_record_comes_first(self):
+        log = SessionLog(logger, self._directory)
+        log.close()
+
+        records = read_session_log(log.get_path())
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["type"], session_log.SESSION_RECORD)
+        self.assertEqual(records[0]["version"], session_log.SESSION_LOG_VERSION)
+
+    def test_records_are_written_in_order(self):
+        log = SessionLog(logger, self._directory)
+        log.log_shot(0, 10.0, 9.9, (1, 2), "red", {"points": "5"},
+            {"Score": 5})
+        log.log_shot(1, 11.0, 10.9, (3, 4), "green", None, {})
+        log.log(session_log.CLEAR_RECORD, {})
+        log.close()
+
+        records = read_session_log(log.get_path())
+
+        self.assertEqual([record["type"] for record in records],
+            [session_log.SESSION_RECORD, session_log.SHOT_RECORD,
+            session_log.SHOT_RECORD, session_log.CLEAR_RECORD])
+        self.assertEqual((records[1]["x"], records[1]["y"]), (1.0, 2.0))
+        self.assertTrue(records[1]["hit"])
+        self.assertEqual(records[1]["tags"], {"points": "5"})
+        self.assertEqual(records[1]["columns"], {"Score": 5})
+        self.assertFalse(records[2]["hit"])
+        self.assertIsNone(records[2]["tags"])
+
+    def test_records_are_flushed_while_the_log_is_open(self):
+        log = SessionLog(logger, self._directory, flush_interval=.01)
+        log.log(session_log.PROTOCOL_RECORD, {"name": "test"})
+
+        deadline = time.time() + 2
+        while (len(read_session_log(log.get_path())) < 2 and
+            time.time() < deadline):
+            time.sleep(.01)
+
+        self.assertEqual(read_session_log(log.get_path())[1]["name"], "test")
+        log.close()
+
+    def test_record_that_cant_be_serialized_is_dropped(self):
+        log = SessionLog(logger, self._directory)
+        log.log(session_log.PROTOCOL_RECORD, {"name": object()})
+        log.log(session_log.PROTOCOL_RECORD, {"name": "test"})
+        log.close()
+
+        records = read_session_log(log.get_path())
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1]["name"], "test")
+
+    def test_sessions_get_their_own_files(self):
+        first_log = SessionLog(logger, self._directory)
+        second_log = SessionLog(logger, self._directory)
+        first_log.close()
+        second_log.close()
+
+        self.assertNotEqual(first_log.get_path(), second_log.get_path())
+        self.assertEqual(len(os.listdir(self._directory)), 2)
+
+    def test_line_that_was_cut_off_is_skipped(self):
+        log = SessionLog(logger, self._directory)
+        log.log(session_log.PROTOCOL_RECORD, {"name": "test"})
+        log.close()
+
+        with open(log.get_path(), "a") as log_file:
+            log_file.write('{"type": "shot", "sh')
+
+        records = read_session_log(log.get_path())
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1]["name"], "test")
+
+    def test_close_twice(self):
+        log = SessionLog(logger, self._directory)
+        log.close()
+        log.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,303 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from frame_capture import FrameCapture, RecordingSource
+import logging
+import numpy
+import os
+import session_recording
+from session_recording import (SessionRecorder, SessionRecording,
+    RecordingError, is_recording)
+import shutil
+import tempfile
+import threading
+import unittest
+
+logger = logging.getLogger("test_session_recording")
+logger.addHandler(logging.NullHandler())
+
+TARGETS = [("_internal_name:target0", [{"tags": ["_shape:rectangle",
+    "points:5"], "coords": [10, 10, 30, 30], "fill": "black"}])]
+MOVED_TARGETS = [("_internal_name:target0", [{"tags": ["_shape:rectangle",
+    "points:5"], "coords": [40, 40, 60, 60], "fill": "black"}])]
+
+class FakeShotEvent():
+    def get_coords(self):
+        return self._coords
+
+    def get_color(self):
+        return "red"
+
+    def get_tags(self):
+        return {"points": "5"}
+
+    def __init__(self, x, y):
+        self._coords = (x, y)
+
+def make_frame(value):
+    return numpy.ones((12, 16, 3), numpy.uint8) * value
+
+class SessionRecordingTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "session.srec")
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    # Records 20 frames, with sequences 0, 2, 4, ..., the targets before
+    # the first frame and moved at sequence 20, and a shot in the frames
+    # with sequences 10 (two shots) and 30
+    def record(self):
+        recorder = SessionRecorder(logger, self._path)
+        recorder.record_targets(0.0, TARGETS)
+
+        for i in range(20):
+            sequence = i * 2
+            recorder.record_frame(make_frame(i), sequence, i / 10.0)
+
+            if sequence == 10:
+                recorder.record_shots(sequence, i / 10.0,
+                    [FakeShotEvent(15, 15), FakeShotEvent(20, 20)])
+            elif sequence == 20:
+                recorder.record_targets(i / 10.0, MOVED_TARGETS)
+            elif sequence == 30:
+                recorder.record_shots(sequence, i / 10.0,
+                    [FakeShotEvent(50, 50)])
+
+        recorder.close()
+
+        return recorder
+
+    def test_frames(self):
+        recorder = self.record()
+        recording = SessionRecording(self._path)
+
+        self.assertEqual(recorder.get_stats(), (20, 0))
+        self.assertTrue(is_recording(self._path))
+        self.assertEqual(recording.get_frame_count(), 20)
+        self.assertAlmostEqual(recording.get_fps(), 10)
+
+        (sequence, timestamp, frame) = recording.read_frame(7)
+        self.assertEqual((sequence, timestamp), (14, .7))
+        self.assertTrue((frame == make_frame(7)).all())
+
+        recording.close()
+
+    def test_find_frame(self):
+        self.record()
+        recording = SessionRecording(self._path)
+
+        self.assertEqual(recording.find_frame(0), 0)
+        self.assertEqual(recording.find_frame(14), 7)
+        self.assertEqual(recording.find_frame(15), 8)
+        self.assertEqual(recording.find_frame(100), 20)
+
+        recording.close()
+
+    def test_shots(self):
+        self.record()
+        recording = SessionRecording(self._path)
+
+        shots = recording.get_shots()
+
+        self.assertEqual([(sequence, len(frame_shots))
+            for (sequence, timestamp, frame_shots) in shots],
+            [(10, 2), (30, 1)])
+        self.assertEqual(shots[1][2][0]["x"], 50)
+        self.assertEqual(shots[1][2][0]["tags"], {"points": "5"})
+
+        # The first two shots are in frame 5 and the third in frame 15
+        self.assertEqual(recording.find_shot(0), 5)
+        self.assertEqual(recording.find_shot(1), 5)
+        self.assertEqual(recording.find_shot(2), 15)
+        self.assertIsNone(recording.find_shot(3))
+
+        recording.close()
+
+    def test_targets(self):
+        self.record()
+        recording = SessionRecording(self._path)
+
+        def coords(targets):
+            return targets[0][1][0]["coords"]
+
+        self.assertEqual(coords(recording.get_targets(0)), [10, 10, 30, 30])
+        self.assertEqual(coords(recording.get_targets(19)), [10, 10, 30, 30])
+        self.assertEqual(coords(recording.get_targets(20)), [40, 40, 60, 60])
+        self.assertEqual(coords(recording.get_targets(38)), [40, 40, 60, 60])
+        self.assertEqual(recording.get_targets(-2), [])
+
+        recording.close()
+
+    def test_targets_changed_on_another_thread_are_in_order(self):
+        recorder = SessionRecorder(logger, self._path)
+
+        # Stands in for the Tk thread moving a target while shots are
+        # looked for
+        def move_target():
+            for i in range(200):
+                recorder.record_targets(i, TARGETS)
+
+        recording_targets = threading.Thread(target=move_target)
+        recording_targets.start()
+
+        for sequence in range(200):
+            recorder.record_frame(make_frame(0), sequence, sequence)
+            recorder.record_shots(sequence, sequence,
+                [FakeShotEvent(15, 15)])
+
+        recording_targets.join()
+        recorder.close()
+        recording = SessionRecording(self._path)
+
+        sequences = list(recording._events["sequence"])
+        self.assertEqual(len(sequences), 400)
+        self.assertEqual(sequences, sorted(sequences))
+
+        recording.close()
+
+    def test_index_is_not_copied(self):
+        self.record()
+        recording = SessionRecording(self._path)
+
+        self.assertIsInstance(recording._frames, numpy.memmap)
+        self.assertIsInstance(recording._events, numpy.memmap)
+
+        recording.close()
+
+    def test_recording_that_was_cut_off(self):
+        self.record()
+        index_path = self._path + session_recording.INDEX_EXTENSION
+        index_size = os.path.getsize(index_path)
+
+        recording = SessionRecording(self._path)
+        (offset, length) = recording._frames[-2][["offset", "length"]]
+        recording.close()
+
+        # The last frame's index record and half of the frame before it
+        # are missing
+        with open(index_path, "r+b") as index_file:
+            index_file.truncate(index_size - 3)
+        with open(self._path, "r+b") as data_file:
+            data_file.truncate(int(offset) + int(length) / 2)
+
+        recording = SessionRecording(self._path)
+
+        self.assertEqual(recording.get_frame_count(), 18)
+        self.assertTrue((recording.read_frame(17)[2] == make_frame(17)).all())
+        self.assertEqual(recording.find_shot(2), 15)
+
+        recording.close()
+
+    def test_empty_recording(self):
+        SessionRecorder(logger, self._path).close()
+        recording = SessionRecording(self._path)
+
+        self.assertEqual(recording.get_frame_count(), 0)
+        self.assertEqual(recording.get_fps(), 0)
+        self.assertEqual(recording.get_shots(), [])
+        self.assertIsNone(recording.find_shot(0))
+        self.assertEqual(recording.get_targets(0), [])
+
+        recording.close()
+
+    def test_frames_are_dropped_when_the_encoder_falls_behind(self):
+        recorder = SessionRecorder(logger, self._path, queue_size=0)
+        recorder.record_frame(make_frame(0), 0, 0.0)
+        recorder.close()
+
+        self.assertEqual(recorder.get_stats(), (0, 1))
+
+    def test_file_that_isnt_a_recording_is_rejected(self):
+        with open(self._path, "wb") as data_file:
+            data_file.write("not a recording")
+
+        self.assertRaises(RecordingError, SessionRecording, self._path)
+
+class RecordingSourceTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "session.srec")
+
+        # Recording started before any targets were placed, the target was
+        # placed at sequence 10 and moved at sequence 20
+        recorder = SessionRecorder(logger, self._path)
+        recorder.record_targets(0.0, [])
+
+        for sequence in range(30):
+            recorder.record_frame(make_frame(sequence), sequence,
+                sequence / 10.0)
+
+            if sequence == 10:
+                recorder.record_targets(1.0, TARGETS)
+            elif sequence == 20:
+                recorder.record_targets(2.0, MOVED_TARGETS)
+
+        recorder.close()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def get_coords(self, targets):
+        if len(targets) == 0:
+            return None
+
+        return targets[0][1][0]["coords"]
+
+    def test_targets_change_while_replaying(self):
+        source = RecordingSource(self._path, realtime=False)
+        capture = FrameCapture(source, logger, lossless=True)
+        ring = capture.get_ring()
+        capture.start()
+
+        last_sequence = -1
+        targets_id = None
+        changes = []
+
+        while last_sequence < 29:
+            ring.wait_for_frame(last_sequence, .1)
+            frame = ring.read_next(last_sequence)
+
+            if frame is None:
+                continue
+
+            (sequence, timestamp, pixels) = frame
+
+            if source.get_targets_id(sequence) != targets_id:
+                targets_id = source.get_targets_id(sequence)
+                changes.append((sequence,
+                    self.get_coords(source.get_targets(sequence))))
+
+            last_sequence = sequence
+            ring.release(sequence)
+
+        capture.stop()
+        source.release()
+
+        self.assertEqual(changes, [(0, None), (10, [10, 10, 30, 30]),
+            (20, [40, 40, 60, 60])])
+
+    def test_targets_after_seeking(self):
+        source = RecordingSource(self._path, realtime=False)
+        source.seek(15)
+
+        # Replayed frames are numbered from where the replay started
+        self.assertEqual(self.get_coords(source.get_targets()),
+            [10, 10, 30, 30])
+        self.assertEqual(self.get_coords(source.get_targets(4)),
+            [10, 10, 30, 30])
+        self.assertEqual(self.get_coords(source.get_targets(5)),
+            [40, 40, 60, 60])
+        self.assertNotEqual(source.get_targets_id(4),
+            source.get_targets_id(5))
+
+        # Frames past the end have the targets of the last frame
+        self.assertEqual(self.get_coords(source.get_targets(100)),
+            [40, 40, 60, 60])
+
+        source.release()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import itertools
+import math
+import random
+from shot_group_stats import GroupStats, ShotGroupStatistics
+import unittest
+
+# The statistics worked out from every shot at once
+def mean(values):
+    return sum(values) / float(len(values))
+
+def sample_std_dev(values):
+    values_mean = mean(values)
+    return math.sqrt(sum([(value - values_mean) ** 2 for value in values]) /
+        (len(values) - 1))
+
+def extreme_spread(points):
+    return max([math.hypot(a[0] - b[0], a[1] - b[1])
+        for (a, b) in itertools.combinations(points, 2)])
+
+class GroupStatsTest(unittest.TestCase):
+    def test_empty_group(self):
+        group = GroupStats()
+
+        self.assertEqual(group.get_count(), 0)
+        self.assertIsNone(group.get_mean_poi())
+        self.assertIsNone(group.get_std_dev())
+        self.assertIsNone(group.get_radial_std_dev())
+        self.assertIsNone(group.get_bbox())
+        self.assertIsNone(group.get_splits())
+        self.assertEqual(group.get_extreme_spread(), 0)
+
+    def test_one_shot(self):
+        group = GroupStats()
+        group.add(3, 4, 1.0)
+
+        self.assertEqual(group.get_mean_poi(), (3, 4))
+        self.assertIsNone(group.get_std_dev())
+        self.assertEqual(group.get_bbox(), (3, 4, 3, 4))
+        self.assertEqual(group.get_hull(), [(3, 4)])
+        self.assertIsNone(group.get_last_split())
+
+    def test_matches_statistics_of_every_shot(self):
+        generator = random.Random(1)
+        group = GroupStats()
+        points = []
+
+        for i in range(200):
+            point = (generator.gauss(320, 25), generator.gauss(240, 15))
+            points.append(point)
+            group.add(point[0], point[1], i * .5)
+
+            if i < 2:
+                continue
+
+            xs = [x for (x, y) in points]
+            ys = [y for (x, y) in points]
+
+            (mean_x, mean_y) = group.get_mean_poi()
+            self.assertAlmostEqual(mean_x, mean(xs))
+            self.assertAlmostEqual(mean_y, mean(ys))
+
+            (std_dev_x, std_dev_y) = group.get_std_dev()
+            self.assertAlmostEqual(std_dev_x, sample_std_dev(xs))
+            self.assertAlmostEqual(std_dev_y, sample_std_dev(ys))
+
+            self.assertAlmostEqual(group.get_extreme_spread(),
+                extreme_spread(points))
+
+        self.assertEqual(group.get_bbox(), (min(xs), min(ys), max(xs),
+            max(ys)))
+
+    def test_radial_std_dev(self):
+        group = GroupStats()
+        for (x, y) in ((0, 0), (2, 0), (0, 2), (2, 2)):
+            group.add(x, y, 0)
+
+        # Every shot is sqrt(2) from the mean point of impact
+        self.assertAlmostEqual(group.get_radial_std_dev(),
+            math.sqrt(4 * 2 / 3.0))
+
+    def test_hull(self):
+        group = GroupStats()
+        for (x, y) in ((0, 0), (4, 0), (4, 4), (0, 4), (2, 2), (1, 3)):
+            group.add(x, y, 0)
+
+        # Shots inside the hull don't change it
+        self.assertEqual(group.get_hull(), [(0, 0), (4, 0), (4, 4), (0, 4)])
+        self.assertAlmostEqual(group.get_extreme_spread(), math.sqrt(32))
+
+    def test_shots_in_a_line(self):
+        group = GroupStats()
+        for x in range(5):
+            group.add(x, x, 0)
+
+        self.assertAlmostEqual(group.get_extreme_spread(), math.sqrt(32))
+
+    def test_splits(self):
+        group = GroupStats()
+        for timestamp in (10.0, 10.5, 12.0, 12.25):
+            group.add(0, 0, timestamp)
+
+        self.assertEqual(group.get_last_split(), .25)
+        (min_split, mean_split, max_split) = group.get_splits()
+        self.assertEqual((min_split, max_split), (.25, 1.5))
+        self.assertAlmostEqual(mean_split, 2.25 / 3)
+
+class ShotGroupStatisticsTest(unittest.TestCase):
+    def test_groups(self):
+        statistics = ShotGroupStatistics()
+        statistics.add_shot("red", "a", 0, 0, 0)
+        statistics.add_shot("red", None, 10, 10, 1)
+        statistics.add_shot("green", "a", 20, 20, 2)
+        statistics.add_shot("green", "b", 30, 30, 3)
+
+        self.assertEqual(statistics.get_group().get_count(), 4)
+        self.assertEqual(statistics.get_group("red").get_count(), 2)
+        self.assertEqual(statistics.get_group(target="a").get_count(), 2)
+        self.assertEqual(statistics.get_group("green", "b").get_count(), 1)
+        self.assertEqual(statistics.get_group("red", "b").get_count(), 0)
+        self.assertEqual(sorted(statistics.get_colors()), ["green", "red"])
+        self.assertEqual(sorted(statistics.get_targets()), ["a", "b"])
+
+    def test_detected_and_clicked_colors_are_the_same_shooter(self):
+        statistics = ShotGroupStatistics()
+        statistics.add_shot("green2", "a", 0, 0, 0)
+        statistics.add_shot("green", "a", 10, 10, 1)
+
+        self.assertEqual(statistics.get_group("green").get_count(), 2)
+        self.assertEqual(statistics.get_group("green2", "a").get_count(), 2)
+        self.assertEqual(statistics.get_colors(), ["green"])
+
+    def test_clear(self):
+        statistics = ShotGroupStatistics()
+        statistics.add_shot("red", "a", 0, 0, 0)
+
+        statistics.clear()
+
+        self.assertEqual(statistics.get_group().get_count(), 0)
+        self.assertEqual(statistics.get_colors(), [])
+        self.assertEqual(statistics.get_targets(), [])
+
+if __name__ == "__main__":
+    unittest.main()
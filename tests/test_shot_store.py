@@ -0,0 +1,149 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import shot_store
+from shot_store import ShotStore, StoredShot
+import unittest
+
+# Stands in for the Tk canvas shot markers are drawn on
+class FakeCanvas():
+    def create_oval(self, x1, y1, x2, y2, **options):
+        self._next_id += 1
+        self.items[self._next_id] = ((x1, y1, x2, y2), options)
+        return self._next_id
+
+    def itemconfig(self, item, **options):
+        self.items[item][1].update(options)
+
+    def delete(self, item):
+        del self.items[item]
+
+    def tag_raise(self, item):
+        pass
+
+    def __init__(self):
+        self.items = {}
+        self._next_id = 0
+
+class ShotStoreTest(unittest.TestCase):
+    def setUp(self):
+        self._canvas = FakeCanvas()
+        self._store = ShotStore(self._canvas, capacity=2)
+
+    def test_append(self):
+        shot = self._store.append((1, 2), "red", 10.0, region=5,
+            target="target0")
+
+        self.assertEqual(len(self._store), 1)
+        self.assertEqual(shot.get_coords(), (1.0, 2.0))
+        self.assertEqual(shot.get_color(), "red")
+        self.assertEqual(shot.get_timestamp(), 10.0)
+        self.assertEqual(shot.get_region(), 5)
+        self.assertEqual(shot.get_target(), "target0")
+        self.assertIsNone(shot.get_canvas_id())
+
+    def test_miss(self):
+        shot = self._store.append((1, 2), "red", 10.0)
+
+        self.assertIsNone(shot.get_region())
+        self.assertIsNone(shot.get_target())
+        self.assertFalse(self._store.get_hits()[0])
+
+    def test_columns_grow_past_the_capacity(self):
+        for i in range(9):
+            self._store.append((i, i * 2), "red", i)
+
+        self.assertEqual(len(self._store), 9)
+        self.assertEqual(list(self._store.get_x()), range(9))
+        self.assertEqual(list(self._store.get_y()), range(0, 18, 2))
+        self.assertEqual(self._store.get_coords().shape, (9, 2))
+        self.assertEqual(self._store[8].get_timestamp(), 8.0)
+
+    def test_indexing(self):
+        for i in range(3):
+            self._store.append((i, i), "red", i)
+
+        self.assertEqual(self._store[-1], self._store[2])
+        self.assertNotEqual(self._store[0], self._store[1])
+        self.assertRaises(IndexError, self._store.__getitem__, 3)
+        self.assertRaises(IndexError, self._store.__getitem__, -4)
+        self.assertEqual([shot.get_index() for shot in self._store], [0, 1, 2])
+
+    def test_find(self):
+        self._store.append((0, 0), "red", 0, region=1, target="a")
+        self._store.append((0, 0), "green", 1, region=2, target="a")
+        self._store.append((0, 0), "red", 2, region=3, target="b")
+        self._store.append((0, 0), "red", 3)
+
+        self.assertEqual(list(self._store.find()), [0, 1, 2, 3])
+        self.assertEqual(list(self._store.find("red")), [0, 2, 3])
+        self.assertEqual(list(self._store.find(target="a")), [0, 1])
+        self.assertEqual(list(self._store.find("red", "b")), [2])
+        self.assertEqual(list(self._store.find("blue")), [])
+        self.assertEqual(list(self._store.find(target="c")), [])
+
+    def test_clear_keeps_codes(self):
+        self._store.append((0, 0), "red", 0, region=1, target="a")
+        red = self._store.get_color_code("red")
+
+        self._store.clear()
+
+        self.assertEqual(len(self._store), 0)
+        self.assertEqual(len(self._store.get_x()), 0)
+        self.assertEqual(self._store.get_color_code("red"), red)
+
+        shot = self._store.append((1, 1), "green", 1)
+        self.assertEqual(shot.get_color(), "green")
+        self.assertEqual(shot.get_index(), 0)
+
+    def test_draw_marker(self):
+        shot = self._store.append((10, 20), "red", 0, marker_radius=3)
+        shot.draw_marker()
+
+        self.assertEqual(self._canvas.items[shot.get_canvas_id()],
+            ((7.0, 17.0, 13.0, 23.0), {"fill": "red", "outline": "red",
+            "tags": "shot_marker"}))
+        self.assertEqual(self._store.get_canvas_ids()[0], shot.get_canvas_id())
+
+    def test_set_marker_color(self):
+        shot = self._store.append((10, 20), "red", 0)
+        shot.draw_marker()
+
+        shot.set_marker_color("blue")
+
+        self.assertEqual(shot.get_color(), "blue")
+        self.assertEqual(self._canvas.items[shot.get_canvas_id()][1]["fill"],
+            "blue")
+
+    def test_set_marker_radius_redraws_the_marker(self):
+        shot = self._store.append((10, 20), "red", 0)
+        shot.draw_marker()
+        old_canvas_id = shot.get_canvas_id()
+
+        shot.set_marker_radius(5)
+
+        self.assertNotIn(old_canvas_id, self._canvas.items)
+        self.assertEqual(self._canvas.items[shot.get_canvas_id()][0],
+            (5.0, 15.0, 15.0, 25.0))
+
+    def test_toggle_selected(self):
+        shot = self._store.append((10, 20), "red", 0)
+        shot.draw_marker()
+
+        shot.toggle_selected()
+        self.assertEqual(self._canvas.items[shot.get_canvas_id()][1]["fill"],
+            shot_store.SELECTED_MARKER_COLOR)
+
+        shot.toggle_selected()
+        self.assertEqual(self._canvas.items[shot.get_canvas_id()][1]["fill"],
+            "red")
+
+    def test_stored_shot_only_keeps_an_index(self):
+        shot = self._store.append((1, 2), "red", 0)
+
+        self.assertIsInstance(shot, StoredShot)
+        self.assertFalse(hasattr(shot, "__dict__"))
+
+if __name__ == "__main__":
+    unittest.main()
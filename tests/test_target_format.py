@@ -0,0 +1,159 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import pickle
+import shutil
+import target_format
+from target_format import (is_target_file, read_header, read_target,
+    write_target, TargetFormatError)
+import target_pickler
+import tempfile
+import unittest
+
+REGION_OBJECT = [
+    {"tags": ["_shape:rectangle", "points:5", "subtarget:outer"],
+        "coords": [10.0, 20.0, 110.0, 220.0], "fill": "black"},
+    {"tags": ["_shape:oval", "points:10"],
+        "coords": [40.5, 50.25, 80.0, 90.0], "fill": "red"},
+    {"tags": ["_shape:freeform_polygon", "points:5"],
+        "coords": [0.0, 0.0, 30.0, 0.0, 15.0, 25.0], "fill": "black"}]
+
+# Stands in for a pickled target that runs a command when it is loaded
+class Exploit(object):
+    def __reduce__(self):
+        return (os.system, ("echo exploited",))
+
+class TargetFormatTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def get_path(self, name="target.target"):
+        return os.path.join(self._directory, name)
+
+    def test_round_trip(self):
+        path = self.get_path()
+        write_target(path, REGION_OBJECT)
+
+        self.assertTrue(is_target_file(path))
+
+        region_object = read_target(path)
+
+        self.assertEqual(len(region_object), len(REGION_OBJECT))
+        for (region, expected) in zip(region_object, REGION_OBJECT):
+            self.assertEqual(list(region["tags"]), expected["tags"])
+            self.assertEqual(region["coords"], expected["coords"])
+            self.assertEqual(region["fill"], expected["fill"])
+
+    def test_header(self):
+        path = self.get_path()
+        write_target(path, REGION_OBJECT)
+
+        header = read_header(path)
+
+        self.assertEqual(header.get_version(), target_format.VERSION)
+        self.assertEqual(header.get_region_count(), 3)
+        self.assertEqual(header.get_bbox(), (0.0, 0.0, 110.0, 220.0))
+
+    def test_empty_target(self):
+        path = self.get_path()
+        write_target(path, [])
+
+        self.assertEqual(read_target(path), [])
+        self.assertIsNone(read_header(path).get_bbox())
+
+    def test_unicode_tags(self):
+        path = self.get_path()
+        write_target(path, [{"tags": [u"_shape:rectangle", u"name:\xe9"],
+            "coords": [0, 0, 1, 1], "fill": u"black"}])
+
+        self.assertEqual(read_target(path)[0]["tags"][1],
+            u"name:\xe9".encode("utf-8"))
+
+    def test_unknown_shape_is_rejected(self):
+        self.assertRaises(TargetFormatError, write_target, self.get_path(),
+            [{"tags": ["points:5"], "coords": [0, 0, 1, 1], "fill": "black"}])
+
+    def test_truncated_file_is_rejected(self):
+        path = self.get_path()
+        write_target(path, REGION_OBJECT)
+
+        with open(path, "rb") as target:
+            data = target.read()
+
+        for length in (10, target_format.HEADER.size + 3, len(data) - 1):
+            with open(path, "wb") as target:
+                target.write(data[:length])
+
+            self.assertRaises(TargetFormatError, read_target, path)
+
+    def test_newer_version_is_rejected(self):
+        path = self.get_path()
+        write_target(path, REGION_OBJECT)
+
+        with open(path, "r+b") as target:
+            target.seek(len(target_format.MAGIC))
+            target.write(chr(target_format.VERSION + 1))
+
+        self.assertRaises(TargetFormatError, read_target, path)
+
+class PickledTargetTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def write_pickle(self, region_object):
+        path = os.path.join(self._directory, "old.target")
+
+        with open(path, "wb") as target:
+            pickle.dump(region_object, target)
+
+        return path
+
+    def test_old_target_is_converted(self):
+        path = self.write_pickle(REGION_OBJECT)
+
+        self.assertEqual(target_pickler._read_target(path), REGION_OBJECT)
+        self.assertTrue(is_target_file(path))
+        self.assertEqual(os.listdir(self._directory), ["old.target"])
+
+        region_object = read_target(path)
+        self.assertEqual([region["coords"] for region in region_object],
+            [region["coords"] for region in REGION_OBJECT])
+
+    def test_target_the_new_format_cant_hold_is_left_as_it_was(self):
+        old_region_object = [{"tags": ["points:5"], "coords": [0, 0, 1, 1],
+            "fill": "black"}]
+        path = self.write_pickle(old_region_object)
+
+        self.assertEqual(target_pickler._read_target(path), old_region_object)
+        self.assertFalse(is_target_file(path))
+        self.assertEqual(os.listdir(self._directory), ["old.target"])
+
+    def test_pickle_that_runs_code_is_rejected(self):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            path = os.path.join(self._directory, "exploit.target")
+
+            with open(path, "wb") as target:
+                pickle.dump([Exploit()], target, protocol)
+
+            self.assertRaises(TargetFormatError, target_pickler._read_target,
+                path)
+
+    def test_pickle_that_isnt_a_target_is_rejected(self):
+        for region_object in ({"tags": []}, [{"tags": "points:5",
+            "coords": [], "fill": "black"}], [{"tags": [], "coords": ["1"],
+            "fill": "black"}]):
+
+            path = self.write_pickle(region_object)
+            self.assertRaises(TargetFormatError, target_pickler._read_target,
+                path)
+
+if __name__ == "__main__":
+    unittest.main()
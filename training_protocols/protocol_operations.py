@@ -2,9 +2,9 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-import pyaudio
-import pyttsx
-from threading import Thread
+from heatmap import render_heatmap
+from PIL import Image, ImageTk
+from threading import Lock, Thread
 import wave
 
 LARGEST_REGION = 0
@@ -22,10 +22,25 @@ class ProtocolOperations():
         self._added_columns = ()
         self._added_column_widths = []
 
-        self._tts_engine = pyttsx.init()
-        # slow down the wpm rate otherwise they speek to fast
-        self._tts_engine.setProperty("rate", 150)
-        self._tts_engine.startLoop(False)
+        # Tk only keeps showing an image while something references it
+        self._heatmap_images = []
+
+        # pyttsx and pyaudio take a while to import and start, so that
+        # waits until a protocol first talks or plays a sound
+        self._tts_engine = None
+        self._tts_lock = Lock()
+
+    def _get_tts_engine(self):
+        with self._tts_lock:
+            if self._tts_engine is None:
+                import pyttsx
+
+                self._tts_engine = pyttsx.init()
+                # slow down the wpm rate otherwise they speek to fast
+                self._tts_engine.setProperty("rate", 150)
+                self._tts_engine.startLoop(False)
+
+            return self._tts_engine
 
     # Returns the centroid of a target using the specified mode:
     # LARGEST_REGION calculates the centroid of the target by calculating
@@ -98,7 +113,9 @@ class ProtocolOperations():
         # if it does, otherwise we just end the loop (better to get a CLI
         # error message than the actual behavior of not ending the loop,
         # which is weird sound artifacts).
-        if hasattr(self._tts_engine, "_inLoop") and self._tts_engine._inLoop:
+        if self._tts_engine is None:
+            pass
+        elif hasattr(self._tts_engine, "_inLoop") and self._tts_engine._inLoop:
             self._tts_engine.endLoop()
         elif not hasattr(self._tts_engine, "_inLoop"):
             self._tts_engine.endLoop()
@@ -108,8 +125,28 @@ class ProtocolOperations():
     def clear_shots(self):
         self._shootoff.clear_shots()
 
+    # Returns the ShotStore with every shot that hasn't been cleared. Its
+    # columns are numpy arrays, so statistics over every shot can be
+    # worked out without a loop (e.g. numpy.mean(shots.get_x())).
+    def get_shots(self):
+        return self._shootoff.get_shots()
+
+    # Returns the GroupStats (see shot_group_stats) for the shots with color
+    # that hit target (a target's "name" in the targets the protocol was
+    # given), either can be None to include every shot. The statistics are
+    # kept up to date as shots come in, so this is cheap enough to call in
+    # every shot_listener, e.g. to show the group size on the feed:
+    #
+    #   group = self._operations.get_group_stats(shot.get_color())
+    #   self._operations.show_text_on_feed("ES: %.1f" %
+    #       group.get_extreme_spread())
+    def get_group_stats(self, color=None, target=None):
+        return self._shootoff.get_group_stats().get_group(color, target)
+
     # Use text-to-speech to say message outloud
     def say(self, message):
+        self._get_tts_engine()
+
         # if we don't do this on another thread we have to wait until
         # the message has finished being communicated to do anything
         # (i.e. shootoff freezes)  
@@ -126,11 +163,40 @@ class ProtocolOperations():
     def show_text_on_feed(self, message):
         self._canvas.itemconfig(self._feed_text, text=message)
 
+    # Draws a heatmap of where every shot that has hit target's target file
+    # landed (in this session and every saved session, see heatmap) over
+    # target, which is one of the targets the protocol was given. Returns
+    # the heatmap's canvas id, or None if target wasn't loaded from a target
+    # file or has never been hit. The heatmap is removed by clear_canvas
+    # or by deleting the returned id.
+    def show_heatmap(self, target):
+        heatmap = self._shootoff.get_target_heatmap(target["name"])
+
+        if heatmap is None or heatmap.get_shot_count() == 0:
+            return None
+
+        (x1, y1, x2, y2) = self._shootoff.get_target_bbox(target["name"])
+        width = max(1, int(round(x2 - x1)))
+        height = max(1, int(round(y2 - y1)))
+
+        image = Image.fromarray(render_heatmap(heatmap.get_counts()),
+            "RGBA").resize((width, height), Image.NEAREST)
+        photo_image = ImageTk.PhotoImage(image)
+        self._heatmap_images.append(photo_image)
+
+        heatmap_id = self._canvas.create_image(x1, y1, anchor="nw",
+            image=photo_image)
+        self._plugin_canvas_artifacts.append(heatmap_id)
+
+        return heatmap_id
+
     # Remove anything added by the plugin from the canvas
     def clear_canvas(self):
         for artifact in self._plugin_canvas_artifacts:
             self._canvas.delete(artifact)
 
+        self._heatmap_images = []
+
     # Removes all traces of shot list columns/data added by the plugin
     def clear_protocol_shot_list_columns(self):
         self._shootoff.revert_shot_list_columns()
@@ -145,6 +211,8 @@ class ProtocolOperations():
         self._play_sound_thread.start()  
 
     def _play_sound(self, *args):
+        import pyaudio
+
         chunk = 1024  
   
         # initialize the sound file and stream